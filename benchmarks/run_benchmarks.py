@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+'''
+Benchmarks for the analysis and generation hot paths:
+- jiang_on_tasksets()                      (task sets/s, latency per task set)
+- convert_file_to_tasksets*()              (task sets/s)
+- generate_csv_n_task_sets() from a file   (task sets/s, jobs/s written)
+- the nptest driver                        (latency per task set, only with --nptest)
+
+The workloads are synthetic task sets generated with a fixed seed and scale along the
+number of chains (1-10), callbacks per chain (2-20) and jobs per task set (500-10k),
+matching the grids of Sobhani et al. Fig. 9/10/11 and Jiang et al. Fig. 6.
+Every workload runs in a fresh process so that its peak RSS can be measured.
+Results are stored as JSON; use --compare to compare two runs.
+'''
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+os.environ.setdefault("TQDM_DISABLE", "1")
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "jiang_et_al"))
+sys.path.insert(0, os.path.join(HERE, "..", "this_paper"))
+sys.path.insert(0, os.path.join(HERE, "..", "sag_scripts"))
+from JRTA import chains_to_jiang, jiang_on_tasksets, convert_file_to_tasksets, convert_file_to_tasksets_odd_chains
+from convert_sobhani_to_sag import generate_csv_n_task_sets
+from sag_input import split_chains
+from nptest import run_nptest, find_task_set_pairs
+
+# Hyperperiod of all benchmark task sets. 720720 has many divisors,
+# so the number of jobs per chain can be picked almost freely.
+HYPERPERIOD_JOBS = 720720
+DIVISORS = [d for d in range(1, 10001) if HYPERPERIOD_JOBS % d == 0]
+
+# (name, nrof_chains, nrof_callbacks_per_chain, nrof_jobs)
+GRID = [(f"chains_{n}", n, 10, 1000) for n in (1, 2, 5, 10)] + \
+       [(f"callbacks_{b}", 5, b, 1000) for b in (2, 5, 10, 20)] + \
+       [(f"jobs_{j}", 5, 10, j) for j in (500, 1000, 5000, 10000)]
+
+QUICK_GRID = [("chains_2", 2, 5, 500), ("callbacks_10", 5, 10, 1000)]
+
+def synthetic_task_set(rng, nrof_chains, nrof_callbacks_per_chain, nrof_jobs, U=1.0):
+    '''
+    A task set in the format of the text files used by PWA_CD.m, with approximately
+    nrof_jobs jobs per hyperperiod. Returned as a list of lines, terminated by '-'.
+    '''
+    jobs_per_chain = max(1, nrof_jobs // (nrof_chains * nrof_callbacks_per_chain))
+    lines = []
+    task_id = 1
+    chain_utils = [rng.random() for _ in range(nrof_chains)]
+    total = sum(chain_utils)
+
+    # Number of releases of each chain's timer per hyperperiod, close to jobs_per_chain.
+    # The hyperperiod is HYPERPERIOD_JOBS / gcd(releases), so retry until the gcd is 1.
+    for _ in range(100):
+        releases = [min(DIVISORS, key=lambda d: abs(d - jobs_per_chain * rng.uniform(0.8, 1.2)))
+                    for _ in range(nrof_chains)]
+        if math.gcd(*releases) == 1:
+            break
+
+    for chain in range(1, nrof_chains + 1):
+        period = HYPERPERIOD_JOBS // releases[chain - 1] * 100
+        exec_time = max(nrof_callbacks_per_chain, int(period * U * chain_utils[chain - 1] / total))
+        for i in range(nrof_callbacks_per_chain):
+            wcet = exec_time // nrof_callbacks_per_chain
+            lines.append(f"{period}\t{wcet}\t{period}\t{task_id}\t{chain}")
+            task_id += 1
+    lines.append("-")
+    return lines
+
+def write_workload(path, seed, nrof_sets, nrof_chains, nrof_callbacks_per_chain, nrof_jobs):
+    rng = random.Random(seed)
+    with open(path, "w") as f:
+        for _ in range(nrof_sets):
+            f.write("\n".join(synthetic_task_set(rng, nrof_chains, nrof_callbacks_per_chain, nrof_jobs)) + "\n")
+
+def percentiles(latencies):
+    if not latencies:
+        return None
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+    return {"p50": p50, "p90": p90, "p99": p99, "max": max(latencies)}
+
+def peak_rss_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def bench_jiang(workload_file, nrof_chains, nrof_callbacks_per_chain, m, nptest):
+    tasksets = [chains_to_jiang(split_chains(ts, chain_lengths))
+                for ts, chain_lengths in convert_file_to_tasksets_odd_chains(workload_file)]
+    latencies = []
+    start = time.perf_counter()
+    for taskset in tasksets:
+        t = time.perf_counter()
+        jiang_on_tasksets([taskset], m)
+        latencies.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - start
+    return {"task_sets_per_sec": len(tasksets) / elapsed, "latency": percentiles(latencies)}
+
+def bench_convert(workload_file, nrof_chains, nrof_callbacks_per_chain, m, nptest):
+    start = time.perf_counter()
+    nrof_sets = len(convert_file_to_tasksets(workload_file))
+    elapsed = time.perf_counter() - start
+    start = time.perf_counter()
+    convert_file_to_tasksets_odd_chains(workload_file)
+    elapsed_odd = time.perf_counter() - start
+    return {"task_sets_per_sec": nrof_sets / elapsed, "odd_chains_task_sets_per_sec": nrof_sets / elapsed_odd}
+
+def bench_generate(workload_file, nrof_chains, nrof_callbacks_per_chain, m, nptest):
+    with tempfile.TemporaryDirectory() as output:
+        start = time.perf_counter()
+        generate_csv_n_task_sets(0, 0, nrof_chains, nrof_callbacks_per_chain, workload_file, output)
+        elapsed = time.perf_counter() - start
+
+        nrof_sets = 0
+        nrof_jobs = 0
+        nrof_bytes = 0
+        for task_file, pred_file in find_task_set_pairs(output):
+            nrof_sets += 1
+            with open(task_file) as f:
+                nrof_jobs += sum(1 for _ in f) - 1
+            nrof_bytes += os.path.getsize(task_file) + os.path.getsize(pred_file)
+
+    return {"task_sets_per_sec": nrof_sets / elapsed, "jobs_per_sec": nrof_jobs / elapsed,
+            "bytes_per_sec": nrof_bytes / elapsed, "jobs_per_task_set": nrof_jobs / max(nrof_sets, 1)}
+
+def bench_nptest(workload_file, nrof_chains, nrof_callbacks_per_chain, m, nptest):
+    with tempfile.TemporaryDirectory() as output:
+        generate_csv_n_task_sets(0, 0, nrof_chains, nrof_callbacks_per_chain, workload_file, output)
+        latencies = []
+        start = time.perf_counter()
+        for task_file, pred_file in find_task_set_pairs(output):
+            t = time.perf_counter()
+            run_nptest(task_file, pred_file, m, nptest)
+            latencies.append(time.perf_counter() - t)
+        elapsed = time.perf_counter() - start
+    return {"task_sets_per_sec": len(latencies) / elapsed, "latency": percentiles(latencies)}
+
+BENCHMARKS = {
+    "jiang": bench_jiang,
+    "convert": bench_convert,
+    "generate": bench_generate,
+    "nptest": bench_nptest,
+}
+
+def _run_in_worker(job):
+    name, workload_file, nrof_chains, nrof_callbacks_per_chain, m, nptest = job
+    result = BENCHMARKS[name](workload_file, nrof_chains, nrof_callbacks_per_chain, m, nptest)
+    result["peak_rss_kb"] = peak_rss_kb()
+    return result
+
+def run(benchmarks, grid, nrof_sets, seed, m, nptest):
+    results = []
+    spawn = multiprocessing.get_context("spawn")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for workload, nrof_chains, nrof_callbacks_per_chain, nrof_jobs in grid:
+            workload_file = os.path.join(workdir, f"{workload}.txt")
+            write_workload(workload_file, seed, nrof_sets, nrof_chains, nrof_callbacks_per_chain, nrof_jobs)
+
+            for name in benchmarks:
+                # A fresh process per measurement, so ru_maxrss is the peak of this benchmark only.
+                with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as executor:
+                    job = (name, workload_file, nrof_chains, nrof_callbacks_per_chain, m, nptest)
+                    result = executor.submit(_run_in_worker, job).result()
+
+                result.update({"benchmark": name, "workload": workload, "chains": nrof_chains,
+                               "callbacks_per_chain": nrof_callbacks_per_chain, "jobs": nrof_jobs,
+                               "task_sets": nrof_sets})
+                print(f"{name:9s} {workload:13s} {result['task_sets_per_sec']:10.1f} sets/s  "
+                      f"{result['peak_rss_kb'] / 1024:7.1f} MB")
+                results.append(result)
+
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=HERE, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (subprocess.CalledProcessError, OSError):
+        return None
+
+def compare(old_file, new_file):
+    '''
+    Prints the throughput ratio new/old per benchmark and workload.
+    '''
+    with open(old_file) as f:
+        old = {(r["benchmark"], r["workload"]): r for r in json.load(f)["results"]}
+    with open(new_file) as f:
+        new = {(r["benchmark"], r["workload"]): r for r in json.load(f)["results"]}
+
+    for key in sorted(old.keys() & new.keys()):
+        ratio = new[key]["task_sets_per_sec"] / old[key]["task_sets_per_sec"]
+        rss = new[key]["peak_rss_kb"] / old[key]["peak_rss_kb"]
+        print(f"{key[0]:9s} {key[1]:13s} throughput x{ratio:5.2f}  peak RSS x{rss:5.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the analysis and generation hot paths.")
+    parser.add_argument("--benchmarks", nargs="+", default=["jiang", "convert", "generate"],
+                        choices=list(BENCHMARKS), help="Benchmarks to run (default: jiang convert generate)")
+    parser.add_argument("--sets", type=int, default=50, help="Task sets per workload (default: 50)")
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the synthetic workloads (default: 1)")
+    parser.add_argument("-m", type=int, default=4, help="Number of executor-threads (default: 4)")
+    parser.add_argument("--nptest", default=None, help="Path to the nptest binary")
+    parser.add_argument("--quick", action="store_true", help="Only run two small workloads")
+    parser.add_argument("--output", default="benchmark.json", help="Output JSON file (default: benchmark.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), default=None,
+                        help="Compare two benchmark JSON files instead of running")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    grid = QUICK_GRID if args.quick else GRID
+    results = run(args.benchmarks, grid, args.sets, args.seed, args.m, args.nptest)
+
+    with open(args.output, "w") as f:
+        json.dump({
+            "meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": git_commit(),
+                     "python": platform.python_version(), "machine": platform.machine(),
+                     "cpus": os.cpu_count(), "seed": args.seed, "sets": args.sets, "m": args.m},
+            "results": results,
+        }, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -196,6 +196,54 @@ def convert_sobhani_synthetic_to_jiang(nrof_chains, nrof_callbacks_per_chain, in
     
     return result
 
+def chains_to_jiang(chains):
+    '''
+    Converts a list of (period, [wcets]) chains to the
+    [periods, exec_times, exec_time_last_cb] format used by jiang_on_tasksets().
+    '''
+    periods = {}
+    exec_times = {}
+    exec_time_last_cb = {}
+
+    for chain, (period, wcets) in enumerate(chains, start=1):
+        periods[chain] = period
+        exec_times[chain] = sum(wcets)
+        exec_time_last_cb[chain] = wcets[-1]
+
+    return [periods, exec_times, exec_time_last_cb]
+
+def theorem1(periods, exec_times, exec_time_last_cb, chain, m, sound=False):
+    '''
+    Returns the function L -> exec_times[chain] - exec_time_last_cb[chain] + sum(W(i, L)) / m
+    of Theorem 1, whose fixed point bounds the interference suffered by chain.
+
+    With sound=False, as used by jiang_on_tasksets() for the figures, the sum skips the last chain
+    and W(k, L) drops by exec_times[k] where L - exec_times[k] is a multiple of periods[k], so an
+    iteration can stop at such a point, below the fixed point. With sound=True, every other chain
+    interferes and W(k, L) keeps its value from both sides of these points, so the function is
+    non-decreasing in L and least_fixed_point() from 0 returns its least fixed point.
+    '''
+    nrof_chains = len(periods) + 1 if sound else len(periods)
+
+    def n(k, L):
+        return math.ceil((L - exec_times[k]) / periods[k]) + 1
+
+    def W(k, L):
+        if sound:
+            # divmod() keeps the quotient and remainder consistent at the multiples of periods[k]
+            q, r = divmod(L - exec_times[k], periods[k])
+            return (q + 1) * exec_times[k] + min(r, exec_times[k])
+        return (n(k, L)  - 1) * exec_times[k] + min((L - exec_times[k]) % periods[k], exec_times[k])
+
+    def theorem1_L(L):
+        WorkloadSum = 0
+        for i in range(1, nrof_chains):
+            if chain != i:
+                WorkloadSum += W(i, L)
+        return exec_times[chain] - exec_time_last_cb[chain] + WorkloadSum / m
+
+    return theorem1_L
+
 def jiang_on_tasksets(tasksets, m):
     '''
     Implements Theorem 1 from:
@@ -216,19 +264,8 @@ def jiang_on_tasksets(tasksets, m):
         exec_time_last_cb = taskset[2]
         
         for chain in range(1, nrof_chains + 1):
-            def n(k, L):
-                return math.ceil((L - exec_times[k]) / periods[k]) + 1
-
-            def W(k, L):
-                return (n(k, L)  - 1) * exec_times[k] + min((L - exec_times[k]) % periods[k], exec_times[k])
-            
-            def theorem1_L(L):
-                WorkloadSum = 0
-                for i in range(1, nrof_chains):
-                    if chain != i:
-                        WorkloadSum += W(i, L)
-                return exec_times[chain] - exec_time_last_cb[chain] + WorkloadSum / m
-            
+            theorem1_L = theorem1(periods, exec_times, exec_time_last_cb, chain, m)
+
             try:
                 max_interf = fixed_point(theorem1_L, 0, xtol=10-6)
             except RuntimeError:
@@ -248,4 +285,173 @@ def jiang_on_tasksets(tasksets, m):
         taskset_nr += 1
 
     sched_ratio = sched_task_sets / len(tasksets)
-    return sched_ratio, reponse_times_per_chain
\ No newline at end of file
+    return sched_ratio, reponse_times_per_chain
+
+def _chain_inputs(periods, exec_times, exec_time_last_cb, chain, m):
+    '''
+    Everything theorem1(sound=True) reads for chain: m, the chain's own WCETs
+    and the (period, WCET) of every interfering chain.
+    '''
+    interferers = tuple((periods[i], exec_times[i]) for i in range(1, len(periods) + 1) if i != chain)
+    return m, exec_times[chain] - exec_time_last_cb[chain], exec_time_last_cb[chain], interferers
+
+def _dominates(new, old):
+    '''
+    True if theorem1(sound=True) with inputs new is >= theorem1(sound=True) with inputs old
+    for every L at or above the largest WCET of the interfering chains.
+    Below that, W(k, L) = min(C, L - C + T) decreases with C, so there is no pointwise order.
+    '''
+    new_m, new_own, _, new_interferers = new
+    old_m, old_own, _, old_interferers = old
+    if new_m > old_m or new_own < old_own or len(new_interferers) != len(old_interferers):
+        return False
+    for (new_T, new_C), (old_T, old_C) in zip(new_interferers, old_interferers):
+        # W(k, L) only grows with C while C <= T
+        if new_T != old_T or new_C < old_C or new_C > new_T:
+            return False
+    return True
+
+def least_fixed_point(f, start=0, limit=math.inf, maxiter=100000):
+    '''
+    Iterates L = f(L) from start until it converges or exceeds limit, and returns the last value.
+    For a non-decreasing f, such as theorem1(sound=True), and a start below its least fixed point,
+    every iterate is a lower bound of that fixed point, and the returned value is that fixed point
+    or the first iterate above limit.
+    Raises RuntimeError if it does not converge within maxiter iterations.
+    '''
+    L = start
+    for _ in range(maxiter):
+        new_L = f(L)
+        if new_L <= L + 1e-9 * max(1, abs(L)) or new_L > limit:
+            return new_L
+        L = new_L
+    raise RuntimeError(f"No fixed point after {maxiter} iterations")
+
+class IncrementalJiang:
+    '''
+    Theorem 1 of Jiang et al. for sweeps that re-analyse the same task sets with
+    different WCETs or numbers of executor-threads, e.g. WCET-inflation studies.
+
+    The fixed point is computed with least_fixed_point() rather than scipy's fixed_point():
+    jiang_on_tasksets() passes xtol=10-6, i.e. a relative tolerance of 4, so it stops after
+    about one accelerated step and its result depends on where it starts. The iteration stops
+    as soon as the response time exceeds the deadline, which decides the verdict.
+
+    It iterates theorem1(sound=True), so its verdicts can differ from those of jiang_on_tasksets().
+
+    The last value of every (task set, chain) is kept. A chain whose inputs did not change is
+    not recomputed. With warm=True, the default, when the inputs only moved in the direction that
+    increases the interference (larger WCETs, fewer threads), the iteration starts from 0 as usual,
+    but once it passes the largest interfering WCET it jumps to the previous value (see
+    _dominates()). That value is then a lower bound of the new least fixed point, so the result
+    is the one of a cold start and does not depend on what was analysed before.
+    '''
+    def __init__(self, warm=True):
+        self.warm_start = warm
+        self.cache = {}  # (task set key, chain) -> (inputs, max_interf)
+        self.reused = 0
+        self.warm = 0
+        self.cold = 0
+
+    def interference(self, key, taskset, chain, m):
+        periods, exec_times, exec_time_last_cb = taskset
+        inputs = _chain_inputs(periods, exec_times, exec_time_last_cb, chain, m)
+
+        start = None
+        cached = self.cache.get((key, chain))
+        if cached is not None:
+            old_inputs, old_interf = cached
+            if inputs == old_inputs:
+                self.reused += 1
+                return old_interf
+            if self.warm_start and _dominates(inputs, old_inputs):
+                start = old_interf
+
+        theorem1_L = theorem1(periods, exec_times, exec_time_last_cb, chain, m, sound=True)
+        limit = periods[chain] - exec_time_last_cb[chain] # beyond this, R > D
+        if start is None:
+            self.cold += 1
+            max_interf = least_fixed_point(theorem1_L, 0, limit)
+        else:
+            self.warm += 1
+            max_wcet = max((C for _, C in inputs[3]), default=0)
+            max_interf = least_fixed_point(theorem1_L, 0, min(limit, max_wcet))
+            if limit >= max_interf > max_wcet:
+                max_interf = least_fixed_point(theorem1_L, max(max_interf, start), limit)
+        self.cache[(key, chain)] = (inputs, max_interf)
+        return max_interf
+
+    def analyse(self, tasksets, m, keys=None):
+        '''
+        Schedulability ratio and response times as returned by jiang_on_tasksets(tasksets, m).
+        Response times above the deadline are lower bounds. A chain without a fixed point, or
+        with a bound below its own WCET (W() < 0 for chains with WCET > period), is unschedulable.
+        keys identifies the task sets across calls and defaults to their position in tasksets.
+        '''
+        if keys is None:
+            keys = range(len(tasksets))
+
+        taskset_nr = 1
+        sched_task_sets = 0
+        reponse_times_per_chain = []
+
+        for key, taskset in zip(keys, tasksets):
+            schedulable = True
+            periods, exec_times, exec_time_last_cb = taskset
+
+            for chain in range(1, len(periods) + 1):
+                try:
+                    max_interf = self.interference(key, taskset, chain, m)
+                except RuntimeError:
+                    print(f"No fixed point for task set {taskset_nr}, chain {chain}, deemed unschedulable")
+                    schedulable = False
+                    continue
+
+                R = max_interf + exec_time_last_cb[chain]
+                D = periods[chain] # implicit deadline
+                reponse_times_per_chain.append((taskset_nr, chain, R, D))
+
+                # R > D, compared like the limit of interference() so that rounding cannot flip it
+                if max_interf > D - exec_time_last_cb[chain] or R < exec_times[chain]:
+                    schedulable = False
+
+            if schedulable:
+                sched_task_sets += 1
+
+            taskset_nr += 1
+
+        sched_ratio = sched_task_sets / len(tasksets)
+        return sched_ratio, reponse_times_per_chain
+
+def jiang_schedulable(taskset, m):
+    '''
+    True if Theorem 1 deems one [periods, exec_times, exec_time_last_cb] task set schedulable
+    with m executor-threads, computed with IncrementalJiang. As theorem1(sound=True) only
+    decreases with m, so does this verdict, unlike the one of jiang_on_tasksets().
+    '''
+    return IncrementalJiang().analyse([taskset], m)[0] == 1.0
+
+def scale_wcets(taskset, factor):
+    '''
+    Returns a copy of a [periods, exec_times, exec_time_last_cb] task set with all WCETs multiplied by factor.
+    '''
+    periods, exec_times, exec_time_last_cb = taskset
+    return [dict(periods),
+            {k: v * factor for k, v in exec_times.items()},
+            {k: v * factor for k, v in exec_time_last_cb.items()}]
+
+def jiang_wcet_inflation(tasksets, m, factors, analysis=None):
+    '''
+    Schedulability ratio of tasksets under Theorem 1 for every WCET inflation factor.
+
+    The factors are analysed in increasing order with analysis(tasksets, m), by default the
+    analyse() of a new IncrementalJiang, so every factor starts from the fixed points of the
+    previous one. Pass analysis=jiang_on_tasksets for the analysis of the figures.
+    '''
+    if analysis is None:
+        analysis = IncrementalJiang().analyse
+    results = {}
+    for factor in sorted(factors):
+        scaled = [scale_wcets(taskset, factor) for taskset in tasksets]
+        results[factor] = analysis(scaled, m)[0]
+    return [(factor, results[factor]) for factor in factors]
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+import os
+import csv
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from JRTA import jiang_on_tasksets, convert_sobhani_synthetic_to_jiang, convert_sobhani_syntethic_odd_to_jiang
+
+REPO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Sweeps of the baseline figures. pattern is relative to the repository and {} is replaced
+# by the sweep value. m, chains and callbacks are either a number or "value", in which case
+# the sweep value is used. Without chains/callbacks the chains may have different lengths.
+SWEEPS = {
+    "Figure6a": {"axis": "Unorm", "values": ["0.1", "0.2", "0.3", "0.4", "0.5", "0.6", "0.7", "0.8", "0.9"],
+                 "pattern": "data/JiangExp/Figure6/InputToSobhani/vary_Unorm/tasksets_unorm_{}.txt", "m": 4},
+    "Figure6b": {"axis": "n", "values": [str(n) for n in range(2, 9)],
+                 "pattern": "data/JiangExp/Figure6/InputToSobhani/vary_n/tasksets_n_{}.txt", "m": 4},
+    "Figure6c": {"axis": "b", "values": [str(b) for b in range(2, 7)],
+                 "pattern": "data/JiangExp/Figure6/InputToSobhani/vary_b/tasksets_b_{}.txt", "m": 4},
+    "Figure6f": {"axis": "m", "values": [str(m) for m in range(2, 9)],
+                 "pattern": "data/JiangExp/Figure6/InputToSobhani/vary_m/tasksets_m_{}.txt", "m": "value"},
+    "Figure9": {"axis": "U", "values": ["0.8", "1.2", "1.6", "2.0", "2.4", "2.8", "3.2", "3.6", "4.0"],
+                "pattern": "data/SobhaniExp/Fig9/tasksets_nrofjobs_max_5k/tasksets_util_{}.txt",
+                "m": 4, "chains": 5, "callbacks": 10},
+    "Figure10": {"axis": "m", "values": [str(m) for m in range(1, 17)],
+                 "pattern": "data/SobhaniExp/Fig10/tasksets_util_1.0.txt",
+                 "m": "value", "chains": 5, "callbacks": 10},
+    "Figure11": {"axis": "chains", "values": [str(n) for n in range(1, 11)],
+                 "pattern": "data/SobhaniExp/Fig11/tasksets_cn_{}.txt",
+                 "m": 4, "chains": "value", "callbacks": 10},
+    "Figure_b": {"axis": "callbacks", "values": [str(n) for n in range(2, 21)],
+                 "pattern": "Sobhani_input_b_200sets/tasksets_{}.txt",
+                 "m": 4, "chains": 5, "callbacks": "value"},
+}
+
+def _resolve(setting, value):
+    if setting == "value":
+        return int(value)
+    return setting
+
+def analyse_point(job):
+    '''
+    Parses the task-set file of one sweep point and returns its schedulability ratio under Theorem 1.
+    '''
+    chains = _resolve(job.get("chains"), job["value"])
+    callbacks = _resolve(job.get("callbacks"), job["value"])
+    if chains is not None and callbacks is not None:
+        tasksets = convert_sobhani_synthetic_to_jiang(chains, callbacks, job["path"])
+    else:
+        tasksets = convert_sobhani_syntethic_odd_to_jiang(job["path"])
+    return jiang_on_tasksets(tasksets, _resolve(job["m"], job["value"]))[0]
+
+def write_atomically(output_file, rows):
+    '''
+    Writes rows to output_file through a temporary file in the same folder,
+    so that an interrupted run never leaves a partial FigureX_data_Jiang.csv behind.
+    '''
+    folder = os.path.dirname(os.path.abspath(output_file))
+    fd, tmp = tempfile.mkstemp(dir=folder, prefix=".tmp_", suffix=".csv")
+    try:
+        with os.fdopen(fd, "w", newline="") as f:
+            writer = csv.writer(f)
+            for row in rows:
+                writer.writerow(row)
+        os.replace(tmp, output_file)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+def run_sweeps(sweeps, root=REPO, outdir=".", workers=6):
+    '''
+    Evaluates all points of all sweeps concurrently and writes <name>_data_Jiang.csv
+    (value, schedulability ratio) per sweep once all of its points are done.
+    sweeps maps a name to a spec as in SWEEPS.
+    '''
+    jobs = {}
+    for name, spec in sweeps.items():
+        for value in spec["values"]:
+            path = os.path.join(root, spec["pattern"].format(value))
+            jobs[(name, value)] = {**spec, "value": value, "path": path}
+
+    results = {name: {} for name in sweeps}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(analyse_point, job): key for key, job in jobs.items()}
+        for future in as_completed(futures):
+            name, value = futures[future]
+            try:
+                ratio = future.result()
+            except OSError as e:
+                print(f"{name}: skipping {sweeps[name]['axis']}={value}: {e}")
+                ratio = None
+            results[name][value] = ratio
+            if ratio is not None:
+                print(f"{name}: {sweeps[name]['axis']}={value}, schedulability={ratio}")
+
+            if len(results[name]) == len(sweeps[name]["values"]):
+                rows = [(v, results[name][v]) for v in sweeps[name]["values"] if results[name][v] is not None]
+                if rows:
+                    write_atomically(os.path.join(outdir, f"{name}_data_Jiang.csv"), rows)
+
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compute the Jiang et al. (Theorem 1) schedulability ratios of the figure sweeps in parallel."
+    )
+    parser.add_argument("sweeps", nargs="*", help=f"Sweeps to run (default: all of {', '.join(SWEEPS)})")
+    parser.add_argument("--root", default=REPO, help="Folder the task-set file patterns are relative to (default: the repository)")
+    parser.add_argument("--outdir", default=".", help="Folder for the FigureX_data_Jiang.csv files (default: .)")
+    parser.add_argument("--workers", type=int, default=6, help="Number of parallel processes (default: 6)")
+    parser.add_argument("--name", default=None, help="Run a custom sweep with this name instead of the predefined ones")
+    parser.add_argument("--pattern", default=None, help="Task-set file pattern of the custom sweep, {} is replaced by the value")
+    parser.add_argument("--axis", default="value", help="Name of the swept parameter of the custom sweep")
+    parser.add_argument("--values", nargs="+", default=None, help="Values of the custom sweep")
+    parser.add_argument("-m", default="4", help="Number of executor-threads of the custom sweep, or 'value' (default: 4)")
+    parser.add_argument("--chains", default=None, help="Chains per task set of the custom sweep, or 'value'")
+    parser.add_argument("--callbacks", default=None, help="Callbacks per chain of the custom sweep, or 'value'")
+    args = parser.parse_args()
+
+    if args.name is not None:
+        if args.pattern is None or args.values is None:
+            parser.error("--name requires --pattern and --values")
+        as_setting = lambda s: s if s in (None, "value") else int(s)
+        sweeps = {args.name: {"axis": args.axis, "values": args.values, "pattern": args.pattern,
+                              "m": as_setting(args.m), "chains": as_setting(args.chains),
+                              "callbacks": as_setting(args.callbacks)}}
+    else:
+        unknown = [s for s in args.sweeps if s not in SWEEPS]
+        if unknown:
+            parser.error(f"unknown sweeps: {', '.join(unknown)}")
+        sweeps = {name: SWEEPS[name] for name in (args.sweeps or SWEEPS)}
+
+    os.makedirs(args.outdir, exist_ok=True)
+    run_sweeps(sweeps, args.root, args.outdir, args.workers)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+import os
+import sys
+import csv
+import random
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from nptest import run_nptest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "jiang_et_al"))
+sys.path.insert(0, os.path.join(HERE, "..", "this_paper"))
+from JRTA import chains_to_jiang, jiang_schedulable
+from sag_input import split_chains, chains_to_tasks, chain_priorities, random_priorities, write_task_set_csvs, \
+    read_tasks_file, tasks_from_job_csvs
+from convert_sobhani_to_sag import convert_file_to_tasksets_odd_chains
+
+def jiang_analysis(job):
+    '''
+    Theorem 1 of Jiang et al., see jiang_schedulable().
+    '''
+    return int(jiang_schedulable(chains_to_jiang(job["chains"]), job["m"]))
+
+def existing_priorities(folder, index, chains):
+    '''
+    Priorities of task set index (counted from 1) in the folder that generate_csv_n_task_sets_odd_chains()
+    wrote from the same task-set file, where it is task_set_<index - 1>.csv (or tasks_<index - 1>.csv).
+    '''
+    identifier = index - 1
+    tasks_csv_name = os.path.join(folder, f"tasks_{identifier}.csv")
+    if os.path.exists(tasks_csv_name):
+        tasks = read_tasks_file(tasks_csv_name)
+    else:
+        tasks = tasks_from_job_csvs(os.path.join(folder, f"task_set_{identifier}.csv"),
+                                    os.path.join(folder, f"pred_{identifier}.csv"))
+    return chain_priorities(tasks, chains)
+
+def sag_analysis(job):
+    '''
+    Our analysis: the task set is expanded to jobs and analysed with nptest. The priorities are
+    those of the existing SAG inputs of the task set (see existing_priorities()) or, without
+    sag_inputs, random ones (seeded per task set, so all runs use the same priorities).
+    '''
+    chains = job["chains"]
+    if job["sag_inputs"]:
+        priority = existing_priorities(job["sag_inputs"].format(job["point"]), job["index"], chains)
+    else:
+        priority = random_priorities(chains, random.Random(f"{job['seed']}-{job['point']}-{job['index']}"))
+    tasks = chains_to_tasks(chains, priority)
+
+    folder = os.path.join(job["workdir"], f"tasksets_{job['point']}")
+    os.makedirs(folder, exist_ok=True)
+    jobs_csv_name = os.path.join(folder, f"task_set_{job['index']}.csv")
+    pred_csv_name = os.path.join(folder, f"pred_{job['index']}.csv")
+    write_task_set_csvs(tasks, jobs_csv_name, pred_csv_name, job["bcet"])
+
+    try:
+        return run_nptest(jobs_csv_name, pred_csv_name, job["m"], job["nptest"])["schedulable"]
+    except RuntimeError as e:
+        print(e)
+        return 0
+
+# Analyses that can be compared. The analyses of Sobhani et al. and Nasri et al. are
+# MATLAB scripts (PWA_CD.m) and have to be run separately.
+ANALYSES = {
+    "Jiang": jiang_analysis,
+    "Ours": sag_analysis,
+}
+
+def _run_analysis(job):
+    return job["analysis"], job["point"], job["index"], ANALYSES[job["analysis"]](job)
+
+def compare(points, analyses, workers=6, **options):
+    '''
+    Runs all analyses on all task sets of a sweep.
+
+    points is a list of (value, path, m) tuples. Every task-set file is parsed once, even
+    if several points share it (e.g. Figure 10, which only varies m), and every
+    (analysis, task set) pair is analysed on the process pool.
+    Returns {(point, index): {analysis: verdict}}.
+    '''
+    parsed = {}
+    jobs = []
+    for value, path, m in points:
+        if path not in parsed:
+            parsed[path] = [split_chains(ts, chain_lengths)
+                            for ts, chain_lengths in convert_file_to_tasksets_odd_chains(path)]
+        for index, chains in enumerate(parsed[path], start=1):
+            for analysis in analyses:
+                jobs.append({"analysis": analysis, "point": value, "index": index,
+                             "chains": chains, "m": m, **options})
+
+    verdicts = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for analysis, point, index, verdict in executor.map(_run_analysis, jobs, chunksize=16):
+            verdicts.setdefault((point, index), {})[analysis] = verdict
+
+    return verdicts
+
+def write_verdicts(verdicts, analyses, output_file):
+    '''
+    Writes one row per task set with the verdict of every analysis.
+    '''
+    with open(output_file, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["point", "task_set", *analyses])
+        for (point, index), row in verdicts.items():
+            writer.writerow([point, index, *[row[a] for a in analyses]])
+
+def write_ratios(verdicts, analyses, figure):
+    '''
+    Writes the FigureX_data_<analysis>.csv files (point, schedulability ratio) used by line_plots.py.
+    '''
+    for analysis in analyses:
+        ones = {}
+        totals = {}
+        for (point, _), row in verdicts.items():
+            ones[point] = ones.get(point, 0) + row[analysis]
+            totals[point] = totals.get(point, 0) + 1
+
+        with open(f"{figure}_data_{analysis}.csv", "w+", newline="") as f:
+            writer = csv.writer(f)
+            for point in totals:
+                writer.writerow([point, ones[point] / totals[point]])
+
+def dominance_violations(verdicts, better, worse):
+    '''
+    Task sets that analysis `worse` deems schedulable but analysis `better` does not.
+    '''
+    return [key for key, row in verdicts.items() if row[worse] and not row[better]]
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run several schedulability analyses on the same task-set files and compare their verdicts per task set."
+    )
+    parser.add_argument("figure", help="Name of the figure, used as prefix of the output files (e.g. Figure6a)")
+    parser.add_argument("pattern", help="Task-set file pattern, where {} is replaced by the sweep value")
+    parser.add_argument("--axis", default="value", help="Name of the swept parameter; with 'm' the value is the number of threads")
+    parser.add_argument("--values", nargs="+", required=True, help="Sweep values")
+    parser.add_argument("-m", type=int, default=4, help="Number of executor-threads (default: 4)")
+    parser.add_argument("--analyses", nargs="+", default=list(ANALYSES), choices=list(ANALYSES),
+                        help="Analyses to run (default: all)")
+    parser.add_argument("--bcet", type=float, default=1.0, help="BCET as a fraction of the WCET for the SAG (default: 1.0)")
+    parser.add_argument("--sag-inputs", default=None,
+                        help="Folder pattern, where {} is replaced by the sweep value, with the SAG inputs that "
+                             "convert_sobhani_to_sag.py wrote from the task-set files; the SAG uses their priorities")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Seed for the random priorities of the SAG without --sag-inputs (default: 0)")
+    parser.add_argument("--workdir", default="SAG_input_compare", help="Folder for the generated job CSVs")
+    parser.add_argument("--nptest", default=None, help="Path to the nptest binary")
+    parser.add_argument("--workers", type=int, default=6, help="Number of parallel processes (default: 6)")
+    parser.add_argument("--dominates", nargs=2, metavar=("BETTER", "WORSE"), default=None,
+                        help="Check per task set that BETTER deems schedulable everything WORSE does, e.g. Ours Jiang")
+    args = parser.parse_args()
+
+    points = []
+    for value in args.values:
+        m = int(value) if args.axis == "m" else args.m
+        points.append((value, args.pattern.format(value), m))
+
+    if "Ours" in args.analyses and args.sag_inputs is None:
+        print("No --sag-inputs: the SAG uses random priorities, not those of the figures")
+    verdicts = compare(points, args.analyses, args.workers, bcet=args.bcet, seed=args.seed,
+                       sag_inputs=args.sag_inputs, workdir=args.workdir, nptest=args.nptest)
+
+    write_verdicts(verdicts, args.analyses, f"{args.figure}_verdicts.csv")
+    write_ratios(verdicts, args.analyses, args.figure)
+
+    if args.dominates:
+        better, worse = args.dominates
+        violations = dominance_violations(verdicts, better, worse)
+        for point, index in violations:
+            print(f"{args.axis}={point}, task set {index}: {worse} schedulable, {better} not")
+        print(f"{len(violations)} task sets violate {better} >= {worse}")
+        if violations:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+import sys
+import csv
+import math
+import shlex
+import random
+import argparse
+import statistics
+
+from nptest import NPTEST, run_nptest, find_task_set_pairs
+
+def sample_corpus(folder, size=None, seed=0):
+    '''
+    The task sets of folder, or a sample of size of them drawn with seed,
+    so that every comparison runs on the same corpus.
+    '''
+    pairs = find_task_set_pairs(folder)
+    if size is not None and size < len(pairs):
+        pairs = sorted(random.Random(seed).sample(pairs, size))
+    return pairs
+
+def _run(pair, m, build):
+    nptest, extra_args = build
+    try:
+        return run_nptest(pair[0], pair[1], m, nptest, extra_args)
+    except RuntimeError as e:
+        print(e)
+        return None
+
+def compare_builds(pairs, m, base, new, repeats=3):
+    '''
+    Runs both builds, given as (nptest, extra_args), repeats times on every task set.
+    The runs are interleaved and the order of the two builds alternates, so that drift
+    of the machine affects both alike. Returns one row per task set with the verdicts,
+    the median CPU time, the peak memory and the #states of both builds.
+    '''
+    runs = {pair: {"base": [], "new": []} for pair in pairs}
+    for rep in range(repeats):
+        for idx, pair in enumerate(pairs):
+            order = [("base", base), ("new", new)]
+            if (rep + idx) % 2:
+                order.reverse()
+            for side, build in order:
+                runs[pair][side].append(_run(pair, m, build))
+
+    rows = []
+    for pair in pairs:
+        row = {"file": pair[0]}
+        for side in ["base", "new"]:
+            results = runs[pair][side]
+            if any(r is None for r in results):
+                row.update({f"{side}_schedulable": None, f"{side}_cpu_time": None,
+                            f"{side}_memory": None, f"{side}_states": None})
+                continue
+            row[f"{side}_schedulable"] = results[0]["schedulable"]
+            row[f"{side}_cpu_time"] = statistics.median(r["cpu_time"] for r in results)
+            row[f"{side}_memory"] = max(r["memory"] for r in results)
+            row[f"{side}_states"] = results[0]["states"]
+        rows.append(row)
+    return rows
+
+def ratio(new, base):
+    if new is None or base is None or base <= 0:
+        return None
+    return new / base
+
+def geomean(values):
+    values = [v for v in values if v is not None and v > 0]
+    if not values:
+        return None
+    return math.exp(sum(math.log(v) for v in values) / len(values))
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare two nptest builds (or flag sets) on the same corpus and fail on verdict "
+                    "mismatches or performance regressions."
+    )
+    parser.add_argument("corpus", help="Folder with task_set_x.csv/pred_x.csv pairs")
+    parser.add_argument("--base", default=NPTEST, help="Baseline nptest binary (default: NPTEST)")
+    parser.add_argument("--new", default=None, help="nptest binary to compare (default: the baseline binary)")
+    parser.add_argument("--base-args", default="", help="Extra arguments for the baseline, e.g. \"--timeout 60\"")
+    parser.add_argument("--new-args", default="", help="Extra arguments for the new build")
+    parser.add_argument("-m", type=int, default=4, help="Number of executor-threads (default: 4)")
+    parser.add_argument("--size", type=int, default=None, help="Number of task sets to sample from the corpus (default: all)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for sampling the corpus (default: 0)")
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per build and task set (default: 3)")
+    parser.add_argument("--max-cpu-ratio", type=float, default=1.10,
+                        help="Fail if the geometric mean of the CPU time ratios (new/base) exceeds this (default: 1.10)")
+    parser.add_argument("--max-memory-ratio", type=float, default=1.10,
+                        help="Fail if the geometric mean of the memory ratios exceeds this (default: 1.10)")
+    parser.add_argument("--max-states-ratio", type=float, default=1.0,
+                        help="Fail if the total #states ratio exceeds this (default: 1.0)")
+    parser.add_argument("--output", default="compare_nptest.csv", help="Per task set results (default: compare_nptest.csv)")
+    args = parser.parse_args()
+
+    pairs = sample_corpus(args.corpus, args.size, args.seed)
+    if not pairs:
+        print(f"No task sets found in {args.corpus}")
+        sys.exit(1)
+
+    base = (args.base, shlex.split(args.base_args))
+    new = (args.new or args.base, shlex.split(args.new_args))
+    rows = compare_builds(pairs, args.m, base, new, args.repeats)
+
+    columns = ["file", "base_schedulable", "new_schedulable", "base_cpu_time", "new_cpu_time",
+               "base_memory", "new_memory", "base_states", "new_states"]
+    with open(args.output, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow([*columns, "cpu_ratio", "memory_ratio", "states_ratio"])
+        for row in rows:
+            writer.writerow([*["" if row[c] is None else row[c] for c in columns],
+                             *["" if r is None else r for r in (ratio(row["new_cpu_time"], row["base_cpu_time"]),
+                                                                ratio(row["new_memory"], row["base_memory"]),
+                                                                ratio(row["new_states"], row["base_states"]))]])
+
+    mismatches = [row for row in rows if row["base_schedulable"] is None or row["new_schedulable"] is None
+                  or row["base_schedulable"] != row["new_schedulable"]]
+    for row in mismatches:
+        print(f"Verdict mismatch for {row['file']}: base {row['base_schedulable']}, new {row['new_schedulable']}")
+
+    compared = [row for row in rows if row not in mismatches]
+    cpu = geomean(ratio(row["new_cpu_time"], row["base_cpu_time"]) for row in compared)
+    memory = geomean(ratio(row["new_memory"], row["base_memory"]) for row in compared)
+    states = ratio(sum(row["new_states"] for row in compared), sum(row["base_states"] for row in compared))
+
+    failed = bool(mismatches)
+    print(f"{len(rows)} task sets, {len(mismatches)} verdict mismatches")
+    for name, value, limit in [("CPU time", cpu, args.max_cpu_ratio), ("memory", memory, args.max_memory_ratio),
+                               ("#states", states, args.max_states_ratio)]:
+        if value is None:
+            print(f"{name:10s} new/base: -")
+            continue
+        exceeded = value > limit
+        failed = failed or exceeded
+        print(f"{name:10s} new/base: {value:.3f} (limit {limit:.2f}){'  REGRESSION' if exceeded else ''}")
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+import os
+import sys
+import csv
+import math
+import argparse
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+from nptest import run_nptest, find_task_set_pairs
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "jiang_et_al"))
+sys.path.insert(0, os.path.join(HERE, "..", "this_paper"))
+from JRTA import jiang_schedulable, convert_sobhani_synthetic_to_jiang, convert_sobhani_syntethic_odd_to_jiang
+from task_set_index import load_index
+
+def jiang_probe(taskset, m):
+    '''
+    Schedulability of one task set under Theorem 1 of Jiang et al. with m executor-threads,
+    see jiang_schedulable().
+    '''
+    return jiang_schedulable(taskset, m)
+
+def sag_probe(pair, m, nptest=None):
+    '''
+    Schedulability of one job/precedence CSV pair under the SAG with m executor-threads.
+    '''
+    task_file, pred_file = pair
+    try:
+        return run_nptest(task_file, pred_file, m, nptest)["schedulable"] == 1
+    except RuntimeError as e:
+        print(e)
+        return False
+
+def _run_probe(job):
+    probe, idx, item, m = job
+    return idx, m, probe(item, m)
+
+def min_threads_bound(utilization):
+    '''
+    ceil(U): with fewer threads, the load of a task set exceeds the processing capacity.
+    '''
+    return max(1, math.ceil(utilization - 1e-9))
+
+def next_probe(lo, hi, m_max, start=1):
+    '''
+    Next number of threads to analyse for a task set, given that it is unschedulable
+    with lo threads (start - 1 if nothing is known) and schedulable with hi threads (None if unknown).
+    Gallops (start, 2 * start, 4 * start, ...) until a schedulable m is found, then bisects (lo, hi].
+    Returns None when the search is finished.
+    '''
+    if hi is None:
+        if lo >= m_max:
+            return None
+        return min(start if lo < start else 2 * lo, m_max)
+    if hi - lo <= 1:
+        return None
+    return (lo + hi) // 2
+
+def min_threads(items, probe, m_max=16, workers=6, starts=None):
+    '''
+    Finds, for every item (task set), the smallest number of executor-threads m <= m_max
+    for which probe(item, m) deems it schedulable, or None if there is none.
+    starts holds the smallest m that can be schedulable per item (see min_threads_bound()), default 1.
+
+    Schedulability is assumed to be monotone in m, which holds for jiang_schedulable()
+    and which we also assume for the SAG. All task sets are searched in lockstep: every
+    round, the next probe of every unfinished task set is analysed on the worker pool.
+    '''
+    if starts is None:
+        starts = [1] * len(items)
+    lo = [start - 1 for start in starts]
+    hi = [None] * len(items)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while True:
+            jobs = []
+            for idx, item in enumerate(items):
+                m = next_probe(lo[idx], hi[idx], m_max, starts[idx])
+                if m is not None:
+                    jobs.append((probe, idx, item, m))
+            if not jobs:
+                break
+
+            for idx, m, schedulable in executor.map(_run_probe, jobs):
+                if schedulable:
+                    hi[idx] = m
+                else:
+                    lo[idx] = m
+
+    return hi
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Find the minimum number of executor-threads that makes each task set schedulable."
+    )
+    parser.add_argument("analysis", choices=["jiang", "sag"],
+                        help="jiang: Theorem 1 of Jiang et al. on a task-set text file, "
+                             "sag: nptest on a folder with task_set_x.csv/pred_x.csv pairs")
+    parser.add_argument("input", help="Task-set text file (jiang) or folder (sag)")
+    parser.add_argument("--chains", type=int, default=None,
+                        help="Number of chains per task set (jiang, only for equal-length chains as in Sobhani's files)")
+    parser.add_argument("--callbacks", type=int, default=None,
+                        help="Number of callbacks per chain (jiang, only together with --chains)")
+    parser.add_argument("--m-max", type=int, default=16, help="Largest number of threads to try (default: 16)")
+    parser.add_argument("--workers", type=int, default=6, help="Number of parallel processes (default: 6)")
+    parser.add_argument("--nptest", default=None, help="Path to the nptest binary (sag)")
+    parser.add_argument("--output", default="min_threads.csv", help="Output CSV file (default: min_threads.csv)")
+    args = parser.parse_args()
+
+    if args.analysis == "jiang":
+        if args.chains is not None and args.callbacks is not None:
+            items = convert_sobhani_synthetic_to_jiang(args.chains, args.callbacks, args.input)
+        else:
+            items = convert_sobhani_syntethic_odd_to_jiang(args.input)
+        names = [str(i) for i in range(len(items))]
+        starts = [min_threads_bound(sum(exec_times[k] / periods[k] for k in periods))
+                  for periods, exec_times, _ in items]
+        probe = jiang_probe
+    else:
+        items = find_task_set_pairs(args.input)
+        names = [task_file for task_file, _ in items]
+        # U from the index.csv of the folder, if it has one
+        utilizations = {record["task_file"]: record["U"] for record in load_index(args.input)}
+        starts = [min_threads_bound(utilizations[task_file]) if task_file in utilizations else 1
+                  for task_file, _ in items]
+        probe = partial(sag_probe, nptest=args.nptest)
+
+    results = min_threads(items, probe, args.m_max, args.workers, starts)
+
+    with open(args.output, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["task_set", "min_m"])
+        for name, m in zip(names, results):
+            writer.writerow([name, m if m is not None else ""])
+            print(f"{name}: {m if m is not None else f'> {args.m_max}'}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+import os
+import sys
+import csv
+import time
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "this_paper"))
+from profiling import span
+
+# Path to the nptest binary of schedule_abstraction-ros2. It can be overridden
+# with the NPTEST environment variable, or per call with the nptest argument.
+NPTEST = os.environ.get("NPTEST", "/home/radu/repos/schedule_abstraction-ros2/build/nptest")
+
+# Columns of the single CSV line that nptest prints for each analysed task set, e.g.
+# /path/to/task_set_x.csv,  0,  3560,  26,  26,  25,  2,  0.000308,  6.878906,  0,  2
+RESULT_COLUMNS = ["file", "schedulable", "jobs", "nodes", "states", "edges",
+                  "max_width", "cpu_time", "memory", "timeout", "cpus"]
+
+def parse_result_line(line):
+    '''
+    Parses one nptest output line into a dictionary keyed by RESULT_COLUMNS.
+    Returns None if the line is not a valid result line.
+    '''
+    parts = [p.strip() for p in line.strip().split(",")]
+    if len(parts) < len(RESULT_COLUMNS):
+        return None
+
+    try:
+        result = {
+            "file": parts[0],
+            "schedulable": int(parts[1]),
+            "jobs": int(parts[2]),
+            "nodes": int(parts[3]),
+            "states": int(parts[4]),
+            "edges": int(parts[5]),
+            "max_width": int(parts[6]),
+            "cpu_time": float(parts[7]),
+            "memory": float(parts[8]),
+            "timeout": int(parts[9]),
+            "cpus": int(parts[10]),
+        }
+    except ValueError:
+        return None
+
+    return result
+
+def nptest_command(task_file, pred_file, m, nptest=None, extra_args=()):
+    '''
+    Builds the nptest command line used throughout the experiments.
+    '''
+    return [nptest or NPTEST, task_file, "-m", str(m), "-p", pred_file, *extra_args]
+
+# Columns of the resource usage that run_command_usage() reports per child process.
+USAGE_COLUMNS = ["wall_time", "user_time", "system_time", "max_rss", "minor_faults", "major_faults",
+                 "voluntary_switches", "involuntary_switches"]
+
+def run_command_usage(cmd):
+    '''
+    Runs cmd and returns (returncode, stdout, stderr, usage), where usage holds the USAGE_COLUMNS of
+    the child as measured by the kernel (os.wait4): wall time and user/system CPU time in seconds,
+    max RSS in KiB, page faults and context switches.
+    Launching the process and running it are profiled as separate stages.
+    '''
+    with tempfile.TemporaryFile("w+") as out, tempfile.TemporaryFile("w+") as err:
+        start = time.time()
+        with span("nptest.spawn", cat="runner"):
+            process = subprocess.Popen(cmd, stdout=out, stderr=err, text=True)
+        with span("nptest.run", cat="runner"):
+            # Reap the child ourselves rather than with process.wait(), which discards its rusage.
+            _, status, rusage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        usage = {
+            "wall_time": time.time() - start,
+            "user_time": rusage.ru_utime,
+            "system_time": rusage.ru_stime,
+            "max_rss": rusage.ru_maxrss,
+            "minor_faults": rusage.ru_minflt,
+            "major_faults": rusage.ru_majflt,
+            "voluntary_switches": rusage.ru_nvcsw,
+            "involuntary_switches": rusage.ru_nivcsw,
+        }
+        out.seek(0)
+        err.seek(0)
+        return process.returncode, out.read(), err.read(), usage
+
+def run_command(cmd):
+    '''
+    Runs cmd and returns (returncode, stdout, stderr).
+    '''
+    returncode, stdout, stderr, _ = run_command_usage(cmd)
+    return returncode, stdout, stderr
+
+def run_nptest(task_file, pred_file, m, nptest=None, extra_args=()):
+    '''
+    Runs nptest on one job/precedence CSV pair and returns the parsed result line.
+    Raises RuntimeError if nptest fails or prints something unexpected.
+    '''
+    cmd = nptest_command(task_file, pred_file, m, nptest, extra_args)
+    returncode, stdout, stderr = run_command(cmd)
+    if returncode != 0:
+        raise RuntimeError(f"Error processing {task_file} and {pred_file}: {stderr.strip()}")
+
+    result = parse_result_line(stdout)
+    if result is None:
+        raise RuntimeError(f"Unexpected nptest output for {task_file}: {stdout.strip()}")
+
+    return result
+
+def read_rta(task_file):
+    '''
+    Reads the response-time file that nptest writes next to the task set when it
+    is called with -r, i.e. task_set_x.rta.csv.
+    Returns a list of (task_id, job_id, bcct, wcct, bcrt, wcrt) tuples.
+    '''
+    rta_file = os.path.splitext(task_file)[0] + ".rta.csv"
+    rows = []
+
+    with open(rta_file, "r") as f:
+        next(f)  # Skip the header.
+        for line in f:
+            parts = line.strip().split(",")
+            if len(parts) < 6:
+                continue
+            rows.append(tuple(int(p) for p in parts[:6]))
+
+    return rows
+
+def read_width(task_file):
+    '''
+    Reads the width profile that nptest writes next to the task set, i.e. task_set_x.width.csv.
+    Returns a list of (depth, width_nodes, width_states) tuples.
+    '''
+    width_file = os.path.splitext(task_file)[0] + ".width.csv"
+    rows = []
+
+    with open(width_file, "r") as f:
+        next(f)  # Skip the header.
+        for line in f:
+            parts = line.strip().split(",")
+            if len(parts) < 3:
+                continue
+            rows.append(tuple(int(p) for p in parts[:3]))
+
+    return rows
+
+def task_set_features(task_file, pred_file=None):
+    '''
+    Workload features of a job CSV (and its precedence CSV, if given): number of jobs
+    and callbacks, utilization over the hyperperiod, BCET/WCET ratio and, with a
+    precedence file, the number of chains (callbacks without a predecessor).
+    '''
+    tasks = set()
+    jobs = 0
+    cost_min = 0
+    cost_max = 0
+    hyperperiod = 0
+
+    with open(task_file, newline='') as f:
+        reader = csv.reader(f, skipinitialspace=True)
+        next(reader)  # Skip the header.
+        for row in reader:
+            if len(row) < 8:
+                continue
+            tasks.add(int(row[0]))
+            jobs += 1
+            cost_min += int(row[4])
+            cost_max += int(row[5])
+            hyperperiod = max(hyperperiod, int(row[6]))
+
+    features = {
+        "jobs": jobs,
+        "callbacks": len(tasks),
+        "chains": None,
+        "U": cost_max / hyperperiod if hyperperiod else 0.0,
+        "bcet_ratio": cost_min / cost_max if cost_max else 0.0,
+    }
+
+    if pred_file is not None:
+        successors = set()
+        with open(pred_file, newline='') as f:
+            reader = csv.reader(f, skipinitialspace=True)
+            next(reader)  # Skip the header.
+            for row in reader:
+                if len(row) >= 4:
+                    successors.add(int(row[2]))
+        features["chains"] = len(tasks - successors)
+
+    return features
+
+def find_task_set_pairs(folder):
+    '''
+    Walks folder in lexicographic order and returns the sorted list of
+    (task_file, pred_file) pairs, i.e. task_set_x.csv files with a matching pred_x.csv.
+    Task sets without a predecessor file are reported and skipped.
+    '''
+    pairs = []
+    for root, dirs, files in os.walk(folder):
+        dirs.sort()
+        files.sort()
+        for file in files:
+            if not (file.startswith("task_set_") and file.endswith(".csv")):
+                continue
+            identifier = file[len("task_set_"):-len(".csv")]
+            if "." in identifier:
+                continue # nptest output such as task_set_x.rta.csv
+            task_file = os.path.join(root, file)
+            pred_file = os.path.join(root, f"pred_{identifier}.csv")
+            if os.path.exists(pred_file):
+                pairs.append((task_file, pred_file))
+            else:
+                print(f"Missing predecessor file for: {task_file} (expected {pred_file})")
+
+    pairs.sort(key=lambda t: t[0])
+    return pairs
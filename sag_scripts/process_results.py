@@ -1,13 +1,41 @@
 #!/usr/bin/env python3
 import os
 import csv
+import sys
+import math
 import argparse
+import statistics
 
-def process_results(input_file, output_file, base_folder=None):
+from nptest import parse_result_line, task_set_features
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "this_paper"))
+from profiling import span
+
+def get_group_key(file_path, base_folder=None):
+    file_dir = os.path.dirname(file_path)
+    if base_folder:
+        # Calculate relative path from the provided base folder.
+        return os.path.relpath(file_dir, start=base_folder)
+    # Fallback: use the immediate parent folder name.
+    return os.path.basename(file_dir)
+
+def read_weights(folder):
+    '''
+    Reads the weights.csv of a folder of task sets that were generated with stratified or
+    quasi-random sampling. Returns {task set identifier: weight}, or None if there is none.
+    '''
+    weights_file = os.path.join(folder, "weights.csv")
+    if not os.path.exists(weights_file):
+        return None
+    with open(weights_file, newline='') as f:
+        return {row["task_set"]: float(row["weight"]) for row in csv.DictReader(f)}
+
+def process_results(input_file, output_file, base_folder=None, weighted=False):
     groups = {}  # Dictionary to hold data per sub-folder (grouping key)
+    weights = {}  # Weights per task-set folder, only used if weighted
 
     # Read the result.csv file.
-    with open(input_file, newline='') as csvfile:
+    with span("aggregator.read", cat="aggregator"), open(input_file, newline='') as csvfile:
         reader = csv.reader(csvfile, skipinitialspace=True)
         for row in reader:
             if not row or len(row) < 2:
@@ -19,31 +47,157 @@ def process_results(input_file, output_file, base_folder=None):
             except ValueError:
                 continue  # Skip rows where the value isn't an integer.
 
-            # Determine grouping key.
-            file_dir = os.path.dirname(file_path)
-            if base_folder:
-                # Calculate relative path from the provided base folder.
-                group_key = os.path.relpath(file_dir, start=base_folder)
-            else:
-                # Fallback: use the immediate parent folder name.
-                group_key = os.path.basename(file_dir)
+            group_key = get_group_key(file_path, base_folder)
 
             if group_key not in groups:
-                groups[group_key] = {'ones': 0, 'total': 0}
+                groups[group_key] = {'ones': 0, 'total': 0, 'weighted_ones': 0.0, 'weight': 0.0}
             groups[group_key]['total'] += 1
             if value == 1:
                 groups[group_key]['ones'] += 1
 
+            if weighted:
+                file_dir, name = os.path.split(file_path)
+                if file_dir not in weights:
+                    weights[file_dir] = read_weights(file_dir)
+                if weights[file_dir] is None:
+                    print(f"Missing weights.csv for {file_path}, using weight 1")
+                    weights[file_dir] = {}
+                weight = weights[file_dir].get(name[len("task_set_"):-len(".csv")], 1.0)
+                groups[group_key]['weight'] += weight
+                if value == 1:
+                    groups[group_key]['weighted_ones'] += weight
+
     # Write the calculated ratios to the output CSV.
-    with open(output_file, 'w', newline='') as out_csv:
+    with span("aggregator.write", cat="aggregator"), open(output_file, 'w', newline='') as out_csv:
         writer = csv.writer(out_csv)
-        writer.writerow(["subfolder", "ones", "total", "ratio"])
+        writer.writerow(["subfolder", "ones", "total", "ratio", *(["weighted_ratio"] if weighted else [])])
         for subfolder in sorted(groups.keys()):
             ones = groups[subfolder]['ones']
             total = groups[subfolder]['total']
             ratio = ones / total if total else 0
-            writer.writerow([subfolder, ones, total, ratio])
-            print(f"{subfolder}: {ones}/{total} = {ratio:.2f}")
+            if weighted:
+                weight = groups[subfolder]['weight']
+                weighted_ratio = groups[subfolder]['weighted_ones'] / weight if weight else 0
+                writer.writerow([subfolder, ones, total, ratio, weighted_ratio])
+                print(f"{subfolder}: {ones}/{total} = {ratio:.2f}, weighted {weighted_ratio:.3f}")
+            else:
+                writer.writerow([subfolder, ones, total, ratio])
+                print(f"{subfolder}: {ones}/{total} = {ratio:.2f}")
+
+REPORT_METRICS = ["cpu_time", "memory", "states"]
+PERCENTILES = [50, 90, 99, 100]
+
+def percentile(values, q):
+    '''
+    q-th percentile of values with linear interpolation (q=100 is the maximum).
+    '''
+    values = sorted(values)
+    pos = (len(values) - 1) * q / 100
+    lo = math.floor(pos)
+    hi = math.ceil(pos)
+    return values[lo] + (values[hi] - values[lo]) * (pos - lo)
+
+def read_result_lines(input_file):
+    '''
+    Parses all nptest result lines of input_file. For every task set, the number of chains is
+    added if its pred_x.csv is next to it (None otherwise).
+    '''
+    results = []
+    with open(input_file) as f:
+        for line in f:
+            result = parse_result_line(line)
+            if result is None:
+                continue
+            folder, name = os.path.split(result["file"])
+            pred_file = os.path.join(folder, "pred_" + name[len("task_set_"):])
+            result["chains"] = None
+            if name.startswith("task_set_") and os.path.exists(pred_file) and os.path.exists(result["file"]):
+                result["chains"] = task_set_features(result["file"], pred_file)["chains"]
+            results.append(result)
+    return results
+
+def power_fit(xs, ys):
+    '''
+    Least-squares fit of y = a * x^b in log-log space. Returns (a, b), or None if there are
+    fewer than two distinct positive x values.
+    '''
+    points = [(math.log(x), math.log(y)) for x, y in zip(xs, ys) if x > 0 and y > 0]
+    if len(set(p[0] for p in points)) < 2:
+        return None
+    fit = statistics.linear_regression([p[0] for p in points], [p[1] for p in points])
+    return math.exp(fit.intercept), fit.slope
+
+def find_outliers(results, fit, k=3.0):
+    '''
+    Task sets whose CPU time deviates from the fit against #jobs by more than k robust
+    standard deviations (1.4826 * median absolute deviation) of the log residuals.
+    Returns (result, CPU time / fit, slow) per outlier, where slow tells whether its residual is
+    above the median residual; the ratio to the fit alone does not, as the median need not be 0.
+    '''
+    a, b = fit
+    residuals = [(r, math.log(r["cpu_time"]) - math.log(a * r["jobs"] ** b))
+                 for r in results if r["cpu_time"] > 0 and r["jobs"] > 0]
+    if len(residuals) < 3:
+        return []
+    center = statistics.median(res for _, res in residuals)
+    mad = statistics.median(abs(res - center) for _, res in residuals)
+    if mad == 0:
+        return []
+    return [(r, math.exp(res), res > center) for r, res in residuals if abs(res - center) > k * 1.4826 * mad]
+
+def report_results(input_file, report_file, base_folder=None):
+    '''
+    Writes percentiles of the CPU time, memory and #states per sub-folder to report_file,
+    fits the CPU time and memory against #jobs and #chains, and lists the outliers.
+    '''
+    results = read_result_lines(input_file)
+    if not results:
+        print(f"No nptest result lines in {input_file}")
+        return
+
+    groups = {}
+    for result in results:
+        groups.setdefault(get_group_key(result["file"], base_folder), []).append(result)
+
+    with open(report_file, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["subfolder", "total", *[f"{metric}_{'max' if q == 100 else f'p{q}'}" for metric in REPORT_METRICS for q in PERCENTILES]])
+        for subfolder in sorted(groups.keys()):
+            rows = groups[subfolder]
+            writer.writerow([subfolder, len(rows),
+                             *[percentile([r[metric] for r in rows], q) for metric in REPORT_METRICS for q in PERCENTILES]])
+
+    print(f"{'subfolder':24s} {'total':>6s} {'cpu p50':>10s} {'cpu p99':>10s} {'mem p99':>10s} {'states max':>12s}")
+    for subfolder in sorted(groups.keys()):
+        rows = groups[subfolder]
+        print(f"{subfolder:24s} {len(rows):6d} {percentile([r['cpu_time'] for r in rows], 50):10.4f} "
+              f"{percentile([r['cpu_time'] for r in rows], 99):10.4f} {percentile([r['memory'] for r in rows], 99):10.2f} "
+              f"{max(r['states'] for r in rows):12d}")
+
+    print()
+    jobs_fit = None
+    for cost in ["cpu_time", "memory"]:
+        for size in ["jobs", "chains"]:
+            known = [r for r in results if r[size] is not None]
+            fit = power_fit([r[size] for r in known], [r[cost] for r in known])
+            if fit is None:
+                print(f"{cost} ~ {size}: not enough data")
+                continue
+            print(f"{cost} ~ {fit[0]:.3g} * {size}^{fit[1]:.2f}")
+            if cost == "cpu_time" and size == "jobs":
+                jobs_fit = fit
+
+    if jobs_fit is not None:
+        outliers = find_outliers(results, jobs_fit)
+        slower = sorted([(r, factor) for r, factor, slow in outliers if slow], key=lambda o: -o[1])
+        faster = sorted([(r, factor) for r, factor, slow in outliers if not slow], key=lambda o: o[1])
+        print()
+        print(f"{len(slower)} slow outliers (CPU time far above the fit against #jobs, relative to the median residual):")
+        for r, factor in slower:
+            print(f"  {r['file']}: {r['cpu_time']:.4f}s for {r['jobs']} jobs ({factor:.3g}x the fit)")
+        print(f"{len(faster)} fast outliers (CPU time far below the fit against #jobs, relative to the median residual):")
+        for r, factor in faster:
+            print(f"  {r['file']}: {r['cpu_time']:.4f}s for {r['jobs']} jobs ({factor:.3g}x the fit)")
 
 def main():
     parser = argparse.ArgumentParser(
@@ -52,9 +206,17 @@ def main():
     parser.add_argument("--input", default="result.csv", help="Input CSV file (default: result.csv)")
     parser.add_argument("--output", default="data.csv", help="Output CSV file (default: data.csv)")
     parser.add_argument("--base", default=None, help="Base folder to compute relative path for grouping (optional)")
+    parser.add_argument("--report", default=None,
+                        help="Also write percentiles of CPU time, memory and #states per sub-folder to this CSV "
+                             "and print scaling fits and outliers")
+    parser.add_argument("--weighted", action="store_true",
+                        help="Also report the ratio weighted by the weights.csv next to the task sets "
+                             "(stratified or quasi-random sampling)")
     args = parser.parse_args()
 
-    process_results(args.input, args.output, base_folder=args.base)
+    process_results(args.input, args.output, base_folder=args.base, weighted=args.weighted)
+    if args.report:
+        report_results(args.input, args.report, base_folder=args.base)
 
 if __name__ == '__main__':
     main()
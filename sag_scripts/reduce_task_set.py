@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+'''
+Shrinks a task set on which nptest is slow (or fails) to a small task set on which it is still
+slow, for performance debugging.
+
+The reduction works on the task-level description (tasks_x.csv, or recovered from the job and
+precedence CSVs), in the spirit of delta debugging. In turn it tries to drop whole chains, drop
+single callbacks (their successors inherit their predecessors), give a chain the period of another
+chain (fewer jobs per hyperperiod) and set BCET = WCET, first in large groups and then in smaller
+ones. Every candidate is expanded with the converter of sag_input.py and analysed with nptest,
+several in parallel, and the first one that is still slow is kept. The loop stops when no
+candidate is slow anymore, e.g.
+
+    python reduce_task_set.py task_set_12.csv pred_12.csv --cpu-time 60 --nptest-args "--timeout 90"
+'''
+import os
+import sys
+import math
+import shlex
+import hashlib
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from nptest import run_nptest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "this_paper"))
+from sag_input import predecessors, read_tasks_file, tasks_from_job_csvs, write_tasks_file, write_job_csvs
+
+def tasks_key(tasks):
+    return hashlib.sha1(repr(sorted(tasks)).encode()).hexdigest()[:16]
+
+def nrof_jobs(tasks):
+    hyperperiod = math.lcm(*[t[3] for t in tasks])
+    return sum(hyperperiod // t[3] for t in tasks)
+
+def components(tasks):
+    '''
+    The chains (or DAGs) of a task set, i.e. the sets of task IDs connected by precedences.
+    '''
+    parent = {t[0]: t[0] for t in tasks}
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+    for t in tasks:
+        for p in predecessors(t[2]):
+            parent[find(t[0])] = find(p)
+    groups = {}
+    for t in tasks:
+        groups.setdefault(find(t[0]), []).append(t[0])
+    return [sorted(g) for _, g in sorted(groups.items())]
+
+def drop_tasks(tasks, dropped):
+    '''
+    Removes the tasks in dropped. A remaining task that had a dropped predecessor inherits
+    that predecessor's predecessors, so chains are shortened rather than cut.
+    '''
+    pred_of = {t[0]: predecessors(t[2]) for t in tasks}
+    def inherited(p):
+        if p not in dropped:
+            return (p,)
+        return tuple(q for pp in pred_of[p] for q in inherited(pp))
+
+    reduced = []
+    for task_id, wcet, pred, period, bcet in tasks:
+        if task_id in dropped:
+            continue
+        preds = tuple(sorted(set(q for p in predecessors(pred) for q in inherited(p))))
+        reduced.append((task_id, wcet, preds[0] if len(preds) == 1 else (preds or 0), period, bcet))
+    return reduced
+
+def set_period(tasks, ids, period):
+    return [(t[0], t[1], t[2], period, t[4]) if t[0] in ids else t for t in tasks]
+
+def collapse_bcets(tasks, ids):
+    return [(t[0], t[1], t[2], t[3], t[1]) if t[0] in ids else t for t in tasks]
+
+def chunks(items, n):
+    '''
+    Splits items into n groups of about equal size, as delta debugging does.
+    '''
+    size = math.ceil(len(items) / n)
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+def is_slow(result, cpu_time, states):
+    '''
+    Whether an nptest result has the property to preserve: a timeout, or a CPU time or number of
+    states at least the given thresholds (None to ignore).
+    '''
+    return (result["timeout"] == 1
+            or cpu_time is not None and result["cpu_time"] >= cpu_time
+            or states is not None and result["states"] >= states)
+
+def analyse(job):
+    '''
+    Expands one candidate task set and runs nptest on it. Executed by the worker pool.
+    Returns the parsed result line, or None if nptest failed (e.g. it ran out of memory).
+    '''
+    tasks, m, workdir, nptest, nptest_args = job
+    key = tasks_key(tasks)
+    jobs_csv_name = os.path.join(workdir, f"task_set_{key}.csv")
+    pred_csv_name = os.path.join(workdir, f"pred_{key}.csv")
+    try:
+        write_job_csvs(tasks, jobs_csv_name, pred_csv_name)
+        return run_nptest(jobs_csv_name, pred_csv_name, m, nptest, nptest_args)
+    except RuntimeError:
+        return None
+    finally:
+        for name in (jobs_csv_name, pred_csv_name):
+            if os.path.exists(name):
+                os.remove(name)
+
+def reduce_task_set(tasks, m, cpu_time=None, states=None, failures=False, workers=6,
+                    nptest=None, nptest_args=(), workdir=None):
+    '''
+    Delta-debugging reduction of tasks, (priority, wcet, pred, period, bcet) tuples, while nptest
+    stays slow: cpu_time or states at least the given thresholds, or a timeout. With failures=True,
+    a failing nptest run (e.g. out of memory) also counts as slow.
+
+    Candidates are analysed in batches of workers in parallel and the first slow candidate of
+    a batch, in the order they were proposed, is kept. Every task set is analysed at most once.
+    Returns (reduced tasks, nptest result of the reduced tasks, list of accepted steps).
+    '''
+    memo = {}
+    steps = []
+
+    def slow(result):
+        if result is None:
+            return failures
+        return is_slow(result, cpu_time, states)
+
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp, ProcessPoolExecutor(max_workers=workers) as executor:
+        def first_slow(candidates):
+            '''
+            The first (description, tasks, result) among candidates that is still slow, or None.
+            '''
+            candidates = [(d, c) for d, c in candidates if c and c != tasks]
+            for start in range(0, len(candidates), workers):
+                batch = candidates[start:start + workers]
+                todo = [c for _, c in batch if tasks_key(c) not in memo]
+                jobs = [(c, m, tmp, nptest, nptest_args) for c in todo]
+                for c, result in zip(todo, executor.map(analyse, jobs)):
+                    memo[tasks_key(c)] = result
+                for description, c in batch:
+                    if slow(memo[tasks_key(c)]):
+                        return description, c, memo[tasks_key(c)]
+            return None
+
+        result = analyse((tasks, m, tmp, nptest, nptest_args))
+        if not slow(result):
+            raise ValueError("nptest is not slow on the original task set")
+
+        def ddmin(items, make, name):
+            '''
+            Applies make(group) for groups of items of decreasing size while a candidate stays slow.
+            '''
+            nonlocal tasks, result
+            n = 2
+            while items:
+                groups = chunks(items, min(n, len(items)))
+                found = first_slow([(f"{name} {group}", make(group)) for group in groups])
+                if found is not None:
+                    description, tasks, result = found
+                    steps.append(description)
+                    print(f"{description}: {len(tasks)} tasks, {nrof_jobs(tasks)} jobs")
+                    return True
+                if n >= len(items):
+                    return False
+                n = min(2 * n, len(items))
+            return False
+
+        changed = True
+        while changed:
+            changed = False
+            while ddmin(components(tasks), lambda g: drop_tasks(tasks, {i for c in g for i in c}), "drop chains"):
+                changed = True
+            while ddmin([t[0] for t in tasks], lambda g: drop_tasks(tasks, set(g)), "drop callbacks"):
+                changed = True
+
+            # Coarser periods: a chain takes the period of another chain, fewest jobs first.
+            periods = sorted({t[3] for t in tasks})
+            candidates = []
+            jobs = nrof_jobs(tasks)
+            for c in components(tasks):
+                period = next(t[3] for t in tasks if t[0] == c[0])
+                for p in periods:
+                    if p != period:
+                        candidate = set_period(tasks, set(c), p)
+                        if nrof_jobs(candidate) < jobs:
+                            candidates.append((f"period of chain {c} {period} -> {p}", candidate))
+            candidates.sort(key=lambda d_c: nrof_jobs(d_c[1]))
+            found = first_slow(candidates)
+            if found is not None:
+                description, tasks, result = found
+                steps.append(description)
+                print(f"{description}: {len(tasks)} tasks, {nrof_jobs(tasks)} jobs")
+                changed = True
+
+            while ddmin([t[0] for t in tasks if t[4] != t[1]], lambda g: collapse_bcets(tasks, set(g)), "BCET = WCET for"):
+                changed = True
+
+    return tasks, result, steps
+
+def main():
+    parser = argparse.ArgumentParser(description="Reduce a task set on which nptest is slow to a minimal reproducer.")
+    parser.add_argument("task_file", help="tasks_x.csv, or task_set_x.csv together with pred_file")
+    parser.add_argument("pred_file", nargs="?", default=None, help="pred_x.csv of task_set_x.csv")
+    parser.add_argument("-m", type=int, default=4, help="Number of executor-threads (default: 4)")
+    parser.add_argument("--cpu-time", type=float, default=None, help="Slow means a CPU time of at least this many seconds")
+    parser.add_argument("--states", type=int, default=None, help="Slow means at least this many states")
+    parser.add_argument("--failures", action="store_true", help="A failing nptest run (e.g. out of memory) also counts as slow")
+    parser.add_argument("--workers", type=int, default=6, help="Number of parallel nptest processes (default: 6)")
+    parser.add_argument("--nptest", default=None, help="Path to the nptest binary")
+    parser.add_argument("--nptest-args", default="",
+                        help="Extra nptest arguments, e.g. \"--timeout 90\"; a timeout counts as slow")
+    parser.add_argument("--output", default="reduced", help="Name of the reduced tasks_<output>.csv, "
+                        "task_set_<output>.csv and pred_<output>.csv (default: reduced)")
+    args = parser.parse_args()
+    if args.cpu_time is None and args.states is None and not args.failures:
+        parser.error("give --cpu-time, --states or --failures")
+
+    if args.pred_file is None:
+        tasks = read_tasks_file(args.task_file)
+    else:
+        tasks = tasks_from_job_csvs(args.task_file, args.pred_file)
+    print(f"Original: {len(tasks)} tasks, {nrof_jobs(tasks)} jobs")
+
+    try:
+        tasks, result, steps = reduce_task_set(tasks, args.m, args.cpu_time, args.states, args.failures,
+                                               args.workers, args.nptest, shlex.split(args.nptest_args))
+    except ValueError as e:
+        sys.exit(str(e))
+
+    folder = os.path.dirname(args.output)
+    name = os.path.basename(args.output)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    write_tasks_file(tasks, os.path.join(folder, f"tasks_{name}.csv"))
+    write_job_csvs(tasks, os.path.join(folder, f"task_set_{name}.csv"), os.path.join(folder, f"pred_{name}.csv"))
+    summary = "nptest failed" if result is None else f"{result['states']} states, {result['cpu_time']} s CPU"
+    print(f"Reduced in {len(steps)} steps: {len(tasks)} tasks, {nrof_jobs(tasks)} jobs, {summary}")
+
+if __name__ == '__main__':
+    main()
@@ -1,38 +1,75 @@
 #!/usr/bin/env python3
 import os
 import re
-import subprocess
+import csv
+import sys
+import time
 import argparse
 from tqdm import tqdm
+from itertools import repeat
 from concurrent.futures import ProcessPoolExecutor
 
-def process_pair(task):
+from nptest import nptest_command, run_command_usage, USAGE_COLUMNS
+from validate_csvs import validate_pair
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "this_paper"))
+from profiling import span
+
+def process_pair(task, submitted=None, validate=True):
+    '''
+    Analyses one (task_file, pred_file) pair. Returns (task_file, output, success, usage),
+    where usage holds the submit, nptest start and finish timestamps, the worker's PID and, if nptest ran,
+    the resource usage of the nptest process (see run_command_usage()).
+    With validate=True, a pair that fails validate_csvs.py is not analysed and output is a
+    line saying why, which is written to the results file like the errors of nptest.
+    '''
     task_file, pred_file = task
-    cmd = [
-        "/home/radu/repos/schedule_abstraction-ros2/build/nptest",
-        task_file,
-        "-m", "4",
-        "-p", pred_file
-    ]
+    cmd = nptest_command(task_file, pred_file, 4)
+    usage = {"submitted": submitted, "worker": os.getpid()}
+    def done(output, success):
+        usage["finished"] = time.time()
+        return (task_file, output, success, usage)
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        if validate:
+            errors = validate_pair(task_file, pred_file)
+            if errors:
+                return done(f"Invalid task set {task_file} and {pred_file}, skipped: {'; '.join(errors)}", False)
+        usage["started"] = time.time()
+        with span("runner.process_pair", cat="runner", task_file=task_file):
+            returncode, stdout, stderr, rusage = run_command_usage(cmd)
+        usage.update(rusage)
+        if returncode != 0:
+            error_msg = f"Error processing {task_file} and {pred_file}: {stderr.strip()}"
+            return done(error_msg, False)
         # Expected output is one CSV-formatted line from stdout.
-        return (task_file, result.stdout.strip(), True)
-    except subprocess.CalledProcessError as e:
-        error_msg = f"Error processing {task_file} and {pred_file}: {e.stderr.strip()}"
-        return (task_file, error_msg, False)
+        return done(stdout.strip(), True)
     except Exception as e:
         error_msg = f"Exception processing {task_file} and {pred_file}: {str(e)}"
-        return (task_file, error_msg, False)
+        return done(error_msg, False)
+
+def usage_file_name(output):
+    '''
+    The file next to a results file with the timestamps and resource usage of every analysis,
+    e.g. results.usage.csv for results.csv.
+    '''
+    return os.path.splitext(output)[0] + ".usage.csv"
 
 def main():
     parser = argparse.ArgumentParser(
         description="Process CSV files in sub-folders in lexicographic order with parallel execution and immediate saving."
     )
-    parser.add_argument("folder", help="Path to the folder containing sub-folders with CSVs")
+    parser.add_argument("folder", nargs="?", default=None, help="Path to the folder containing sub-folders with CSVs")
+    parser.add_argument("--files", default=None,
+                        help="Instead of a folder, a file listing task_set_x.csv paths, one per line "
+                             "('-' for stdin), e.g. the output of task_set_index.py")
     parser.add_argument("--output", default="results.csv",
                         help="Output CSV file to append results (default: results.csv)")
+    parser.add_argument("--no-validate", action="store_true",
+                        help="Analyse pairs without checking them with validate_csvs.py first "
+                             "(by default, invalid pairs are not analysed and reported in the output)")
     args = parser.parse_args()
+    if (args.folder is None) == (args.files is None):
+        parser.error("give either a folder or --files")
 
     # Read existing results to check which task files have already been processed.
     processed_files = set()
@@ -49,8 +86,18 @@ def main():
     tasks = []      # List of tuples: (task_file, pred_file)
     subfolders = [] # For CLI feedback on sub-folder traversal
 
+    if args.files is not None:
+        with (sys.stdin if args.files == "-" else open(args.files)) as f:
+            listed = [line.strip() for line in f if line.strip()]
+        by_folder = {}
+        for task_file in listed:
+            by_folder.setdefault(os.path.dirname(task_file), []).append(os.path.basename(task_file))
+        walk = [(root, [], by_folder[root]) for root in sorted(by_folder)]
+    else:
+        walk = os.walk(args.folder)
+
     # Traverse directories in lexicographic order.
-    for root, dirs, files in os.walk(args.folder):
+    for root, dirs, files in walk:
         dirs.sort()    # Sort sub-folders lexicographically
         files.sort()   # Sort files lexicographically
         subfolders.append(root)
@@ -76,17 +123,32 @@ def main():
     # Sort tasks lexicographically by task file path.
     tasks.sort(key=lambda t: t[0])
 
-    # Open the output file in append mode.
-    with open(args.output, 'a') as out_file:
+    # Open the output file in append mode, and the usage file next to it.
+    usage_file = usage_file_name(args.output)
+    new_usage_file = not os.path.exists(usage_file)
+    failed = 0
+    with open(args.output, 'a') as out_file, open(usage_file, 'a', newline='') as usage_out:
+        usage_writer = csv.writer(usage_out)
+        if new_usage_file:
+            usage_writer.writerow(["file", "submitted", "started", "finished", "worker", *USAGE_COLUMNS])
         # Process CSV pairs concurrently using 6 processes.
         with ProcessPoolExecutor(max_workers=6) as executor:
-            for task_file, output, success in tqdm(
-                    executor.map(process_pair, tasks),
+            # All pairs are submitted at once; started - submitted is the queueing delay of a pair
+            # plus its validation, finished - started the run time of nptest.
+            submitted = time.time()
+            for task_file, output, success, usage in tqdm(
+                    executor.map(process_pair, tasks, repeat(submitted), repeat(not args.no_validate)),
                     total=len(tasks), desc="Processing CSV pairs", unit="pair"):
                 out_file.write(output + "\n")
                 out_file.flush()
+                usage_writer.writerow([task_file, *[usage.get(c, "") for c in
+                                       ["submitted", "started", "finished", "worker", *USAGE_COLUMNS]]])
+                usage_out.flush()
                 if not success:
+                    failed += 1
                     tqdm.write(output)
+    if failed:
+        print(f"{failed}/{len(tasks)} task sets were invalid or could not be analysed, see {args.output}")
 
 if __name__ == '__main__':
     main()
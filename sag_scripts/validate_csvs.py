@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+import os
+import sys
+import argparse
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Columns of the job CSV and the precedence CSV, see JOBS_HEADER and PRED_HEADER in sag_input.py.
+TASK, JOB, ARRIVAL_MIN, ARRIVAL_MAX, COST_MIN, COST_MAX, DEADLINE, PRIORITY = range(8)
+PRED_TASK, PRED_JOB, SUCC_TASK, SUCC_JOB = range(4)
+
+def load_csv(file_name, nrof_columns):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning) # A precedence file without edges
+        data = np.loadtxt(file_name, delimiter=",", skiprows=1, dtype=np.int64, ndmin=2)
+    if data.size == 0:
+        return np.empty((0, nrof_columns), dtype=np.int64)
+    return data[:, :nrof_columns]
+
+def check_jobs(jobs):
+    '''
+    Invariants of the job table on its own. Returns a list of error messages.
+    '''
+    errors = []
+    if len(jobs) == 0:
+        return ["no jobs"]
+
+    job_ids = np.sort(jobs[:, JOB])
+    if not np.array_equal(job_ids, np.arange(1, len(jobs) + 1)):
+        errors.append(f"job IDs are not 1..{len(jobs)} (duplicates or gaps)")
+
+    bad = (jobs[:, COST_MIN] <= 0) | (jobs[:, COST_MIN] > jobs[:, COST_MAX])
+    if bad.any():
+        errors.append(f"{bad.sum()} jobs violate 0 < BCET <= WCET, e.g. job {jobs[bad][0, JOB]}")
+
+    bad = jobs[:, ARRIVAL_MIN] > jobs[:, ARRIVAL_MAX]
+    if bad.any():
+        errors.append(f"{bad.sum()} jobs have arrival min > arrival max, e.g. job {jobs[bad][0, JOB]}")
+
+    if len(np.unique(jobs[:, PRIORITY])) != len(jobs):
+        errors.append("job priorities are not unique")
+
+    # Implicit deadlines: the period of a task is deadline - release of its jobs.
+    periods = jobs[:, DEADLINE] - jobs[:, ARRIVAL_MIN]
+    if (periods <= 0).any():
+        errors.append(f"{(periods <= 0).sum()} jobs have a deadline before their release")
+        return errors
+
+    tasks, first, nrof_jobs = np.unique(jobs[:, TASK], return_index=True, return_counts=True)
+    task_periods = periods[first]
+    if not np.array_equal(periods, task_periods[np.searchsorted(tasks, jobs[:, TASK])]):
+        errors.append("the jobs of a task have different periods")
+        return errors
+
+    hyperperiod = np.lcm.reduce(task_periods)
+    bad = nrof_jobs != hyperperiod // task_periods
+    if bad.any():
+        errors.append(f"{bad.sum()} tasks do not have hyperperiod/period jobs, e.g. task {tasks[bad][0]} "
+                      f"has {nrof_jobs[bad][0]} instead of {hyperperiod // task_periods[bad][0]}")
+    return errors
+
+def check_precedences(jobs, preds):
+    '''
+    Invariants of the precedence table against the job table. Returns a list of error messages.
+    '''
+    errors = []
+    if len(preds) == 0:
+        return errors
+
+    # Row of every job ID (0 if unknown), so that both ends of every edge can be looked up at once.
+    max_id = max(jobs[:, JOB].max(), preds[:, [PRED_JOB, SUCC_JOB]].max())
+    row_of = np.full(max_id + 1, -1, dtype=np.int64)
+    row_of[jobs[:, JOB]] = np.arange(len(jobs))
+
+    ends = []
+    for task_col, job_col, name in [(PRED_TASK, PRED_JOB, "predecessor"), (SUCC_TASK, SUCC_JOB, "successor")]:
+        rows = np.where(preds[:, job_col] > 0, row_of[np.clip(preds[:, job_col], 0, max_id)], -1)
+        missing = (rows < 0) | (jobs[rows, TASK] != preds[:, task_col])
+        if missing.any():
+            edge = preds[missing][0]
+            errors.append(f"{missing.sum()} edges refer to a {name} job that does not exist, e.g. "
+                          f"({edge[PRED_TASK]}, {edge[PRED_JOB]}) -> ({edge[SUCC_TASK]}, {edge[SUCC_JOB]})")
+        ends.append(rows)
+
+    valid = (ends[0] >= 0) & (ends[1] >= 0)
+    pred_rows, succ_rows = ends[0][valid], ends[1][valid]
+    bad = jobs[pred_rows, ARRIVAL_MIN] > jobs[succ_rows, ARRIVAL_MIN]
+    if bad.any():
+        errors.append(f"{bad.sum()} edges have a predecessor released after its successor, "
+                      f"e.g. job {jobs[pred_rows[bad][0], JOB]} -> job {jobs[succ_rows[bad][0], JOB]}")
+    return errors
+
+def validate_pair(task_file, pred_file):
+    '''
+    Checks a job CSV and its precedence CSV. Returns a list of error messages (empty if valid).
+    '''
+    if pred_file is None or not os.path.exists(pred_file):
+        return [f"missing precedence file {pred_file}"]
+    try:
+        jobs = load_csv(task_file, 8)
+        preds = load_csv(pred_file, 4)
+    except ValueError as e:
+        return [f"cannot parse: {e}"]
+
+    errors = check_jobs(jobs)
+    if len(jobs):
+        errors += check_precedences(jobs, preds)
+    return errors
+
+def check_pair(task_file, pred_file):
+    '''
+    Raises ValueError if validate_pair() finds errors, for generators that validate every pair they write.
+    '''
+    errors = validate_pair(task_file, pred_file)
+    if errors:
+        raise ValueError(f"{task_file}: {'; '.join(errors)}")
+
+def _validate(pair):
+    return pair[0], validate_pair(*pair)
+
+def find_pairs(folder):
+    '''
+    All task_set_x.csv files below folder with their expected pred_x.csv, whether it exists or not.
+    If pred_x.csv does not exist but the folder has a single pred_*.csv shared by all its
+    task sets (as in the case studies), that one is used.
+    '''
+    pairs = []
+    for root, dirs, files in os.walk(folder):
+        dirs.sort()
+        preds = [file for file in files if file.startswith("pred_") and file.endswith(".csv")]
+        for file in sorted(files):
+            if not (file.startswith("task_set_") and file.endswith(".csv")):
+                continue
+            identifier = file[len("task_set_"):-len(".csv")]
+            if "." in identifier:
+                continue # nptest output such as task_set_x.rta.csv
+            pred_file = os.path.join(root, f"pred_{identifier}.csv")
+            if not os.path.exists(pred_file) and len(preds) == 1:
+                pred_file = os.path.join(root, preds[0])
+            pairs.append((os.path.join(root, file), pred_file))
+    return pairs
+
+def validate_folder(folder, workers=6):
+    '''
+    Validates all task sets below folder in parallel. Returns {task file: errors} of the invalid ones.
+    '''
+    invalid = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for task_file, errors in executor.map(_validate, find_pairs(folder), chunksize=32):
+            if errors:
+                invalid[task_file] = errors
+    return invalid
+
+def main():
+    parser = argparse.ArgumentParser(description="Check generated job/precedence CSVs before running nptest on them.")
+    parser.add_argument("folder", help="Folder searched recursively for task_set_x.csv/pred_x.csv pairs")
+    parser.add_argument("--workers", type=int, default=6, help="Number of parallel processes (default: 6)")
+    args = parser.parse_args()
+
+    nrof_pairs = len(find_pairs(args.folder))
+    invalid = validate_folder(args.folder, args.workers)
+    for task_file, errors in sorted(invalid.items()):
+        for error in errors:
+            print(f"{task_file}: {error}")
+    print(f"{nrof_pairs - len(invalid)}/{nrof_pairs} task sets are valid")
+    if invalid:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
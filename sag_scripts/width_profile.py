@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+import os
+import csv
+import math
+import argparse
+import statistics
+
+from nptest import read_width, task_set_features
+
+FEATURES = ["U", "chains", "callbacks", "bcet_ratio", "jobs"]
+METRICS = ["peak_width", "peak_depth", "growth"]
+
+def find_width_files(folder):
+    '''
+    Returns the sorted list of (task_file, pred_file) pairs of all task sets in folder that
+    have a width profile (task_set_x.width.csv). The precedence file is pred_x.csv or, if
+    the folder has a single pred_*.csv shared by all its task sets (as in the case studies),
+    that one. It is None if neither exists.
+    '''
+    pairs = []
+    for root, dirs, files in os.walk(folder):
+        dirs.sort()
+        files.sort()
+        preds = [file for file in files if file.startswith("pred_") and file.endswith(".csv")]
+        for file in files:
+            if not file.endswith(".width.csv"):
+                continue
+            task_file = os.path.join(root, file[:-len(".width.csv")] + ".csv")
+            identifier = file[len("task_set_"):-len(".width.csv")]
+            pred_file = os.path.join(root, f"pred_{identifier}.csv")
+            if not os.path.exists(pred_file):
+                pred_file = os.path.join(root, preds[0]) if len(preds) == 1 else None
+            pairs.append((task_file, pred_file))
+
+    pairs.sort(key=lambda t: t[0])
+    return pairs
+
+def width_metrics(profile):
+    '''
+    Peak width (#states), the depth at which it is first reached and the growth rate,
+    i.e. the average factor by which the width grows per depth level up to the peak
+    (exponential least-squares fit of the width against the depth).
+    '''
+    peak_depth, _, peak_width = max(profile, key=lambda row: (row[2], -row[0]))
+    rising = [(depth, math.log(states)) for depth, _, states in profile if depth <= peak_depth and states > 0]
+
+    growth = 1.0
+    if len(rising) > 1:
+        depths = [d for d, _ in rising]
+        logs = [l for _, l in rising]
+        if len(set(depths)) > 1:
+            growth = math.exp(statistics.linear_regression(depths, logs).slope)
+
+    return {"peak_width": peak_width, "peak_depth": peak_depth, "growth": growth}
+
+def _ranks(values):
+    order = sorted(range(len(values)), key=lambda i: values[i])
+    ranks = [0.0] * len(values)
+    i = 0
+    while i < len(order):
+        j = i
+        while j + 1 < len(order) and values[order[j + 1]] == values[order[i]]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[order[k]] = (i + j) / 2 + 1
+        i = j + 1
+    return ranks
+
+def spearman(xs, ys):
+    '''
+    Spearman rank correlation of xs and ys, or None if one of them is constant.
+    '''
+    if len(xs) < 2 or len(set(xs)) < 2 or len(set(ys)) < 2:
+        return None
+    return statistics.correlation(_ranks(xs), _ranks(ys))
+
+def profile_folder(folder):
+    '''
+    Returns one row (task file, features and width metrics) per task set with a width profile.
+    '''
+    rows = []
+    for task_file, pred_file in find_width_files(folder):
+        profile = read_width(task_file)
+        if not profile:
+            continue
+        rows.append({"file": task_file, **task_set_features(task_file, pred_file), **width_metrics(profile)})
+    return rows
+
+def correlations(rows):
+    '''
+    Spearman correlation of every width metric with every task-set feature,
+    over the task sets for which the feature is known.
+    '''
+    table = []
+    for metric in METRICS:
+        for feature in FEATURES:
+            known = [row for row in rows if row[feature] is not None]
+            rho = spearman([row[feature] for row in known], [row[metric] for row in known])
+            table.append((metric, feature, rho, len(known)))
+    return table
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Summarize the nptest width profiles (task_set_x.width.csv) of a sweep folder "
+                    "and correlate them with task-set features."
+    )
+    parser.add_argument("folder", help="Sweep folder, searched recursively for *.width.csv files")
+    parser.add_argument("--output", default="width_profile.csv", help="Per task set metrics (default: width_profile.csv)")
+    parser.add_argument("--summary", default="width_summary.csv", help="Correlation table (default: width_summary.csv)")
+    parser.add_argument("--top", type=int, default=5, help="Number of widest task sets to list (default: 5)")
+    args = parser.parse_args()
+
+    rows = profile_folder(args.folder)
+    if not rows:
+        print(f"No width profiles found in {args.folder}")
+        return
+
+    columns = ["file", *FEATURES, *METRICS]
+    with open(args.output, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow([row[c] if row[c] is not None else "" for c in columns])
+
+    table = correlations(rows)
+    with open(args.summary, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["metric", "feature", "spearman", "n"])
+        for metric, feature, rho, n in table:
+            writer.writerow([metric, feature, "" if rho is None else f"{rho:.3f}", n])
+
+    print(f"{len(rows)} task sets")
+    print(f"{'metric':12s} " + " ".join(f"{feature:>10s}" for feature in FEATURES))
+    for metric in METRICS:
+        cells = [rho for m, _, rho, _ in table if m == metric]
+        print(f"{metric:12s} " + " ".join(f"{'-' if rho is None else f'{rho:.2f}':>10s}" for rho in cells))
+
+    print()
+    print("Widest task sets:")
+    for row in sorted(rows, key=lambda r: -r["peak_width"])[:args.top]:
+        print(f"  {row['file']}: peak {row['peak_width']} states at depth {row['peak_depth']}, growth {row['growth']:.2f}/level")
+
+if __name__ == '__main__':
+    main()
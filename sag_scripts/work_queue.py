@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+'''
+Work queue in a shared directory, so that a sweep can be analysed by any number of
+workers on one or more hosts that mount the same directory.
+
+Every (task set, m) pair is an item, i.e. a small JSON file that moves between
+sub-folders of the queue directory with os.rename(), which is atomic:
+
+    todo/     items waiting for a worker
+    leases/   items claimed by a worker until the "expires" time in the file,
+              renewed by a heartbeat while nptest runs
+    done/     one nptest result line per item, written through a temporary file
+    failed/   the error of items for which nptest failed
+
+A lease that is not renewed in time (the worker or its host died) is moved back to todo/
+by the next worker that notices it. Should the original worker still finish, both write the
+same done/ file, so results are recorded at most once. Leases use the wall clock of the hosts,
+which must therefore agree within a small fraction of the lease time. Example:
+
+    python work_queue.py init queue SAG_input_SobhaniFig10 -m 1 2 3 4
+    python work_queue.py work queue --workers 6      # on every host
+    python work_queue.py status queue
+    python work_queue.py collect queue --output results.csv
+'''
+import os
+import json
+import time
+import shlex
+import random
+import socket
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from nptest import NPTEST, nptest_command, run_command, parse_result_line, find_task_set_pairs
+
+STATES = ["todo", "leases", "done", "failed"]
+
+def item_name(task_file, m):
+    '''
+    File name (without extension) of the item of task_file and m. It only depends on
+    the path, so that initialising a queue twice does not create duplicate items.
+    '''
+    digest = hashlib.sha1(os.path.abspath(task_file).encode()).hexdigest()[:16]
+    base = os.path.basename(task_file)[:-len(".csv")]
+    return f"{base}_{digest}_m{m}"
+
+def _path(queue, state, name):
+    return os.path.join(queue, state, name + (".csv" if state == "done" else ".json"))
+
+def _write_json(path, data):
+    tmp = f"{path}.{socket.gethostname()}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None # Moved by another worker, or being replaced
+
+def init_queue(queue, pairs, ms):
+    '''
+    Adds an item for every (task_file, pred_file) pair and every m to the queue,
+    unless it is already queued, leased, done or failed. Returns the number of added items.
+    '''
+    for state in STATES:
+        os.makedirs(os.path.join(queue, state), exist_ok=True)
+
+    added = 0
+    for task_file, pred_file in pairs:
+        for m in ms:
+            name = item_name(task_file, m)
+            if any(os.path.exists(_path(queue, state, name)) for state in STATES):
+                continue
+            _write_json(_path(queue, "todo", name), {"task_file": os.path.abspath(task_file),
+                                                     "pred_file": os.path.abspath(pred_file), "m": m})
+            added += 1
+    return added
+
+def requeue_failed(queue):
+    '''
+    Moves all failed items back to todo/. Returns their number.
+    '''
+    names = [file[:-len(".json")] for file in os.listdir(os.path.join(queue, "failed")) if file.endswith(".json")]
+    for name in names:
+        item = _read_json(_path(queue, "failed", name))
+        if item is None:
+            continue
+        item.pop("error", None)
+        _write_json(_path(queue, "todo", name), item)
+        os.remove(_path(queue, "failed", name))
+    return len(names)
+
+def requeue_expired(queue, now=None):
+    '''
+    Moves leases that expired before now back to todo/, or drops them if the item is done.
+    Returns the names of the requeued items.
+    '''
+    now = time.time() if now is None else now
+    requeued = []
+    for file in os.listdir(os.path.join(queue, "leases")):
+        if not file.endswith(".json"):
+            continue
+        name = file[:-len(".json")]
+        lease = _read_json(_path(queue, "leases", name))
+        if lease is None or lease.get("expires", now) >= now:
+            continue
+        try:
+            if os.path.exists(_path(queue, "done", name)):
+                os.remove(_path(queue, "leases", name))
+            else:
+                os.rename(_path(queue, "leases", name), _path(queue, "todo", name))
+                requeued.append(name)
+        except FileNotFoundError:
+            pass # Another worker was faster
+    return requeued
+
+def claim(queue, worker, lease_time, rng=random):
+    '''
+    Claims a random todo item for worker. Returns (name, lease) or None if there is nothing to do.
+    '''
+    names = [file[:-len(".json")] for file in os.listdir(os.path.join(queue, "todo")) if file.endswith(".json")]
+    rng.shuffle(names) # Spread concurrent workers over the items
+    for name in names:
+        try:
+            os.rename(_path(queue, "todo", name), _path(queue, "leases", name))
+        except FileNotFoundError:
+            continue # Claimed by another worker
+        lease = _read_json(_path(queue, "leases", name))
+        if lease is None:
+            continue
+        if os.path.exists(_path(queue, "done", name)):
+            os.remove(_path(queue, "leases", name)) # Finished by a worker whose lease had expired
+            continue
+        lease.update({"worker": worker, "expires": time.time() + lease_time})
+        _write_json(_path(queue, "leases", name), lease)
+        return name, lease
+    return None
+
+def renew(queue, name, worker, lease_time):
+    '''
+    Extends the lease of worker on item name. Returns False if the lease was lost.
+    '''
+    lease = _read_json(_path(queue, "leases", name))
+    if lease is None or lease.get("worker") != worker:
+        return False
+    lease["expires"] = time.time() + lease_time
+    _write_json(_path(queue, "leases", name), lease)
+    return True
+
+def complete(queue, name, worker, line=None, error=None):
+    '''
+    Records the result line (or the error) of item name and releases the lease of worker.
+    A result that is already recorded is kept, so that completing an item twice is harmless.
+    '''
+    lease = _read_json(_path(queue, "leases", name))
+    done_file = _path(queue, "done", name)
+    if line is not None and not os.path.exists(done_file):
+        tmp = f"{done_file}.{socket.gethostname()}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(line + "\n")
+        os.replace(tmp, done_file)
+    elif error is not None and lease is not None and lease.get("worker") == worker:
+        _write_json(_path(queue, "failed", name), {**lease, "error": error})
+
+    if lease is not None and lease.get("worker") == worker:
+        try:
+            os.remove(_path(queue, "leases", name))
+        except FileNotFoundError:
+            pass
+
+def _heartbeat(queue, name, worker, lease_time, stop):
+    while not stop.wait(lease_time / 3):
+        if not renew(queue, name, worker, lease_time):
+            return
+
+def work(queue, lease_time=600, nptest=None, extra_args=(), max_items=None):
+    '''
+    Processes items until the queue is empty (and no lease is left that could expire).
+    Returns the number of processed items.
+    '''
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    rng = random.Random(worker)
+    processed = 0
+    while max_items is None or processed < max_items:
+        requeue_expired(queue)
+        claimed = claim(queue, worker, lease_time, rng)
+        if claimed is None:
+            if not os.listdir(os.path.join(queue, "leases")):
+                return processed
+            time.sleep(min(10, lease_time / 10)) # Wait for other workers, their leases may still expire
+            continue
+
+        name, lease = claimed
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=_heartbeat, args=(queue, name, worker, lease_time, stop), daemon=True)
+        heartbeat.start()
+        try:
+            cmd = nptest_command(lease["task_file"], lease["pred_file"], lease["m"], nptest, extra_args)
+            returncode, stdout, stderr = run_command(cmd)
+        except OSError as e:
+            returncode, stdout, stderr = -1, "", str(e)
+        finally:
+            stop.set()
+            heartbeat.join()
+
+        if returncode == 0 and parse_result_line(stdout) is not None:
+            complete(queue, name, worker, line=stdout.strip())
+        else:
+            complete(queue, name, worker, error=f"returncode {returncode}: {stderr.strip() or stdout.strip()}")
+        processed += 1
+    return processed
+
+def _work(args):
+    return work(*args)
+
+def status(queue):
+    '''
+    Number of items per state.
+    '''
+    return {state: sum(1 for file in os.listdir(os.path.join(queue, state)) if not file.endswith(".tmp"))
+            for state in STATES}
+
+def collect(queue):
+    '''
+    The result lines of all done items, sorted by m and task file.
+    '''
+    lines = []
+    for file in os.listdir(os.path.join(queue, "done")):
+        if not file.endswith(".csv"):
+            continue
+        with open(os.path.join(queue, "done", file)) as f:
+            line = f.read().strip()
+        result = parse_result_line(line)
+        if result is not None:
+            lines.append((result["cpus"], result["file"], line))
+    return [line for _, _, line in sorted(lines)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyse a sweep with workers on several hosts sharing a queue directory.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    p = subparsers.add_parser("init", help="Queue every task set of a folder for every m")
+    p.add_argument("queue", help="Queue directory (shared by all hosts)")
+    p.add_argument("folder", help="Folder searched recursively for task_set_x.csv/pred_x.csv pairs")
+    p.add_argument("-m", type=int, nargs="+", default=[4], help="Numbers of executor-threads (default: 4)")
+    p.add_argument("--retry-failed", action="store_true", help="Also move failed items back to todo")
+
+    p = subparsers.add_parser("work", help="Run workers on this host until the queue is empty")
+    p.add_argument("queue", help="Queue directory")
+    p.add_argument("--workers", type=int, default=6, help="Number of worker processes (default: 6)")
+    p.add_argument("--lease", type=float, default=600,
+                   help="Lease time in seconds, renewed every third of it (default: 600)")
+    p.add_argument("--nptest", default=NPTEST, help="nptest binary (default: NPTEST)")
+    p.add_argument("--nptest-args", default="", help="Extra nptest arguments, e.g. \"--timeout 600\"")
+
+    p = subparsers.add_parser("status", help="Print the number of items per state and the failed items")
+    p.add_argument("queue", help="Queue directory")
+
+    p = subparsers.add_parser("collect", help="Write the results in the format of run_on_folder.py")
+    p.add_argument("queue", help="Queue directory")
+    p.add_argument("--output", default="results.csv", help="Output CSV file (default: results.csv)")
+
+    args = parser.parse_args()
+
+    if args.command == "init":
+        added = init_queue(args.queue, find_task_set_pairs(args.folder), args.m)
+        print(f"Added {added} items")
+        if args.retry_failed:
+            print(f"Requeued {requeue_failed(args.queue)} failed items")
+    elif args.command == "work":
+        job = (args.queue, args.lease, args.nptest, shlex.split(args.nptest_args))
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            processed = sum(executor.map(_work, [job] * args.workers))
+        print(f"Processed {processed} items")
+    elif args.command == "status":
+        for state, n in status(args.queue).items():
+            print(f"{state:7s} {n}")
+        for file in sorted(os.listdir(os.path.join(args.queue, "failed"))):
+            item = _read_json(os.path.join(args.queue, "failed", file))
+            if item is not None:
+                print(f"failed: {item['task_file']} m={item['m']}: {item['error']}")
+    elif args.command == "collect":
+        lines = collect(args.queue)
+        with open(args.output, "w") as f:
+            for line in lines:
+                f.write(line + "\n")
+        print(f"Wrote {len(lines)} results to {args.output}")
+        counts = status(args.queue)
+        if counts["todo"] or counts["leases"]:
+            print(f"The queue is not finished yet: {counts['todo']} todo, {counts['leases']} leased")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+import os
+import sys
+import csv
+import random
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "jiang_et_al"))
+sys.path.insert(0, os.path.join(HERE, "..", "sag_scripts"))
+from JRTA import chains_to_jiang, jiang_schedulable
+from nptest import run_nptest
+from sag_input import split_chains, chains_to_tasks, random_priorities, write_task_set_csvs
+from convert_sobhani_to_sag import convert_file_to_tasksets_odd_chains
+from generate_data_for_Jiang_synthetic import round_and_scale
+
+def utilization(chains):
+    return sum(sum(wcets) / period for period, wcets in chains)
+
+def scale_chains(chains, factor):
+    '''
+    Multiplies the WCETs of (period, [wcets]) chains by factor. As in partition_integer_min1(),
+    the execution time of a chain is rounded to an integer of at least one unit per callback,
+    and the part above that minimum is split in proportion to the WCETs above one unit, so that
+    factor 1 returns the chains unchanged.
+    '''
+    scaled = []
+    for period, wcets in chains:
+        C = len(wcets)
+        E = max(C, int(round(sum(wcets) * factor)))
+        above_min = [w - 1 for w in wcets]
+        parts = round_and_scale(above_min if sum(above_min) > 0 else [1] * C, E - C)
+        scaled.append((period, [part + 1 for part in parts]))
+    return scaled
+
+def jiang_probe(job):
+    '''
+    Schedulability of a scaled task set under Theorem 1 of Jiang et al., see jiang_schedulable().
+    '''
+    chains, _, m, _, _, _ = job
+    return jiang_schedulable(chains_to_jiang(chains), m)
+
+def sag_probe(job):
+    '''
+    Schedulability of a scaled task set under the SAG, with the priorities of its base task set.
+    '''
+    chains, priority, m, bcet_fraction, workdir, nptest = job
+    fd, jobs_csv_name = tempfile.mkstemp(dir=workdir, prefix="task_set_", suffix=".csv")
+    os.close(fd)
+    pred_csv_name = jobs_csv_name.replace("task_set_", "pred_")
+    try:
+        write_task_set_csvs(chains_to_tasks(chains, priority), jobs_csv_name, pred_csv_name, bcet_fraction)
+        return run_nptest(jobs_csv_name, pred_csv_name, m, nptest)["schedulable"] == 1
+    except RuntimeError as e:
+        print(e)
+        return False
+    finally:
+        for name in (jobs_csv_name, pred_csv_name):
+            if os.path.exists(name):
+                os.remove(name)
+
+PROBES = {"jiang": jiang_probe, "sag": sag_probe}
+
+# Analyses whose schedulability is known to be monotone in the WCETs. The breakdowns of the
+# others are re-checked at smaller factors, see breakdown_utilizations(). Theorem 1 is not:
+# W() decreases with the WCET of an interfering chain for L below that WCET.
+MONOTONE = set()
+
+def _run_probe(job):
+    analysis, idx, factor, probe_job = job
+    return analysis, idx, factor, PROBES[analysis](probe_job)
+
+def breakdown_utilizations(chains_list, m, analyses=("jiang", "sag"), precision=0.01, bcet_fraction=1.0,
+                           seed=0, workers=6, nptest=None, workdir=None, rechecks=4):
+    '''
+    Breakdown utilization of every base task set, i.e. the largest utilization to which its WCETs
+    can be scaled (see scale_chains()) while it stays schedulable, per analysis.
+
+    The scaling factor is bisected between 0 and the factor at which U = m (never schedulable)
+    until the bracket is narrower than precision in utilization, i.e. about log2(m / precision)
+    analyses per task set and analysis. All searches run in lockstep on the worker pool, as in
+    min_threads.py. The bisection assumes that schedulability is monotone in the WCETs, which does
+    not hold for Theorem 1 and is not known for the SAG (scheduling anomalies). For analyses not in MONOTONE,
+    every task set is therefore also analysed at rechecks factors evenly spaced below its breakdown
+    factor, and a task set that is unschedulable at one of them is counted as non-monotone; its
+    breakdown utilization is then only approximate. The priorities of a base task set are drawn
+    once (from seed) and kept for all its scaled versions.
+    Returns ({analysis: [breakdown utilization per task set]}, {analysis: [indices of the non-monotone
+    task sets]}), with breakdown utilization 0 if not even the smallest WCETs are schedulable.
+    '''
+    rng = random.Random(seed)
+    priorities = [random_priorities(chains, rng) for chains in chains_list]
+    base_u = [utilization(chains) for chains in chains_list]
+
+    # [lo, hi] factor bracket per analysis and task set: lo schedulable (or 0), hi unschedulable.
+    lo = {a: [0.0] * len(chains_list) for a in analyses}
+    hi = {a: [m / u for u in base_u] for a in analyses}
+    best = {a: [0.0] * len(chains_list) for a in analyses}
+
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp, ProcessPoolExecutor(max_workers=workers) as executor:
+        while True:
+            jobs = []
+            for a in analyses:
+                for idx, chains in enumerate(chains_list):
+                    if (hi[a][idx] - lo[a][idx]) * base_u[idx] <= precision:
+                        continue
+                    factor = (lo[a][idx] + hi[a][idx]) / 2
+                    scaled = scale_chains(chains, factor)
+                    jobs.append((a, idx, factor, (scaled, priorities[idx], m, bcet_fraction, tmp, nptest)))
+            if not jobs:
+                break
+
+            for a, idx, factor, schedulable in executor.map(_run_probe, jobs):
+                if schedulable:
+                    lo[a][idx] = factor
+                    best[a][idx] = utilization(scale_chains(chains_list[idx], factor))
+                else:
+                    hi[a][idx] = factor
+
+        jobs = []
+        for a in analyses:
+            if a in MONOTONE:
+                continue
+            for idx, chains in enumerate(chains_list):
+                if lo[a][idx] == 0:
+                    continue
+                for k in range(1, rechecks + 1):
+                    factor = lo[a][idx] * k / (rechecks + 1)
+                    scaled = scale_chains(chains, factor)
+                    jobs.append((a, idx, factor, (scaled, priorities[idx], m, bcet_fraction, tmp, nptest)))
+        non_monotone = {a: set() for a in analyses}
+        for a, idx, factor, schedulable in executor.map(_run_probe, jobs):
+            if not schedulable:
+                non_monotone[a].add(idx)
+
+    return best, {a: sorted(indices) for a, indices in non_monotone.items()}
+
+def schedulability_curve(breakdowns, utilizations):
+    '''
+    Schedulability ratio at every utilization, i.e. the fraction of task sets whose
+    breakdown utilization is at least that utilization (one minus the empirical CDF).
+    '''
+    return [(U, sum(b >= U for b in breakdowns) / len(breakdowns)) for U in utilizations]
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Schedulability curves over utilization from one population of task sets, "
+                    "by searching the breakdown utilization of every task set."
+    )
+    parser.add_argument("input", help="Task-set text file (any chain lengths), e.g. tasksets_1.0.txt")
+    parser.add_argument("-m", type=int, default=4, help="Number of executor-threads (default: 4)")
+    parser.add_argument("--analyses", nargs="+", choices=list(PROBES), default=list(PROBES),
+                        help="Analyses to run (default: jiang sag)")
+    parser.add_argument("--utilizations", type=float, nargs="+",
+                        default=[0.8, 1.2, 1.6, 2.0, 2.4, 2.8, 3.2, 3.6, 4.0],
+                        help="Utilizations of the curve (default: those of Figure 9)")
+    parser.add_argument("--precision", type=float, default=0.01, help="Precision of the breakdown utilization (default: 0.01)")
+    parser.add_argument("--bcet", type=float, default=1.0, help="BCET as a fraction of the WCET for the SAG (default: 1.0)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the priority assignment (default: 0)")
+    parser.add_argument("--workers", type=int, default=6, help="Number of parallel processes (default: 6)")
+    parser.add_argument("--nptest", default=None, help="Path to the nptest binary")
+    parser.add_argument("--name", default="breakdown",
+                        help="Prefix of the output files <name>_breakdowns.csv and <name>_data_<analysis>.csv")
+    parser.add_argument("--rechecks", type=int, default=4,
+                        help="Smaller factors at which the breakdowns of the SAG are re-checked (default: 4)")
+    args = parser.parse_args()
+
+    chains_list = [split_chains(ts, chain_lengths) for ts, chain_lengths in convert_file_to_tasksets_odd_chains(args.input)]
+    results, non_monotone = breakdown_utilizations(chains_list, args.m, args.analyses, args.precision, args.bcet,
+                                                   args.seed, args.workers, args.nptest, rechecks=args.rechecks)
+
+    with open(f"{args.name}_breakdowns.csv", "w", newline="") as f:
+        writer = csv.writer(f)
+        approximate = [a for a in args.analyses if a not in MONOTONE]
+        writer.writerow(["task_set", "U", *args.analyses, *[f"{a}_non_monotone" for a in approximate]])
+        for idx, chains in enumerate(chains_list):
+            writer.writerow([idx, utilization(chains), *[results[a][idx] for a in args.analyses],
+                             *[int(idx in non_monotone[a]) for a in approximate]])
+
+    for a in args.analyses:
+        curve = schedulability_curve(results[a], args.utilizations)
+        # Same format as the FigureX_data files, so that line_plots.py can plot it.
+        with open(f"{args.name}_data_{a}.csv", "w", newline="") as f:
+            writer = csv.writer(f)
+            for U, ratio in curve:
+                writer.writerow([U, ratio])
+        print(f"{a}: " + ", ".join(f"U={U}: {ratio:.3f}" for U, ratio in curve))
+        if a not in MONOTONE:
+            print(f"{a}: breakdowns are approximate (monotonicity in the WCETs is assumed); "
+                  f"{len(non_monotone[a])}/{len(chains_list)} task sets are unschedulable at a smaller factor "
+                  f"(of {args.rechecks} re-checked)")
+
+if __name__ == '__main__':
+    main()
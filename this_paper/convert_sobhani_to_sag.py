@@ -1,12 +1,24 @@
 import random
 import math
 import os
+import sys
 import csv
+import shutil
 import numpy as np
 from tqdm import tqdm
+from profiling import span, count, enabled
+from task_set_index import task_set_record, write_index
+from sag_input import write_tasks_file
+from manifest import open_manifest, is_done, record_item, data_digest
 
-def random_permutation(a, b):
-    return random.sample(range(a, b + 1), b - a + 1)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "sag_scripts"))
+from validate_csvs import check_pair
+
+# Task files written by the last run of a generator in its output folder, for run_on_folder.py --files.
+NEW_SETS_NAME = "new_task_sets.txt"
+
+def random_permutation(a, b, rng=random):
+    return rng.sample(range(a, b + 1), b - a + 1)
 
 def lcm(numbers):
     result = numbers[0]
@@ -14,15 +26,19 @@ def lcm(numbers):
         result = math.lcm(result, num)
     return result
 
-def convert_file_to_tasksets_odd_chains(filename):
+def write_new_sets(output, written):
     '''
-    Converts an input file that is used by PWA_CD.m
-    to a Python list of lists, that can be then used
-    to generate csv files for the SAG.
+    Lists the task files written by a generator run in NEW_SETS_NAME, so that only those are
+    handed to the runner: python run_on_folder.py --files <output>/new_task_sets.txt
+    '''
+    with open(os.path.join(output, NEW_SETS_NAME), "w") as f:
+        for task_file in written:
+            f.write(task_file + "\n")
 
-    This function doesn't assume that all chains have the same length,
-    as convert_file_to_tasksets() does. So it also outputs a list
-    of chain lengths.
+def parse_tasksets_odd_chains(lines):
+    '''
+    Parses task sets from lines of text as in the files read by convert_file_to_tasksets_odd_chains(),
+    e.g. a file or the text of some task sets (see taskset_offsets.py).
     '''
     tasksets = []      # This will hold all task sets.
     current_taskset = []  # List for the current task set.
@@ -31,75 +47,87 @@ def convert_file_to_tasksets_odd_chains(filename):
     curr_chain_len = 0
     chain_lengths = []
 
-    with open(filename, "r") as f:
-        for line in f:
-            line = line.strip()
-            # Skip empty lines.
-            if not line:
-                continue
-
-            # Check for task-set separator.
-            if line == "-":
-                # End of a task set.
-                if current_chain:  # If there's a chain being built, finish it.
-                    current_taskset.extend(current_chain)
-                    curr_chain_len += 1
-                    chain_lengths.append(curr_chain_len)
-                    
-                    curr_chain_len = 0
-                    current_chain = []
-                    current_chain_id = None
-                if current_taskset:
-                    tasksets.append((current_taskset, chain_lengths))
-                    chain_lengths = []
-                # Reset for the next task set.
-                current_taskset = []
+    for line in lines:
+        line = line.strip()
+        # Skip empty lines.
+        if not line:
+            continue
+
+        # Check for task-set separator.
+        if line == "-":
+            # End of a task set.
+            if current_chain:  # If there's a chain being built, finish it.
+                current_taskset.extend(current_chain)
+                curr_chain_len += 1
+                chain_lengths.append(curr_chain_len)
+                
+                curr_chain_len = 0
                 current_chain = []
                 current_chain_id = None
+            if current_taskset:
+                tasksets.append((current_taskset, chain_lengths))
+                chain_lengths = []
+            # Reset for the next task set.
+            current_taskset = []
+            current_chain = []
+            current_chain_id = None
+            curr_chain_len = 0
+            continue
+
+        # Process a line representing a task.
+        parts = line.split()
+        if len(parts) < 5:
+            # Not enough columns; skip this line.
+            continue
+
+        # Parse values. (We assume values are integers.)
+        period = int(parts[0])
+        exec_time = int(parts[1])
+        # We ignore parts[2] (deadline) and parts[3] (task id)
+        chain_id = int(parts[4])
+
+        # If we are starting a new chain or this line belongs to a different chain.
+        if current_chain_id is None or chain_id != current_chain_id:
+            # If we already have a chain under construction, finish it.
+            if current_chain:
+                current_taskset.extend(current_chain)
+                curr_chain_len += 1
+                chain_lengths.append(curr_chain_len)
                 curr_chain_len = 0
-                continue
+            # Start a new chain.
+            # The chain always starts with the period.
+            current_chain = [period, exec_time]
+            current_chain_id = chain_id
+        else:
+            # Same chain: just append the execution time.
+            current_chain.append(exec_time)
+            curr_chain_len += 1
 
-            # Process a line representing a task.
-            parts = line.split()
-            if len(parts) < 5:
-                # Not enough columns; skip this line.
-                continue
+    # End-of-file: finish up any remaining chain or task set.
+    if current_chain:
+        current_taskset.extend(current_chain)
+        curr_chain_len += 1
+        chain_lengths.append(curr_chain_len)
+    if current_taskset:
+        tasksets.append((current_taskset, chain_lengths))
+        chain_lengths = []
 
-            # Parse values. (We assume values are integers.)
-            period = int(parts[0])
-            exec_time = int(parts[1])
-            # We ignore parts[2] (deadline) and parts[3] (task id)
-            chain_id = int(parts[4])
-
-            # If we are starting a new chain or this line belongs to a different chain.
-            if current_chain_id is None or chain_id != current_chain_id:
-                # If we already have a chain under construction, finish it.
-                if current_chain:
-                    current_taskset.extend(current_chain)
-                    curr_chain_len += 1
-                    chain_lengths.append(curr_chain_len)
-                    curr_chain_len = 0
-                # Start a new chain.
-                # The chain always starts with the period.
-                current_chain = [period, exec_time]
-                current_chain_id = chain_id
-            else:
-                # Same chain: just append the execution time.
-                current_chain.append(exec_time)
-                curr_chain_len += 1
+    return tasksets
 
-        # End-of-file: finish up any remaining chain or task set.
-        if current_chain:
-            current_taskset.extend(current_chain)
-            curr_chain_len += 1
-            chain_lengths.append(curr_chain_len)
-        if current_taskset:
-            tasksets.append((current_taskset, chain_lengths))
-            chain_lengths = []
+def convert_file_to_tasksets_odd_chains(filename):
+    '''
+    Converts an input file that is used by PWA_CD.m
+    to a Python list of lists, that can be then used
+    to generate csv files for the SAG.
 
-    return tasksets
+    This function doesn't assume that all chains have the same length,
+    as convert_file_to_tasksets() does. So it also outputs a list
+    of chain lengths.
+    '''
+    with open(filename, "r") as f:
+        return parse_tasksets_odd_chains(f)
 
-def generate_csv_n_task_sets_odd_chains(input = "", output = ""):
+def generate_csv_n_task_sets_odd_chains(input = "", output = "", compact = False, verify = False, validate = False):
     '''
     Generates CSVs that can be processed by the SAG framework for tasks with the following specifications:
     - The generated tasks that are used to generate jobs reflect ROS callback chains
@@ -114,11 +142,22 @@ def generate_csv_n_task_sets_odd_chains(input = "", output = ""):
     There are 2 CSVs per task set:
     - A CSV with all jobs, and their timing and priority parameters
     - A CSV with the precedence constraints between jobs
+    With compact=True, only the tasks are written (tasks_x.csv, see sag_input.py).
+    Task sets recorded in the manifest of output (see manifest.py) are not written again,
+    unless their files changed in size (or SHA-1, with verify=True) or their task set in input changed.
+    Task sets appended to input are therefore the only ones written, and listed in NEW_SETS_NAME.
+    With validate=True, every written pair is checked with validate_csvs.py (ValueError if invalid).
+    Returns the written task files.
     '''
     # nrof_chains also corresponds to the number of timers, since there is 1 timer per chain
 
     task_set_idx = 0
-    task_sets = convert_file_to_tasksets_odd_chains(input)
+    index = []
+    # "bcet" changes the manifest params of folders written when WCET 1 gave BCET 0, so that they are regenerated.
+    done = open_manifest(output, {"input": os.path.abspath(input), "compact": compact, "bcet": "max(1, wcet // 2)"})
+    written = []
+    with span("converter.parse", cat="converter"):
+        task_sets = convert_file_to_tasksets_odd_chains(input)
     
     for task_set in task_sets:
         ts, chain_lengths = task_set
@@ -146,8 +185,12 @@ def generate_csv_n_task_sets_odd_chains(input = "", output = ""):
                 chain_idx += 1
 
         priority = [0 for i in range(nrof_tasks)]
-        timer_priorities = random_permutation(1, nrof_chains)
-        subs_prorities = random_permutation(nrof_chains + 1, nrof_tasks)
+        item = f"task_set_{task_set_idx}"
+        # Seed of the priority assignment, stored in the index (and the manifest, to resume with the same priorities)
+        seed = done[item]["seed"] if item in done else random.randrange(2**32)
+        rng = random.Random(seed)
+        timer_priorities = random_permutation(1, nrof_chains, rng)
+        subs_prorities = random_permutation(nrof_chains + 1, nrof_tasks, rng)
 
         period_idx = 0
         timer_index= 0
@@ -176,11 +219,27 @@ def generate_csv_n_task_sets_odd_chains(input = "", output = ""):
         # print(tasks)
 
         tasks_by_p = sorted(tasks, key=lambda t: t[0])
+        bcet_ratio = sum(max(1, wcet // 2) * (hyperperiod // period) for _, wcet, _, period in tasks) / \
+                     sum(wcet * (hyperperiod // period) for _, wcet, _, period in tasks)
+        index.append(task_set_record(task_set_idx, tasks_by_p, hyperperiod, bcet_ratio, seed))
+
+        source = data_digest(task_set)
+        if is_done(output, done, item, verify, source):
+            task_set_idx +=1
+            continue
+
+        if compact:
+            tasks_csv_name = os.path.join(output, f"tasks_{task_set_idx}.csv")
+            write_tasks_file([(*task, max(1, task[1] // 2)) for task in tasks_by_p], tasks_csv_name)
+            record_item(output, done, item, [tasks_csv_name], seed=seed, source=source)
+            written.append(tasks_csv_name)
+            task_set_idx +=1
+            continue
 
         jobs_csv_name = os.path.join(output, f"task_set_{task_set_idx}.csv")
         pred_csv_name = os.path.join(output, f"pred_{task_set_idx}.csv")
         
-        with open(jobs_csv_name, "+w", newline='') as f, open(pred_csv_name, "+w", newline='') as g:
+        with span("converter.csv_write", cat="converter"), open(jobs_csv_name, "+w", newline='') as f, open(pred_csv_name, "+w", newline='') as g:
             writer = csv.writer(f)
             writer2 = csv.writer(g)
             first_row = ["Task ID","Job ID","Arrival min","Arrival max","Cost min","Cost max","Deadline","Priority"]
@@ -193,7 +252,7 @@ def generate_csv_n_task_sets_odd_chains(input = "", output = ""):
                 task_priority = tasks_by_p[i][0]
                 wcet = tasks_by_p[i][1]
                 pred = tasks_by_p[i][2]
-                bcet = wcet // 2 ################################ BCET = WCET / 2
+                bcet = max(1, wcet // 2) ####################### BCET = WCET / 2, at least 1 as in with_bcets()
                 task_period = tasks_by_p[i][3]
                 # INF = int(1e12)
                 # deadline = INF
@@ -220,75 +279,99 @@ def generate_csv_n_task_sets_odd_chains(input = "", output = ""):
                     # print(f"Task id: {task_priority}, job id: {job_id}, ri_min: {r_min}, ri_max: {r_max}, Ci_min: {bcet}, Ci_max: {wcet}, p: {job_id}")
                     job_id += 1
 
+        if enabled():
+            count("converter.bytes_written", os.path.getsize(jobs_csv_name) + os.path.getsize(pred_csv_name), cat="converter")
+        if validate:
+            with span("converter.validate", cat="converter"):
+                check_pair(jobs_csv_name, pred_csv_name)
+        record_item(output, done, item, [jobs_csv_name, pred_csv_name], seed=seed, source=source)
+        written.append(jobs_csv_name)
         task_set_idx +=1
 
-def convert_file_to_tasksets(filename):
+    write_index(output, index)
+    write_new_sets(output, written)
+
+    # Weights of stratified or quasi-random samples (see generate_data_for_Jiang_synthetic.py).
+    # Their task_set column is the index used in the task_set_x.csv names above.
+    weights_file = os.path.splitext(input)[0] + ".weights.csv"
+    if os.path.exists(weights_file):
+        shutil.copyfile(weights_file, os.path.join(output, "weights.csv"))
+    return written
+
+def parse_tasksets(lines):
     '''
-    Converts an input file that is used by PWA_CD.m
-    to a Python list of lists, that can be then used
-    to generate csv files for the SAG.
+    Parses task sets from lines of text as in the files read by convert_file_to_tasksets(),
+    e.g. a file or the text of some task sets (see taskset_offsets.py).
     '''
     tasksets = []      # This will hold all task sets.
     current_taskset = []  # List for the current task set.
     current_chain = []    # List for the current chain.
     current_chain_id = None  # To keep track of which chain we are processing.
 
-    with open(filename, "r") as f:
-        for line in f:
-            line = line.strip()
-            # Skip empty lines.
-            if not line:
-                continue
-
-            # Check for task-set separator.
-            if line == "-":
-                # End of a task set.
-                if current_chain:  # If there's a chain being built, finish it.
-                    current_taskset.extend(current_chain)
-                    current_chain = []
-                    current_chain_id = None
-                if current_taskset:
-                    tasksets.append(current_taskset)
-                # Reset for the next task set.
-                current_taskset = []
+    for line in lines:
+        line = line.strip()
+        # Skip empty lines.
+        if not line:
+            continue
+
+        # Check for task-set separator.
+        if line == "-":
+            # End of a task set.
+            if current_chain:  # If there's a chain being built, finish it.
+                current_taskset.extend(current_chain)
                 current_chain = []
                 current_chain_id = None
-                continue
-
-            # Process a line representing a task.
-            parts = line.split()
-            if len(parts) < 5:
-                # Not enough columns; skip this line.
-                continue
-
-            # Parse values. (We assume values are integers.)
-            period = int(parts[0])
-            exec_time = int(parts[1])
-            # We ignore parts[2] (deadline) and parts[3] (task id)
-            chain_id = int(parts[4])
-
-            # If we are starting a new chain or this line belongs to a different chain.
-            if current_chain_id is None or chain_id != current_chain_id:
-                # If we already have a chain under construction, finish it.
-                if current_chain:
-                    current_taskset.extend(current_chain)
-                # Start a new chain.
-                # The chain always starts with the period.
-                current_chain = [period, exec_time]
-                current_chain_id = chain_id
-            else:
-                # Same chain: just append the execution time.
-                current_chain.append(exec_time)
-
-        # End-of-file: finish up any remaining chain or task set.
-        if current_chain:
-            current_taskset.extend(current_chain)
-        if current_taskset:
-            tasksets.append(current_taskset)
+            if current_taskset:
+                tasksets.append(current_taskset)
+            # Reset for the next task set.
+            current_taskset = []
+            current_chain = []
+            current_chain_id = None
+            continue
+
+        # Process a line representing a task.
+        parts = line.split()
+        if len(parts) < 5:
+            # Not enough columns; skip this line.
+            continue
+
+        # Parse values. (We assume values are integers.)
+        period = int(parts[0])
+        exec_time = int(parts[1])
+        # We ignore parts[2] (deadline) and parts[3] (task id)
+        chain_id = int(parts[4])
+
+        # If we are starting a new chain or this line belongs to a different chain.
+        if current_chain_id is None or chain_id != current_chain_id:
+            # If we already have a chain under construction, finish it.
+            if current_chain:
+                current_taskset.extend(current_chain)
+            # Start a new chain.
+            # The chain always starts with the period.
+            current_chain = [period, exec_time]
+            current_chain_id = chain_id
+        else:
+            # Same chain: just append the execution time.
+            current_chain.append(exec_time)
+
+    # End-of-file: finish up any remaining chain or task set.
+    if current_chain:
+        current_taskset.extend(current_chain)
+    if current_taskset:
+        tasksets.append(current_taskset)
 
     return tasksets
 
-def generate_csv_n_task_sets(nrof_task_sets: int, U: float, nrof_chains: int, nrof_callbacks_per_chain: int, input = "", output = ""):
+def convert_file_to_tasksets(filename):
+    '''
+    Converts an input file that is used by PWA_CD.m
+    to a Python list of lists, that can be then used
+    to generate csv files for the SAG.
+    '''
+    with open(filename, "r") as f:
+        return parse_tasksets(f)
+
+def generate_csv_n_task_sets(nrof_task_sets: int, U: float, nrof_chains: int, nrof_callbacks_per_chain: int, input = "", output = "", compact = False, verify = False, validate = False):
     '''
     Generates CSVs that can be processed by the SAG framework for tasks with the following specifications:
     - The generated tasks that are used to generate jobs reflect ROS callback chains
@@ -303,12 +386,23 @@ def generate_csv_n_task_sets(nrof_task_sets: int, U: float, nrof_chains: int, nr
     There are 2 CSVs per task set:
     - A CSV with all jobs, and their timing and priority parameters
     - A CSV with the precedence constraints between jobs
+    With compact=True, only the tasks are written (tasks_x.csv, see sag_input.py).
+    Task sets recorded in the manifest of output (see manifest.py) are not written again,
+    unless their files changed in size (or SHA-1, with verify=True) or their task set in input changed.
+    Task sets appended to input are therefore the only ones written, and listed in NEW_SETS_NAME.
+    With validate=True, every written pair is checked with validate_csvs.py (ValueError if invalid).
+    Returns the written task files.
     '''
     # nrof_chains also corresponds to the number of timers, since there is 1 timer per chain
 
     nrof_tasks = nrof_chains * nrof_callbacks_per_chain
     task_set_idx = 1
-    task_sets = convert_file_to_tasksets(input)
+    index = []
+    done = open_manifest(output, {"input": os.path.abspath(input), "U": U, "nrof_chains": nrof_chains,
+                                  "nrof_callbacks_per_chain": nrof_callbacks_per_chain, "compact": compact})
+    written = []
+    with span("converter.parse", cat="converter"):
+        task_sets = convert_file_to_tasksets(input)
 
     for task_set in tqdm(task_sets, desc="Task Sets"):
         periods = [task_set[i] for i in range(0, len(task_set), nrof_callbacks_per_chain + 1)]
@@ -317,8 +411,12 @@ def generate_csv_n_task_sets(nrof_task_sets: int, U: float, nrof_chains: int, nr
         periods_extended = [period for i in range(len(periods)) for period in [periods[i]] * nrof_callbacks_per_chain]
         wcets = [task_set[i] for i in range(0, len(task_set)) if i % (nrof_callbacks_per_chain + 1) != 0]
         priority = [0 for i in range(nrof_tasks)]
-        timer_priorities = random_permutation(1, nrof_chains)
-        subs_prorities = random_permutation(nrof_chains + 1, nrof_tasks)
+        item = f"task_set_{task_set_idx}"
+        # Seed of the priority assignment, stored in the index (and the manifest, to resume with the same priorities)
+        seed = done[item]["seed"] if item in done else random.randrange(2**32)
+        rng = random.Random(seed)
+        timer_priorities = random_permutation(1, nrof_chains, rng)
+        subs_prorities = random_permutation(nrof_chains + 1, nrof_tasks, rng)
 
         timer_index= 0
         subs_index = 0
@@ -340,11 +438,25 @@ def generate_csv_n_task_sets(nrof_task_sets: int, U: float, nrof_chains: int, nr
         tasks = list(zip(priority, wcets, pred, periods_extended))
         # print(tasks)
         tasks_by_p = sorted(tasks, key=lambda t: t[0])
+        index.append(task_set_record(task_set_idx, tasks_by_p, hyperperiod, 1.0, seed))
+
+        source = data_digest(task_set)
+        if is_done(output, done, item, verify, source):
+            task_set_idx +=1
+            continue
+
+        if compact:
+            tasks_csv_name = os.path.join(output, f"tasks_{task_set_idx}.csv")
+            write_tasks_file([(*task, task[1]) for task in tasks_by_p], tasks_csv_name)
+            record_item(output, done, item, [tasks_csv_name], seed=seed, source=source)
+            written.append(tasks_csv_name)
+            task_set_idx +=1
+            continue
 
         jobs_csv_name = os.path.join(output, f"task_set_{task_set_idx}.csv")
         pred_csv_name = os.path.join(output, f"pred_{task_set_idx}.csv")
         
-        with open(jobs_csv_name, "+w", newline='') as f, open(pred_csv_name, "+w", newline='') as g:
+        with span("converter.csv_write", cat="converter"), open(jobs_csv_name, "+w", newline='') as f, open(pred_csv_name, "+w", newline='') as g:
             writer = csv.writer(f)
             writer2 = csv.writer(g)
             first_row = ["Task ID","Job ID","Arrival min","Arrival max","Cost min","Cost max","Deadline","Priority"]
@@ -385,8 +497,19 @@ def generate_csv_n_task_sets(nrof_task_sets: int, U: float, nrof_chains: int, nr
                     # print(f"Task id: {task_priority}, job id: {job_id}, ri_min: {r_min}, ri_max: {r_max}, Ci_min: {bcet}, Ci_max: {wcet}, p: {job_id}")
                     job_id += 1
 
+        if enabled():
+            count("converter.bytes_written", os.path.getsize(jobs_csv_name) + os.path.getsize(pred_csv_name), cat="converter")
+        if validate:
+            with span("converter.validate", cat="converter"):
+                check_pair(jobs_csv_name, pred_csv_name)
+        record_item(output, done, item, [jobs_csv_name, pred_csv_name], seed=seed, source=source)
+        written.append(jobs_csv_name)
         task_set_idx +=1
 
+    write_index(output, index)
+    write_new_sets(output, written)
+    return written
+
 def generate_data_SobhaniFigure9():
     # path_in = "/home/radu/repos/sag-ros-experiments/data/SobhaniExp/Fig9/tasksets_nrofjobs_max_5k"
     # path_in = "/home/radu/repos/sag-ros-experiments/SAG_input_SobhaniFig9_200sets"
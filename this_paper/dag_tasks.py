@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+'''
+Synthetic DAG-shaped ROS applications, to see how the analyses scale beyond
+independent chains of a few callbacks.
+
+Every timer starts a component of callbacks arranged in layers: a callback is triggered
+by one or more callbacks of earlier layers of the same component (join / shared subscription)
+and triggers at most max_fan_out callbacks (fork). All callbacks of a component have the
+period of its timer. The task sets are written in the usual job/precedence CSV format, e.g.
+
+    python dag_tasks.py SAG_input_dag --preset all -U 2 --sets 10
+'''
+import os
+import sys
+import math
+import random
+import argparse
+
+from profiling import span
+from sag_input import write_task_set_csvs, write_tasks_file, with_bcets, lcm
+from task_set_index import task_set_record, write_index
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "sag_scripts"))
+from validate_csvs import check_pair
+
+# Allowed periods in ms. They divide 200 ms, which bounds the hyperperiod and
+# thereby keeps the number of jobs under control of the target job count.
+PERIODS_MS = [10, 20, 25, 40, 50, 100, 200]
+
+# Presets for scaling benchmarks, from 10^2 to 10^5 jobs per task set.
+PRESETS = {
+    "100": {"target_jobs": 100, "nrof_timers": 2, "depth": 4, "max_fan_out": 2, "max_fan_in": 2},
+    "1k": {"target_jobs": 1000, "nrof_timers": 5, "depth": 6, "max_fan_out": 3, "max_fan_in": 2},
+    "10k": {"target_jobs": 10000, "nrof_timers": 20, "depth": 10, "max_fan_out": 3, "max_fan_in": 3},
+    "100k": {"target_jobs": 100000, "nrof_timers": 50, "depth": 16, "max_fan_out": 4, "max_fan_in": 3},
+}
+
+def uniform_split(total, n, rng):
+    '''
+    Splits total into n non-negative floats, uniformly over the simplex
+    (the distribution of drs() without bounds, but drawn from rng).
+    '''
+    weights = [-math.log(1 - rng.random()) for _ in range(n)]
+    s = sum(weights)
+    return [total * w / s for w in weights]
+
+def integer_split(total, n, rng):
+    '''
+    Splits the integer total (>= n) into n integers >= 1 that sum to total.
+    '''
+    parts = [max(1, int(round(x))) for x in uniform_split(total, n, rng)]
+    discrepancy = total - sum(parts)
+    i = 0
+    while discrepancy != 0:
+        step = 1 if discrepancy > 0 else -1
+        if parts[i % n] + step >= 1:
+            parts[i % n] += step
+            discrepancy -= step
+        i += 1
+    return parts
+
+def nodes_per_timer(periods, target_jobs, rng):
+    '''
+    Number of callbacks of every timer's component such that the task set has about
+    target_jobs jobs per hyperperiod (never more, unless every timer needs one callback).
+    '''
+    hyperperiod = lcm(periods)
+    jobs_per_node = [hyperperiod // period for period in periods]
+    shares = uniform_split(target_jobs, len(periods), rng)
+    nodes = [max(1, int(share // jpn)) for share, jpn in zip(shares, jobs_per_node)]
+
+    remaining = target_jobs - sum(n * jpn for n, jpn in zip(nodes, jobs_per_node))
+    while True:
+        fitting = [i for i, jpn in enumerate(jobs_per_node) if jpn <= remaining]
+        if not fitting:
+            return nodes
+        i = rng.choice(fitting)
+        nodes[i] += 1
+        remaining -= jobs_per_node[i]
+
+def layer_sizes(nrof_nodes, depth, max_fan_out, rng):
+    '''
+    Sizes of the layers of a component of nrof_nodes callbacks, the first layer being the timer.
+    A layer can be at most max_fan_out times as large as the previous one; nodes that do not
+    fit are moved to later layers, so the component can get more than depth layers.
+    '''
+    sizes = [1]
+    rest = nrof_nodes - 1
+    nrof_layers = min(depth, nrof_nodes) - 1
+    if nrof_layers > 0:
+        cuts = sorted(rng.sample(range(1, rest), nrof_layers - 1))
+        desired = [b - a for a, b in zip([0, *cuts], [*cuts, rest])]
+    else:
+        desired = []
+
+    carry = 0
+    for size in desired:
+        size += carry
+        capacity = sizes[-1] * max_fan_out
+        sizes.append(min(size, capacity))
+        carry = size - sizes[-1]
+    while carry > 0:
+        sizes.append(min(carry, sizes[-1] * max_fan_out))
+        carry -= sizes[-1]
+    return sizes
+
+def component_edges(sizes, max_fan_out, max_fan_in, rng):
+    '''
+    Predecessors of every node of a layered component, nodes being numbered 0.. layer by layer.
+    Every node after the timer gets one predecessor in the previous layer and up to max_fan_in - 1
+    more in any earlier layer, without exceeding max_fan_out successors per node.
+    '''
+    preds = [()]
+    out_degree = [0]
+    layers = [[0]]
+    for size in sizes[1:]:
+        layer = list(range(len(preds), len(preds) + size))
+        earlier = [node for l in layers for node in l]
+        # First one predecessor per node, which layer_sizes() guarantees to exist, then the joins.
+        chosen = []
+        for node in layer:
+            p = rng.choice([p for p in layers[-1] if out_degree[p] < max_fan_out])
+            out_degree[p] += 1
+            chosen.append([p])
+        for node_preds in chosen:
+            extra = rng.randint(0, max_fan_in - 1)
+            free = [p for p in earlier if out_degree[p] < max_fan_out and p != node_preds[0]]
+            for p in rng.sample(free, min(extra, len(free))):
+                out_degree[p] += 1
+                node_preds.append(p)
+        preds += [tuple(sorted(node_preds)) for node_preds in chosen]
+        out_degree += [0] * size
+        layers.append(layer)
+    return preds
+
+def generate_dag_task_set(U, nrof_timers, depth, max_fan_out, max_fan_in, target_jobs, rng=random):
+    '''
+    Generates a DAG-shaped task set with total utilization U as (priority, wcet, pred, period) tuples,
+    where pred is 0 for timers, the predecessor's priority, or a tuple of priorities for joins.
+    U is split among the timers, and the execution time of a component among its callbacks.
+    Timers get the highest priorities, as in generate_csv_n_task_sets().
+    '''
+    periods = [int(rng.choice(PERIODS_MS) * 1e6) for _ in range(nrof_timers)]
+    nodes = nodes_per_timer(periods, target_jobs, rng)
+    utils = uniform_split(U, nrof_timers, rng)
+
+    nrof_tasks = sum(nodes)
+    timer_priorities = rng.sample(range(1, nrof_timers + 1), nrof_timers)
+    subs_priorities = rng.sample(range(nrof_timers + 1, nrof_tasks + 1), nrof_tasks - nrof_timers)
+
+    tasks = []
+    for c in range(nrof_timers):
+        with span("generator.dag_component", cat="generator"):
+            sizes = layer_sizes(nodes[c], depth, max_fan_out, rng)
+            preds = component_edges(sizes, max_fan_out, max_fan_in, rng)
+        total_exec = max(nodes[c], int(round(utils[c] * periods[c])))
+        wcets = integer_split(total_exec, nodes[c], rng)
+
+        priority = [timer_priorities[c]] + [subs_priorities.pop() for _ in range(nodes[c] - 1)]
+        for node in range(nodes[c]):
+            pred = tuple(sorted(priority[p] for p in preds[node]))
+            if len(pred) <= 1:
+                pred = pred[0] if pred else 0
+            tasks.append((priority[node], wcets[node], pred, periods[c]))
+
+    return sorted(tasks, key=lambda t: t[0])
+
+def generate_csv_n_dag_task_sets(nrof_task_sets, U, nrof_timers, depth, max_fan_out, max_fan_in, target_jobs,
+                                 path="", bcet_fraction=1.0, compact=False, validate=False):
+    '''
+    Generates nrof_task_sets DAG-shaped task sets as job/precedence CSVs for the SAG framework
+    (or tasks_x.csv with compact=True), plus their index.csv. The jobs are written streamingly,
+    so task sets with 10^5 jobs do not need to be held in memory. With validate=True, every written pair
+    is checked with validate_csvs.py (ValueError if invalid). Returns the number of jobs per task set.
+    '''
+    index = []
+    nrof_jobs = []
+    for task_set_idx in range(1, nrof_task_sets + 1):
+        seed = random.randrange(2**32) # Seed of the whole task set, stored in the index
+        with span("generator.dag", cat="generator"):
+            tasks = generate_dag_task_set(U, nrof_timers, depth, max_fan_out, max_fan_in, target_jobs,
+                                          random.Random(seed))
+        hyperperiod = lcm([t[3] for t in tasks])
+        index.append(task_set_record(task_set_idx, tasks, hyperperiod, bcet_fraction, seed))
+        nrof_jobs.append(index[-1]["jobs"])
+
+        if compact:
+            write_tasks_file(with_bcets(tasks, bcet_fraction), os.path.join(path, f"tasks_{task_set_idx}.csv"))
+        else:
+            jobs_csv_name = os.path.join(path, f"task_set_{task_set_idx}.csv")
+            pred_csv_name = os.path.join(path, f"pred_{task_set_idx}.csv")
+            write_task_set_csvs(tasks, jobs_csv_name, pred_csv_name, bcet_fraction)
+            if validate:
+                with span("generator.validate", cat="generator"):
+                    check_pair(jobs_csv_name, pred_csv_name)
+
+    write_index(path, index)
+    return nrof_jobs
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate DAG-shaped ROS applications as job/precedence CSVs.")
+    parser.add_argument("path", help="Output folder (one subfolder jobs_<preset> per preset with --preset all)")
+    parser.add_argument("--preset", choices=[*PRESETS, "all"], default=None,
+                        help="Scaling preset (default: 1k); the options below override its values")
+    parser.add_argument("--sets", type=int, default=10, help="Number of task sets (default: 10)")
+    parser.add_argument("-U", type=float, default=2.0, help="Total utilization (default: 2.0)")
+    parser.add_argument("--jobs", type=int, default=None, help="Target number of jobs per task set")
+    parser.add_argument("--timers", type=int, default=None, help="Number of timers, i.e. DAG components")
+    parser.add_argument("--depth", type=int, default=None, help="Number of layers per component")
+    parser.add_argument("--fan-out", type=int, default=None, help="Maximum number of successors of a callback")
+    parser.add_argument("--fan-in", type=int, default=None, help="Maximum number of predecessors of a callback")
+    parser.add_argument("--bcet", type=float, default=1.0, help="BCET as a fraction of the WCET (default: 1.0)")
+    parser.add_argument("--compact", action="store_true", help="Only write tasks_x.csv, see sag_input.py")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for reproducible task sets")
+    parser.add_argument("--validate", action="store_true", help="Check every written job/precedence CSV pair")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    overrides = {"target_jobs": args.jobs, "nrof_timers": args.timers, "depth": args.depth,
+                 "max_fan_out": args.fan_out, "max_fan_in": args.fan_in}
+    if args.preset == "all":
+        configs = {f"jobs_{name}": preset for name, preset in PRESETS.items()}
+    elif args.preset is not None:
+        configs = {"": PRESETS[args.preset]}
+    else:
+        configs = {"": PRESETS["1k"]}
+
+    for subfolder, preset in configs.items():
+        params = {**preset, **{k: v for k, v in overrides.items() if v is not None}}
+        folder = os.path.join(args.path, subfolder)
+        os.makedirs(folder, exist_ok=True)
+        nrof_jobs = generate_csv_n_dag_task_sets(args.sets, args.U, path=folder, bcet_fraction=args.bcet,
+                                                 compact=args.compact, validate=args.validate, **params)
+        print(f"{folder}: {len(nrof_jobs)} task sets with {min(nrof_jobs)}-{max(nrof_jobs)} jobs")
+
+if __name__ == '__main__':
+    main()
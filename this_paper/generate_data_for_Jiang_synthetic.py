@@ -2,6 +2,8 @@ import random
 from drs import drs
 import os
 import math
+from profiling import span, count
+from manifest import open_manifest, read_manifest, is_done, record_item, random_state, set_random_state
 
 def sample_period_log_uniform(T_min, T_max, T_g):
     """
@@ -79,7 +81,8 @@ def generate_task_set(U, NC, C):
     """
     # Generate NC chain utilizations that sum to U (each ≤ 1)
     # chain_utils = drs(NC, U, [1.0] * NC) ######### For Jiang
-    chain_utils = drs(NC, U) ########### For Sobhani
+    with span("generator.drs", cat="generator"):
+        chain_utils = drs(NC, U) ########### For Sobhani
     
     # Allowed periods: numbers in [50,200] that are multiples of 50 or 20.
     # allowed_periods = [50, 60, 80, 100, 120, 140, 150, 160, 180, 200]
@@ -89,6 +92,7 @@ def generate_task_set(U, NC, C):
     periods = []
 
     while nrof_jobs < 1000 or nrof_jobs > 5000:
+        count("generator.period_samples", cat="generator")
         # periods = [random.choice(allowed_periods) for i in range(NC)]
         periods = [sample_period_log_uniform(10000, 100000, 5000) for i in range(NC)] # Log-uniform
         hyperperiod = math.lcm(*periods)
@@ -106,7 +110,8 @@ def generate_task_set(U, NC, C):
         if E < C:
             E = C
         # Partition E into C positive integers using partition_integer_min1.
-        exec_times = partition_integer_min1(E, C)
+        with span("generator.partition", cat="generator"):
+            exec_times = partition_integer_min1(E, C)
         for exec_time in exec_times:
             # Each row: period, execution time, deadline (same as period), task id, chain id.
             line = f"{period}\t{exec_time}\t{period}\t{task_id}\t{chain_index+1}"
@@ -117,7 +122,98 @@ def generate_task_set(U, NC, C):
     output_lines.append("-")
     return "\n".join(output_lines)
 
-def generate_file(nrof_task_sets, n, b, Unorm, m, filename="tasksets.txt"):
+SAMPLING_MODES = ["random", "stratified", "lhs", "sobol"]
+
+def sample_parameters(nrof_task_sets, n, b, Unorm, m, sampling="stratified", u_buckets=4):
+    """
+    Draws (NC, C, U) for nrof_task_sets task sets from the same distribution as generate_file(),
+    i.e. NC uniform in [2, n], C uniform in [2, b] and U uniform in [0.1, min(m * Unorm, NC)],
+    but spread more evenly over that space:
+      - stratified: every combination of NC, C and one of u_buckets equal-width U buckets is a
+        stratum; the task sets are divided equally over the strata.
+      - lhs / sobol: a Latin hypercube or scrambled Sobol sequence over the three axes.
+
+    Returns a list of dictionaries with NC, C, U, the stratum and the weight of the task set.
+    A weighted schedulability ratio sum(weight * verdict) estimates the same ratio as plain
+    random sampling, with fewer task sets.
+    """
+    def U_range(NC):
+        return 0.1, min(m * Unorm, NC)
+
+    if sampling == "stratified":
+        strata = [(NC, C, k) for NC in range(2, n + 1) for C in range(2, b + 1) for k in range(u_buckets)]
+        if nrof_task_sets < len(strata):
+            print(f"Warning: {nrof_task_sets} task sets for {len(strata)} strata, some strata stay empty")
+        # All strata are equally likely, so the task sets are spread equally over them.
+        extra = set(random.sample(range(len(strata)), nrof_task_sets % len(strata)))
+        samples = []
+        for idx, (NC, C, k) in enumerate(strata):
+            size = nrof_task_sets // len(strata) + (idx in extra)
+            U_min, U_max = U_range(NC)
+            width = (U_max - U_min) / u_buckets
+            for _ in range(size):
+                samples.append({"NC": NC, "C": C, "U": random.uniform(U_min + k * width, U_min + (k + 1) * width),
+                                "stratum": f"NC={NC};C={C};U={k}", "weight": 1 / len(strata) / size})
+        random.shuffle(samples)
+        return samples
+
+    from scipy.stats import qmc
+    seed = random.getrandbits(32)
+    if sampling == "lhs":
+        points = qmc.LatinHypercube(d=3, seed=seed).random(nrof_task_sets)
+    elif sampling == "sobol":
+        points = qmc.Sobol(d=3, scramble=True, seed=seed).random(nrof_task_sets)
+    else:
+        raise ValueError(f"Unknown sampling mode {sampling}, expected one of {SAMPLING_MODES}")
+
+    samples = []
+    for u_NC, u_C, u_U in points:
+        NC = 2 + min(int(u_NC * (n - 1)), n - 2)
+        C = 2 + min(int(u_C * (b - 1)), b - 2)
+        U_min, U_max = U_range(NC)
+        samples.append({"NC": NC, "C": C, "U": U_min + u_U * (U_max - U_min),
+                        "stratum": sampling, "weight": 1 / nrof_task_sets})
+    return samples
+
+def weights_file_name(filename):
+    """
+    The file next to a task-set file that holds the weights of its task sets.
+    """
+    return os.path.splitext(filename)[0] + ".weights.csv"
+
+def write_task_sets(filename, nrof_task_sets, make_task_set, append=False, seed=None):
+    """
+    Writes nrof_task_sets task sets returned by make_task_set() to filename and records the file,
+    with the state of the random generator, in the manifest of its folder (see manifest.py).
+
+    With append=True the task sets are added to the end of filename, and the random generator
+    continues from the recorded state. Growing a file by k task sets thus gives the same file as
+    generating it with k more task sets at once, and the existing task sets stay as they are.
+    The seed, if any, is only recorded (see generate_file()).
+    Returns the total number of task sets in the file.
+    """
+    folder = os.path.dirname(filename) or "."
+    item = os.path.basename(filename)
+    entry = read_manifest(folder)[1].get(item)
+    existing = 0
+    if append:
+        if entry is None or "state" not in entry or not is_done(folder, {item: entry}, item):
+            raise ValueError(f"Cannot append to {filename}: it is not recorded (unchanged) in {folder}/manifest.jsonl")
+        set_random_state(entry["state"])
+        existing = entry["nrof_task_sets"]
+
+    with span("generator.generate_file", cat="generator"), open(filename, "a" if append else "w") as f:
+        for _ in range(nrof_task_sets):
+            f.write(make_task_set() + "\n")
+        count("generator.bytes_written", f.tell(), cat="generator")
+
+    total = existing + nrof_task_sets
+    record_item(folder, {}, item, [filename], nrof_task_sets=total, state=random_state(),
+                seed=entry.get("seed") if append else seed)
+    return total
+
+def generate_file(nrof_task_sets, n, b, Unorm, m, filename="tasksets.txt", sampling="random", u_buckets=4,
+                  append=False, seed=None):
     """
     Generate a file with multiple task sets.
     
@@ -128,19 +224,59 @@ def generate_file(nrof_task_sets, n, b, Unorm, m, filename="tasksets.txt"):
       - U is a random float from (0, min(Upper, NC)] ensuring no chain utilization exceeds 1.
     
     Each task set is generated by generate_task_set(U, NC, C) and written to the specified file.
+    With any other sampling than "random", (NC, C, U) come from sample_parameters() and the
+    weights of the task sets are written to weights_file_name(filename).
+    With a seed, the file only depends on the seed and its name.
+    With append=True, nrof_task_sets more task sets are added, see write_task_sets().
     """
-    with open(filename, "w") as f:
-        for _ in range(nrof_task_sets):
-            NC = random.randint(2, n)
-            C = random.randint(2, b)
-            Upper = m * Unorm
-            # U is chosen in (0, U_max] with U_max ensuring each chain's utilization ≤ 1.
-            U_max = min(Upper, NC)
-            U = random.uniform(0.1, U_max)
-            task_set = generate_task_set(U, NC, C)
-            f.write(task_set + "\n")
-
-def generate_data_for_Fig6_Jiang():
+    if seed is not None and not append:
+        random.seed(f"{seed}:{os.path.basename(filename)}")
+
+    if sampling != "random":
+        if append:
+            raise ValueError(f"Only random sampling can be appended to, the weights of {sampling} sampling depend on the sample size")
+        samples = sample_parameters(nrof_task_sets, n, b, Unorm, m, sampling, u_buckets)
+        with span("generator.generate_file", cat="generator"), open(filename, "w") as f, \
+             open(weights_file_name(filename), "w") as w:
+            w.write("task_set,NC,C,U,stratum,weight\n")
+            for idx, sample in enumerate(samples):
+                task_set = generate_task_set(sample["U"], sample["NC"], sample["C"])
+                f.write(task_set + "\n")
+                w.write(f"{idx},{sample['NC']},{sample['C']},{sample['U']},{sample['stratum']},{sample['weight']}\n")
+            count("generator.bytes_written", f.tell() + w.tell(), cat="generator")
+        record_item(os.path.dirname(filename) or ".", {}, os.path.basename(filename),
+                    [filename, weights_file_name(filename)], nrof_task_sets=nrof_task_sets, seed=seed)
+        return
+
+    def make_task_set():
+        NC = random.randint(2, n)
+        C = random.randint(2, b)
+        Upper = m * Unorm
+        # U is chosen in (0, U_max] with U_max ensuring each chain's utilization ≤ 1.
+        U_max = min(Upper, NC)
+        U = random.uniform(0.1, U_max)
+        return generate_task_set(U, NC, C)
+
+    write_task_sets(filename, nrof_task_sets, make_task_set, append, seed)
+
+def generate_file_once(done, seed, nrof_task_sets, n, b, Unorm, m, filename, verify=False):
+    """
+    generate_file() unless filename is recorded as complete in the manifest of its folder
+    (see manifest.py). With a seed, the file only depends on the seed and its name, so an
+    interrupted sweep resumes with exactly the task sets it would have had.
+    Returns whether the file was generated.
+    """
+    folder = os.path.dirname(filename)
+    item = os.path.basename(filename)
+    if is_done(folder, done, item, verify):
+        print(f"Skipping {filename}, it is complete")
+        return False
+
+    generate_file(nrof_task_sets, n, b, Unorm, m, filename, seed=seed)
+    print(f"Task sets have been generated in {filename}")
+    return True
+
+def generate_data_for_Fig6_Jiang(seed=None, verify=False):
     # Base configuration:
     nrof_task_sets = 500
     m = 4
@@ -149,63 +285,62 @@ def generate_data_for_Fig6_Jiang():
     Unorm = 0.3
     g = 0 # Not used here, but it is used in Jiang et al.
     alfa = 0 # Not used here, but it is used in Jiang et al.
+    params = {"nrof_task_sets": nrof_task_sets, "m": m, "n": n, "b": b, "Unorm": Unorm, "seed": seed}
 
     # Vary Unorm
     output_folder = "./JiangFig6/vary_Unorm"
-    os.makedirs(output_folder)
+    os.makedirs(output_folder, exist_ok=True)
+    done = open_manifest(output_folder, params)
     for i in range(1, 10):
         new_Unorm = i / 10
         output_file = f"tasksets_unorm_{new_Unorm}.txt"
         output_file = os.path.join(output_folder, output_file)
-        generate_file(nrof_task_sets, n, b, new_Unorm, m, output_file)
-        print(f"Task sets have been generated in {output_file}")
+        generate_file_once(done, seed, nrof_task_sets, n, b, new_Unorm, m, output_file, verify)
     
     # Vary n, i.e., number of chains
     output_folder = "./JiangFig6/vary_n"
-    os.makedirs(output_folder)
+    os.makedirs(output_folder, exist_ok=True)
+    done = open_manifest(output_folder, params)
     for i in range(2, 9):
         new_n = i
         output_file = f"tasksets_n_{new_n}.txt"
         output_file = os.path.join(output_folder, output_file)
-        generate_file(nrof_task_sets, new_n, b, Unorm, m, output_file)
-        print(f"Task sets have been generated in {output_file}")
+        generate_file_once(done, seed, nrof_task_sets, new_n, b, Unorm, m, output_file, verify)
     
     # Vary b, i.e., number of callbacks per chain
     output_folder = "./JiangFig6/vary_b"
-    os.makedirs(output_folder)
+    os.makedirs(output_folder, exist_ok=True)
+    done = open_manifest(output_folder, params)
     for i in range(2, 7):
         new_b = i
         output_file = f"tasksets_b_{new_b}.txt"
         output_file = os.path.join(output_folder, output_file)
-        generate_file(nrof_task_sets, n, new_b, Unorm, m, output_file)
-        print(f"Task sets have been generated in {output_file}")
+        generate_file_once(done, seed, nrof_task_sets, n, new_b, Unorm, m, output_file, verify)
     
     # Vary m, i.e., number of executor-threads
     output_folder = "./JiangFig6/vary_m"
-    os.makedirs(output_folder)
+    os.makedirs(output_folder, exist_ok=True)
+    done = open_manifest(output_folder, params)
     for i in range(2, 9):
         new_m = i
         output_file = f"tasksets_m_{new_m}.txt"
         output_file = os.path.join(output_folder, output_file)
-        generate_file(nrof_task_sets, n, b, Unorm, new_m, output_file)
-        print(f"Task sets have been generated in {output_file}")
+        generate_file_once(done, seed, nrof_task_sets, n, b, Unorm, new_m, output_file, verify)
     
-def generate_Sobhani_Fig9_lite(nrof_task_sets, n, b, filename="tasksets.txt"):
+def generate_Sobhani_Fig9_lite(nrof_task_sets, n, b, filename="tasksets.txt", utilizations=None, append=False):
     """
     Generate a file with multiple task sets.
+    With append=True, nrof_task_sets more task sets are added to the files of the
+    given utilizations (default: all), see write_task_sets().
     """
     name = "tasksets"
 
     for i in range(8, 41, 4):
         U = i / 10
+        if utilizations is not None and U not in utilizations:
+            continue
         full_name = f"{name}_{U}.txt"
-
-        with open(full_name, "w") as f:
-            for _ in range(nrof_task_sets):
-                NC = n
-                C = b
-                task_set = generate_task_set(U, NC, C)
-                f.write(task_set + "\n")
+        write_task_sets(full_name, nrof_task_sets, lambda: generate_task_set(U, n, b), append)
 
 def generate_Sobhani_b(nrof_task_sets, n, filename="tasksets.txt"):
     """
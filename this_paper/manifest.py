@@ -0,0 +1,117 @@
+'''
+Manifests that make the generation of a sweep folder resumable.
+
+manifest.jsonl starts with the parameters of the folder, followed by one line per
+completed item (e.g. a task set) with the size and SHA-1 of each of its output files.
+A line is appended only after all files of the item are written, so an interrupted
+generation resumes at the first item without a line, and a torn last line is ignored.
+'''
+import os
+import json
+import random
+import hashlib
+
+MANIFEST_NAME = "manifest.jsonl"
+
+def file_digest(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def data_digest(data):
+    '''
+    SHA-1 of the repr() of data, e.g. of a parsed task set, to detect that an input changed.
+    '''
+    return hashlib.sha1(repr(data).encode()).hexdigest()
+
+def read_manifest(folder):
+    '''
+    Returns (params, {item: entry}) of the manifest of folder, or (None, {}) if there is none.
+    An item that was recorded several times (e.g. a file that was appended to) has its last entry.
+    '''
+    path = os.path.join(folder, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None, {}
+    with open(path) as f:
+        lines = f.read().splitlines()
+    try:
+        params = json.loads(lines[0])["params"]
+    except (IndexError, ValueError, KeyError, TypeError):
+        return None, {}
+
+    done = {}
+    for line in lines[1:]:
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue # Torn line of an interrupted run
+        done[entry["item"]] = entry
+    return params, done
+
+def open_manifest(folder, params):
+    '''
+    Returns {item: entry} of the items completed in folder with the same params (a JSON-serializable
+    dict). If the manifest does not exist or was written with other params, a new one is started.
+    '''
+    path = os.path.join(folder, MANIFEST_NAME)
+    params = json.loads(json.dumps(params)) # As it reads back, e.g. tuples become lists
+    old_params, done = read_manifest(folder)
+    if old_params == params:
+        return done
+    if os.path.exists(path):
+        print(f"{path} was written with other parameters, regenerating {folder}")
+
+    with open(path, "w") as f:
+        f.write(json.dumps({"params": params}) + "\n")
+    return {}
+
+def is_done(folder, done, item, verify=False, source=None):
+    '''
+    Whether item was completed and its files are still there with the recorded sizes
+    (and, with verify=True, the recorded SHA-1). If source is given, e.g. the digest of
+    the input the item was generated from, it must be the recorded one as well.
+    '''
+    entry = done.get(item)
+    if entry is None or (source is not None and entry.get("source") != source):
+        return False
+    for name, (size, digest) in entry["files"].items():
+        path = os.path.join(folder, name)
+        if not os.path.exists(path) or os.path.getsize(path) != size:
+            return False
+        if verify and file_digest(path) != digest:
+            return False
+    return True
+
+def record_item(folder, done, item, files, **extra):
+    '''
+    Appends item with its output files (paths) and extra fields (e.g. its seed) to the manifest of folder.
+    A folder without manifest gets one without params.
+    '''
+    entry = {"item": item, **extra,
+             "files": {os.path.relpath(path, folder): [os.path.getsize(path), file_digest(path)] for path in files}}
+    path = os.path.join(folder, MANIFEST_NAME)
+    if not os.path.exists(path):
+        with open(path, "w") as f:
+            f.write(json.dumps({"params": {}}) + "\n")
+    with open(path, "a") as f:
+        f.write(json.dumps(entry) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    done[item] = entry
+    return entry
+
+def random_state(rng=random):
+    '''
+    The state of rng in a form that can be stored in a manifest entry.
+    '''
+    version, internal, gauss_next = rng.getstate()
+    return [version, list(internal), gauss_next]
+
+def set_random_state(state, rng=random):
+    '''
+    Restores a state returned by random_state().
+    '''
+    version, internal, gauss_next = state
+    rng.setstate((version, tuple(internal), gauss_next))
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+'''
+Make-style rebuilds of the experiment pipeline (generate -> convert -> analyse -> aggregate -> plot),
+so that changing one parameter only reruns the steps whose inputs changed.
+
+A pipeline is a JSON file with one node per step. Paths are relative to the folder of the file,
+"{name}" in cmd, inputs and outputs is replaced by the parameter name, e.g.
+
+    {"nodes": [
+      {"name": "generate", "params": {"U": 2.0, "seed": 1},
+       "cmd": ["python", "../this_paper/dag_tasks.py", "dag", "--preset", "100", "-U", "{U}", "--seed", "{seed}"],
+       "outputs": ["dag"]},
+      {"name": "analyse", "env": {"NPTEST": "/path/to/nptest"},
+       "cmd": ["python", "../sag_scripts/run_on_folder.py", "dag", "--output", "results_dag.csv"],
+       "deps": ["../sag_scripts/nptest.py", "../sag_scripts/validate_csvs.py", "../this_paper/profiling.py"],
+       "inputs": ["dag"], "outputs": ["results_dag.csv"]},
+      {"name": "aggregate",
+       "cmd": ["python", "../sag_scripts/process_results.py", "--input", "results_dag.csv", "--output", "data_dag.csv"],
+       "inputs": ["results_dag.csv"], "outputs": ["data_dag.csv"]}
+    ]}
+
+A node depends on the nodes whose outputs (files or folders) contain one of its inputs (files,
+folders or glob patterns). Its stamp is a hash of its command, parameters and environment, of the
+contents of its inputs, of every file named in its command or by an environment variable (scripts,
+the nptest binary, ...) and of its "deps": the source files (or folders, or glob patterns) the command
+uses without naming them, such as the modules imported by its script, which are not hashed otherwise.
+A node is rebuilt if an output is missing or its stamp differs from the one of its last successful
+run, which is stored in <pipeline>.stamps.json. A node owns its outputs: they are deleted before it
+reruns. Stamps are computed once the upstream nodes are done, so a node whose upstream rebuilt
+identical outputs is not rerun. Independent nodes run in parallel:
+
+    python pipeline.py status experiments.json
+    python pipeline.py build experiments.json [nodes ...] --jobs 4
+'''
+import os
+import sys
+import glob
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from manifest import file_digest
+
+STAMPS_SUFFIX = ".stamps.json"
+LOGS_SUFFIX = ".logs"
+
+def _format(value, params):
+    return value.format(**params) if isinstance(value, str) else str(value)
+
+def load_pipeline(spec_file):
+    '''
+    Reads a pipeline file. Returns (folder, {name: node}) with the parameters substituted into
+    cmd, deps, inputs and outputs, and node["upstream"] the names of the nodes it depends on.
+    '''
+    with open(spec_file) as f:
+        spec = json.load(f)
+    folder = os.path.dirname(os.path.abspath(spec_file))
+
+    nodes = {}
+    for raw in spec["nodes"]:
+        name = raw["name"]
+        if name in nodes:
+            raise ValueError(f"{spec_file}: node {name} is defined twice")
+        params = raw.get("params", {})
+        nodes[name] = {
+            "name": name,
+            "params": params,
+            "env": {k: _format(v, params) for k, v in raw.get("env", {}).items()},
+            "cmd": [_format(arg, params) for arg in raw["cmd"]],
+            "deps": [os.path.normpath(_format(p, params)) for p in raw.get("deps", [])],
+            "inputs": [os.path.normpath(_format(p, params)) for p in raw.get("inputs", [])],
+            "outputs": [os.path.normpath(_format(p, params)) for p in raw.get("outputs", [])],
+        }
+
+    producer = {}
+    for node in nodes.values():
+        for output in node["outputs"]:
+            if output in producer:
+                raise ValueError(f"{spec_file}: {output} is an output of {producer[output]} and {node['name']}")
+            producer[output] = node["name"]
+
+    for node in nodes.values():
+        node["upstream"] = sorted({producer[output] for pattern in node["inputs"] for output in producer
+                               if producer[output] != node["name"] and _inside(pattern, output)})
+    _check_acyclic(nodes, spec_file)
+    return folder, nodes
+
+def _inside(pattern, output):
+    '''
+    Whether an input (possibly a glob pattern) lies in or is the output file or folder.
+    '''
+    prefix = pattern.split("*")[0].split("?")[0].split("[")[0]
+    if prefix != pattern: # A glob, match on the part before the first wildcard
+        return prefix.startswith(output + os.sep) or output.startswith(prefix)
+    return pattern == output or pattern.startswith(output + os.sep)
+
+def _check_acyclic(nodes, spec_file):
+    state = {}
+    def visit(name, path):
+        if state.get(name) == "done":
+            return
+        if state.get(name) == "visiting":
+            raise ValueError(f"{spec_file}: cycle {' -> '.join(path + [name])}")
+        state[name] = "visiting"
+        for dep in nodes[name]["upstream"]:
+            visit(dep, path + [name])
+        state[name] = "done"
+    for name in nodes:
+        visit(name, [])
+
+def read_stamps(spec_file):
+    path = spec_file + STAMPS_SUFFIX
+    if not os.path.exists(path):
+        return {"nodes": {}, "files": {}}
+    with open(path) as f:
+        return json.load(f)
+
+def write_stamps(spec_file, stamps):
+    tmp = spec_file + STAMPS_SUFFIX + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(stamps, f, indent=1, sort_keys=True)
+    os.replace(tmp, spec_file + STAMPS_SUFFIX)
+
+def _file_digest_cached(path, cache):
+    '''
+    SHA-1 of a file, reused from cache (path -> [size, mtime_ns, digest]) if the file did not change.
+    '''
+    st = os.stat(path)
+    entry = cache.get(path)
+    if entry is not None and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+        return entry[2]
+    digest = file_digest(path)
+    cache[path] = [st.st_size, st.st_mtime_ns, digest]
+    return digest
+
+def path_digest(path, cache):
+    '''
+    Digest of a file, or of the relative paths and digests of all files below a folder. None if path does not exist.
+    '''
+    if os.path.isfile(path):
+        return _file_digest_cached(path, cache)
+    if not os.path.isdir(path):
+        return None
+    h = hashlib.sha1()
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for file in sorted(files):
+            full = os.path.join(root, file)
+            h.update(f"{os.path.relpath(full, path)}\0{_file_digest_cached(full, cache)}\n".encode())
+    return h.hexdigest()
+
+def _pattern_digests(patterns, cache):
+    '''
+    {path: digest} of the files and folders matched by patterns (see path_digest()).
+    '''
+    digests = {}
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            digests[path] = path_digest(path, cache)
+    return digests
+
+def node_stamp(node, cache):
+    '''
+    Hash of everything a node's outputs are derived from.
+    '''
+    tools = {arg: _file_digest_cached(arg, cache) for arg in node["cmd"]
+             if os.path.isfile(arg) and os.path.normpath(arg) not in node["outputs"]}
+    tools.update({f"${name}": _file_digest_cached(value, cache) for name, value in node["env"].items()
+                  if os.path.isfile(value)})
+    data = {"cmd": node["cmd"], "params": node["params"], "env": node["env"], "tools": tools,
+            "deps": _pattern_digests(node["deps"], cache), "inputs": _pattern_digests(node["inputs"], cache)}
+    return hashlib.sha1(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+def stale_reason(node, stamp, stamps):
+    '''
+    Why a node must be rebuilt, or None if it is up to date.
+    '''
+    missing = [output for output in node["outputs"] if not os.path.exists(output)]
+    if missing:
+        return f"missing {missing[0]}"
+    recorded = stamps["nodes"].get(node["name"])
+    if recorded is None:
+        return "never built"
+    if recorded != stamp:
+        return "inputs changed"
+    return None
+
+def _closure(nodes, targets):
+    selected = set()
+    todo = list(targets)
+    while todo:
+        name = todo.pop()
+        if name not in nodes:
+            raise KeyError(f"Unknown node {name}")
+        if name not in selected:
+            selected.add(name)
+            todo.extend(nodes[name]["upstream"])
+    return selected
+
+def run_node(node, logs):
+    '''
+    Runs the command of a node with its output in <logs>/<name>.log. Returns (returncode, seconds).
+    The outputs of the previous run are removed first, as e.g. run_on_folder.py appends to its
+    results file and would skip the task sets it finds there.
+    '''
+    for output in node["outputs"]:
+        if os.path.isdir(output):
+            shutil.rmtree(output)
+        elif os.path.exists(output):
+            os.remove(output)
+    os.makedirs(logs, exist_ok=True)
+    start = time.time()
+    with open(os.path.join(logs, f"{node['name']}.log"), "w") as log:
+        returncode = subprocess.call(node["cmd"], stdout=log, stderr=subprocess.STDOUT,
+                                     env={**os.environ, **node["env"]})
+    return returncode, time.time() - start
+
+def build(spec_file, targets=None, jobs=4, force=False, dry_run=False):
+    '''
+    Rebuilds the outdated nodes among targets (default: all) and their dependencies.
+    Returns {name: "up to date" | "built" | "failed" | "skipped" | "stale"}.
+    '''
+    spec_file = os.path.abspath(spec_file)
+    folder, nodes = load_pipeline(spec_file)
+    selected = _closure(nodes, targets or list(nodes))
+    stamps = read_stamps(spec_file)
+    logs = spec_file + LOGS_SUFFIX
+    cwd = os.getcwd()
+    os.chdir(folder)
+    try:
+        status = {}
+        running = {}
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            while len(status) < len(selected):
+                for name in sorted(selected - set(status) - set(running)):
+                    deps = [status.get(dep) for dep in nodes[name]["upstream"]]
+                    if any(d in ("failed", "skipped") for d in deps):
+                        status[name] = "skipped"
+                        print(f"[{name}] skipped, a dependency failed")
+                        continue
+                    if dry_run and "stale" in deps:
+                        status[name] = "stale"
+                        print(f"[{name}] stale, a dependency is stale")
+                        continue
+                    if not all(d in ("up to date", "built", "stale") for d in deps):
+                        continue
+
+                    stamp = node_stamp(nodes[name], stamps["files"])
+                    reason = "forced" if force else stale_reason(nodes[name], stamp, stamps)
+                    if reason is None:
+                        status[name] = "up to date"
+                    elif dry_run:
+                        status[name] = "stale"
+                        print(f"[{name}] stale, {reason}")
+                    else:
+                        print(f"[{name}] running, {reason}: {' '.join(nodes[name]['cmd'])}")
+                        running[name] = (executor.submit(run_node, nodes[name], logs), stamp)
+
+                if not running:
+                    continue
+                finished, _ = wait([future for future, _ in running.values()], return_when=FIRST_COMPLETED)
+                for name in [n for n, (future, _) in running.items() if future in finished]:
+                    future, stamp = running.pop(name)
+                    returncode, seconds = future.result()
+                    missing = [output for output in nodes[name]["outputs"] if not os.path.exists(output)]
+                    if returncode != 0 or missing:
+                        status[name] = "failed"
+                        stamps["nodes"].pop(name, None)
+                        why = f"exit code {returncode}" if returncode != 0 else f"{missing[0]} was not written"
+                        print(f"[{name}] failed ({why}), see {os.path.join(logs, name + '.log')}")
+                    else:
+                        status[name] = "built"
+                        stamps["nodes"][name] = stamp
+                        print(f"[{name}] built in {seconds:.1f}s")
+                    write_stamps(spec_file, stamps)
+        if not dry_run:
+            write_stamps(spec_file, stamps) # The digest cache of up-to-date nodes
+        return status
+    finally:
+        os.chdir(cwd)
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the outdated steps of an experiment pipeline.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    p = subparsers.add_parser("build", help="Rerun the outdated nodes")
+    p.add_argument("pipeline", help="Pipeline JSON file")
+    p.add_argument("nodes", nargs="*", help="Nodes to bring up to date, with their dependencies (default: all)")
+    p.add_argument("--jobs", type=int, default=4, help="Number of nodes to run in parallel (default: 4)")
+    p.add_argument("--force", action="store_true", help="Rerun the nodes even if they are up to date")
+
+    p = subparsers.add_parser("status", help="Print which nodes are outdated and why, without running anything")
+    p.add_argument("pipeline", help="Pipeline JSON file")
+    p.add_argument("nodes", nargs="*", help="Nodes to check, with their dependencies (default: all)")
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        status = build(args.pipeline, args.nodes, args.jobs, args.force)
+    else:
+        status = build(args.pipeline, args.nodes, dry_run=True)
+    counts = {}
+    for s in status.values():
+        counts[s] = counts.get(s, 0) + 1
+    print(", ".join(f"{n} {s}" for s, n in sorted(counts.items())))
+    if any(s in ("failed", "skipped") for s in status.values()):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
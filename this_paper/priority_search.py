@@ -0,0 +1,219 @@
+import os
+import sys
+import random
+import hashlib
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "jiang_et_al"))
+sys.path.insert(0, os.path.join(HERE, "..", "sag_scripts"))
+from JRTA import chains_to_jiang, jiang_on_tasksets
+from nptest import run_nptest, read_rta
+from sag_input import split_chains, chains_to_tasks, write_task_set_csvs
+from convert_sobhani_to_sag import convert_file_to_tasksets_odd_chains
+
+def initial_priorities(chains):
+    '''
+    Rate-monotonic starting point for the search.
+    Timers get priorities 1..nrof_chains, as in all generators, and the subscriptions get
+    the remaining priorities. Chains with shorter periods come first, and inside a chain
+    the callbacks keep their precedence order.
+    Priorities are given per callback in chain order, like the hard-coded
+    priority = [1, 4, 2, 5, 7, 3, 6, 8, 9] of Jiang et al.'s case study.
+    '''
+    nrof_chains = len(chains)
+    by_period = sorted(range(nrof_chains), key=lambda c: chains[c][0])
+
+    offsets = []
+    idx = 0
+    for _, wcets in chains:
+        offsets.append(idx)
+        idx += len(wcets)
+
+    priority = [0] * idx
+    next_timer = 1
+    next_sub = nrof_chains + 1
+    for c in by_period:
+        priority[offsets[c]] = next_timer
+        next_timer += 1
+    for c in by_period:
+        for k in range(1, len(chains[c][1])):
+            priority[offsets[c] + k] = next_sub
+            next_sub += 1
+
+    return priority
+
+def callback_chains(chains):
+    '''
+    Returns, per callback in chain order, the chain it belongs to (starting from 1)
+    and whether it is the timer of that chain.
+    '''
+    chain_of = []
+    is_timer = []
+    for chain, (_, wcets) in enumerate(chains, start=1):
+        for k in range(len(wcets)):
+            chain_of.append(chain)
+            is_timer.append(k == 0)
+    return chain_of, is_timer
+
+def evaluate_priorities(job):
+    '''
+    Runs the SAG test for one priority ordering. Executed by the worker pool.
+    Returns (priority, schedulable, score, worst_chain) where score is the largest
+    WCRT / period ratio over all callbacks and worst_chain is the chain it belongs to.
+    '''
+    chains, priority, m, bcet_fraction, workdir, nptest = job
+    key = hashlib.sha1(",".join(map(str, priority)).encode()).hexdigest()[:16]
+    jobs_csv_name = os.path.join(workdir, f"task_set_{key}.csv")
+    pred_csv_name = os.path.join(workdir, f"pred_{key}.csv")
+
+    tasks = chains_to_tasks(chains, priority)
+    write_task_set_csvs(tasks, jobs_csv_name, pred_csv_name, bcet_fraction)
+
+    try:
+        result = run_nptest(jobs_csv_name, pred_csv_name, m, nptest, ["-r"])
+        rta = read_rta(jobs_csv_name)
+    except (RuntimeError, OSError):
+        return (priority, False, float("inf"), None)
+
+    period_of = {t[0]: t[3] for t in tasks}
+    chain_of, _ = callback_chains(chains)
+    chain_of_task = dict(zip(priority, chain_of))
+
+    score = 0.0
+    worst_chain = None
+    for task_id, _, _, _, _, wcrt in rta:
+        ratio = wcrt / period_of[task_id]
+        if ratio > score:
+            score = ratio
+            worst_chain = chain_of_task[task_id]
+
+    return (priority, result["schedulable"] == 1, score, worst_chain)
+
+def neighbours(priority, chains, focus_chains, rng, max_neighbours):
+    '''
+    Swap neighbourhood of an ordering: a callback of one of the focus chains trades
+    priorities with a higher-priority callback of another chain. Timers only swap with
+    timers and subscriptions only with subscriptions, so the timers keep priorities
+    1..nrof_chains and the chains keep their precedence structure.
+    '''
+    chain_of, is_timer = callback_chains(chains)
+    candidates = []
+
+    for i in range(len(priority)):
+        if chain_of[i] not in focus_chains:
+            continue
+        for j in range(len(priority)):
+            if chain_of[j] == chain_of[i] or is_timer[j] != is_timer[i]:
+                continue
+            if priority[j] < priority[i]:
+                candidate = list(priority)
+                candidate[i], candidate[j] = candidate[j], candidate[i]
+                candidates.append(tuple(candidate))
+
+    candidates = list(dict.fromkeys(candidates))
+    rng.shuffle(candidates)
+    return candidates[:max_neighbours]
+
+def search_priorities(chains, m, bcet_fraction=1.0, priority=None, max_iterations=50,
+                      max_neighbours=32, workers=4, nptest=None, workdir=None, seed=None):
+    '''
+    Searches for a priority ordering of the callbacks that makes the task set schedulable.
+
+    Audsley's algorithm does not apply directly, since the SAG test is not OPA-compatible,
+    so this is a steepest-descent local search over the swap neighbourhood:
+    - The Jiang et al. bound (Theorem 1) does not depend on the priorities. If it already
+      deems the task set schedulable, a single SAG run confirms the starting ordering.
+      Otherwise, the moves are restricted to the chains that Jiang or the last SAG run
+      flag as the ones at risk of missing their deadline.
+    - Every ordering is analysed with nptest at most once (memoisation), and the
+      neighbours of an iteration are analysed in parallel.
+
+    Returns a dictionary with the best priority ordering found, its verdict, its score
+    (largest WCRT / period ratio), the number of SAG runs and the iteration count.
+    '''
+    rng = random.Random(seed)
+    if workdir is not None:
+        os.makedirs(workdir, exist_ok=True)
+    memo = {}
+
+    _, response_times = jiang_on_tasksets([chains_to_jiang(chains)], m)
+    jiang_unsafe = {chain for (_, chain, R, D) in response_times if R > D}
+
+    current = tuple(priority or initial_priorities(chains))
+
+    with tempfile.TemporaryDirectory(dir=workdir, prefix="priority_search_") as tmp, \
+         ProcessPoolExecutor(max_workers=workers) as executor:
+        def analyse(orderings):
+            todo = [p for p in orderings if p not in memo]
+            jobs = [(chains, p, m, bcet_fraction, tmp, nptest) for p in todo]
+            for p, schedulable, score, worst_chain in executor.map(evaluate_priorities, jobs):
+                memo[tuple(p)] = (schedulable, score, worst_chain)
+            return [(p, *memo[p]) for p in orderings]
+
+        best = analyse([current])[0]
+        iteration = 0
+
+        while not best[1] and iteration < max_iterations:
+            iteration += 1
+            focus_chains = set(jiang_unsafe)
+            if best[3] is not None:
+                focus_chains.add(best[3])
+
+            candidates = [c for c in neighbours(best[0], chains, focus_chains, rng, max_neighbours)
+                          if c not in memo]
+            if not candidates:
+                break # Local optimum: every neighbour has been analysed already.
+
+            results = analyse(candidates)
+            challenger = min(results, key=lambda r: (not r[1], r[2]))
+            if (not challenger[1], challenger[2]) >= (not best[1], best[2]):
+                break
+            best = challenger
+
+    return {
+        "priority": list(best[0]),
+        "schedulable": best[1],
+        "score": best[2],
+        "jiang_schedulable": not jiang_unsafe,
+        "evaluations": len(memo),
+        "iterations": iteration,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Search a schedulable callback priority ordering for task sets in the format used by PWA_CD.m."
+    )
+    parser.add_argument("input", help="Task-set text file (tasksets_*.txt)")
+    parser.add_argument("--index", type=int, default=None, help="Only search task set number INDEX (starting from 0)")
+    parser.add_argument("-m", type=int, default=4, help="Number of executor-threads (default: 4)")
+    parser.add_argument("--bcet", type=float, default=1.0, help="BCET as a fraction of the WCET (default: 1.0)")
+    parser.add_argument("--iterations", type=int, default=50, help="Maximum number of search iterations (default: 50)")
+    parser.add_argument("--neighbours", type=int, default=32, help="Maximum number of neighbours per iteration (default: 32)")
+    parser.add_argument("--workers", type=int, default=6, help="Number of parallel nptest processes (default: 6)")
+    parser.add_argument("--nptest", default=None, help="Path to the nptest binary")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for the neighbour sampling")
+    parser.add_argument("--output", default="", help="Folder for the CSVs of the best orderings (default: current folder)")
+    args = parser.parse_args()
+
+    tasksets = convert_file_to_tasksets_odd_chains(args.input)
+    indices = range(len(tasksets)) if args.index is None else [args.index]
+
+    for idx in indices:
+        ts, chain_lengths = tasksets[idx]
+        chains = split_chains(ts, chain_lengths)
+        result = search_priorities(chains, args.m, args.bcet, max_iterations=args.iterations,
+                                   max_neighbours=args.neighbours, workers=args.workers,
+                                   nptest=args.nptest, seed=args.seed)
+
+        print(f"Task set {idx}: schedulable={int(result['schedulable'])}, score={result['score']:.3f}, "
+              f"SAG runs={result['evaluations']}, priority={result['priority']}")
+
+        tasks = chains_to_tasks(chains, result["priority"])
+        write_task_set_csvs(tasks, os.path.join(args.output, f"task_set_{idx}.csv"),
+                            os.path.join(args.output, f"pred_{idx}.csv"), args.bcet)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+'''
+Opt-in instrumentation of the experiment pipeline.
+
+Profiling is enabled by setting the SAG_PROFILE environment variable to the path of the
+trace to produce, e.g. SAG_PROFILE=trace.json python run_on_folder.py ...
+Every process (including the workers of a process pool) then records its spans and
+counters in SAG_PROFILE.<pid>.jsonl. Afterwards,
+
+    python profiling.py trace.json
+
+merges them into trace.json (Chrome trace format, open it in chrome://tracing or
+https://ui.perfetto.dev) and prints a summary table with the wall and CPU time per stage.
+When SAG_PROFILE is not set, span() and count() do nothing.
+'''
+import os
+import sys
+import glob
+import json
+import time
+import atexit
+import argparse
+import threading
+from contextlib import contextmanager
+
+TRACE = os.environ.get("SAG_PROFILE")
+if TRACE is not None:
+    TRACE = os.path.abspath(TRACE)
+
+_events = []
+_depth = threading.local()
+
+def enabled():
+    return TRACE is not None
+
+def _flush():
+    global _events
+    if not _events:
+        return
+    with open(f"{TRACE}.{os.getpid()}.jsonl", "a") as f:
+        for event in _events:
+            f.write(json.dumps(event) + "\n")
+    _events = []
+
+if TRACE is not None:
+    atexit.register(_flush)
+
+@contextmanager
+def _span(name, cat, args):
+    depth = getattr(_depth, "value", 0)
+    _depth.value = depth + 1
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    try:
+        yield
+    finally:
+        _depth.value = depth
+        _events.append({
+            "name": name, "cat": cat, "ph": "X", "pid": os.getpid(), "tid": threading.get_ident(),
+            "ts": wall * 1e6, "dur": (time.perf_counter() - wall) * 1e6,
+            "args": {"cpu_us": (time.process_time() - cpu) * 1e6, **args},
+        })
+        # Pool workers do not run atexit handlers, so flush after every outermost span.
+        if depth == 0:
+            _flush()
+
+@contextmanager
+def _nothing():
+    yield
+
+def span(name, cat="pipeline", **args):
+    '''
+    Context manager that records the wall and CPU time of a pipeline stage.
+    '''
+    if TRACE is None:
+        return _nothing()
+    return _span(name, cat, args)
+
+def count(name, value=1, cat="pipeline"):
+    '''
+    Adds value to the counter name, e.g. retries or bytes written.
+    '''
+    if TRACE is None:
+        return
+    _events.append({"name": name, "cat": cat, "ph": "C", "pid": os.getpid(), "tid": threading.get_ident(),
+                    "ts": time.perf_counter() * 1e6, "args": {"value": value}})
+    if getattr(_depth, "value", 0) == 0:
+        _flush()
+
+def load_events(trace):
+    events = []
+    for part in sorted(glob.glob(f"{glob.escape(trace)}.*.jsonl")):
+        with open(part) as f:
+            events.extend(json.loads(line) for line in f if line.strip())
+    return events
+
+def summary(events):
+    '''
+    Per span name: number of calls, total wall time and total CPU time (seconds).
+    Per counter name: number of updates and total value.
+    '''
+    spans = {}
+    counters = {}
+    for event in events:
+        if event["ph"] == "X":
+            s = spans.setdefault(event["name"], {"calls": 0, "wall": 0.0, "cpu": 0.0})
+            s["calls"] += 1
+            s["wall"] += event["dur"] / 1e6
+            s["cpu"] += event["args"]["cpu_us"] / 1e6
+        elif event["ph"] == "C":
+            c = counters.setdefault(event["name"], {"updates": 0, "total": 0})
+            c["updates"] += 1
+            c["total"] += event["args"]["value"]
+    return spans, counters
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge the per-process profiling files and print a summary.")
+    parser.add_argument("trace", help="Value of SAG_PROFILE used for the run, e.g. trace.json")
+    parser.add_argument("--keep", action="store_true", help="Keep the per-process .jsonl files")
+    args = parser.parse_args()
+
+    events = load_events(args.trace)
+    if not events:
+        print(f"No profiling data found for {args.trace}")
+        sys.exit(1)
+
+    spans, counters = summary(events)
+
+    # Chrome traces counters as time series, so accumulate their values.
+    totals = {}
+    for event in sorted(events, key=lambda e: e["ts"]):
+        if event["ph"] == "C":
+            key = (event["pid"], event["name"])
+            totals[key] = totals.get(key, 0) + event["args"]["value"]
+            event["args"] = {"value": totals[key]}
+
+    with open(args.trace, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    print(f"{'stage':32s} {'calls':>8s} {'wall (s)':>10s} {'cpu (s)':>10s} {'mean (ms)':>10s}")
+    for name, s in sorted(spans.items(), key=lambda item: -item[1]["wall"]):
+        print(f"{name:32s} {s['calls']:8d} {s['wall']:10.3f} {s['cpu']:10.3f} {s['wall'] / s['calls'] * 1e3:10.3f}")
+    if counters:
+        print()
+        print(f"{'counter':32s} {'updates':>8s} {'total':>14s}")
+        for name, c in sorted(counters.items()):
+            print(f"{name:32s} {c['updates']:8d} {c['total']:14}")
+
+    if not args.keep:
+        for part in glob.glob(f"{glob.escape(args.trace)}.*.jsonl"):
+            os.remove(part)
+
+if __name__ == "__main__":
+    main()
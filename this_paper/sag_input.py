@@ -0,0 +1,325 @@
+import os
+import csv
+import math
+import random
+
+from profiling import span, count
+
+JOBS_HEADER = ["Task ID","Job ID","Arrival min","Arrival max","Cost min","Cost max","Deadline","Priority"]
+PRED_HEADER = ["PredTaskID", "PredJobID", "SuccTaskID", "SuccJobID"]
+TASKS_HEADER = ["Task ID", "Period", "BCET", "WCET", "Pred"]
+
+def lcm(numbers):
+    result = numbers[0]
+    for num in numbers[1:]:
+        result = math.lcm(result, num)
+    return result
+
+def split_chains(ts, chain_lengths):
+    '''
+    Splits a flat task set as returned by convert_file_to_tasksets_odd_chains(),
+    i.e. [T1, C11, C12, ..., T2, C21, ...], into a list of (period, [wcets]) chains.
+    '''
+    chains = []
+    idx = 0
+    for chain_length in chain_lengths:
+        chains.append((ts[idx], ts[idx + 1:idx + 1 + chain_length]))
+        idx += chain_length + 1
+    return chains
+
+def chains_to_tasks(chains, priority):
+    '''
+    Builds the (priority, wcet, pred, period) task tuples used by the CSV generators.
+
+    priority holds one value per callback, in chain order, and the task ID of a callback
+    is its priority. The first callback of a chain is its timer (pred = 0), every other
+    callback is triggered by the previous callback of the same chain.
+    '''
+    tasks = []
+    idx = 0
+    for period, wcets in chains:
+        for k, wcet in enumerate(wcets):
+            pred = priority[idx - 1] if k > 0 else 0
+            tasks.append((priority[idx], wcet, pred, period))
+            idx += 1
+    return tasks
+
+def random_priorities(chains, rng=random):
+    '''
+    Random priorities per callback in chain order, as in generate_csv_n_task_sets():
+    the timers get a permutation of 1..nrof_chains, the subscriptions a permutation of the rest.
+    '''
+    nrof_chains = len(chains)
+    nrof_tasks = sum(len(wcets) for _, wcets in chains)
+    timer_priorities = rng.sample(range(1, nrof_chains + 1), nrof_chains)
+    subs_priorities = rng.sample(range(nrof_chains + 1, nrof_tasks + 1), nrof_tasks - nrof_chains)
+
+    priority = []
+    for c, (_, wcets) in enumerate(chains):
+        priority.append(timer_priorities[c])
+        for _ in wcets[1:]:
+            priority.append(subs_priorities.pop())
+    return priority
+
+def chain_priorities(tasks, chains):
+    '''
+    The inverse of chains_to_tasks(): the priority per callback in chain order of chain-shaped
+    (priority, wcet, pred, period, ...) task tuples, e.g. as read by tasks_from_job_csvs(), whose chains
+    are the (period, [wcets]) chains. The task chains are matched to chains by period and WCETs.
+    Raises ValueError if they are not the same task set.
+    '''
+    successor = {}
+    for task in tasks:
+        for p in predecessors(task[2]):
+            successor[p] = task
+
+    by_chain = {} # (period, wcets) -> [priorities of every task chain with them]
+    for timer in tasks:
+        if predecessors(timer[2]):
+            continue
+        priority = []
+        wcets = []
+        task = timer
+        while task is not None:
+            priority.append(task[0])
+            wcets.append(task[1])
+            task = successor.get(task[0])
+        by_chain.setdefault((timer[3], tuple(wcets)), []).append(priority)
+
+    result = []
+    for period, wcets in chains:
+        matches = by_chain.get((period, tuple(wcets)))
+        if not matches:
+            raise ValueError(f"No chain with period {period} and WCETs {list(wcets)} in the tasks")
+        result.extend(matches.pop(0))
+    if len(result) != len(tasks):
+        raise ValueError(f"The tasks have {len(tasks)} callbacks, the chains {len(result)}")
+    return result
+
+def with_bcets(tasks, bcet_fraction=1.0):
+    '''
+    Extends (priority, wcet, pred, period) task tuples with the BCET, which is
+    bcet_fraction * WCET, but at least 1.
+    '''
+    return [(priority, wcet, pred, period, wcet if bcet_fraction == 1.0 else max(1, int(wcet * bcet_fraction)))
+            for priority, wcet, pred, period in tasks]
+
+def predecessors(pred):
+    '''
+    The predecessor priorities of a task: pred is 0 for timers, the priority of the predecessor,
+    or a tuple of priorities for callbacks that join several predecessors (see dag_tasks.py).
+    '''
+    if isinstance(pred, tuple):
+        return pred
+    return (pred,) if pred > 0 else ()
+
+def _job_layout(tasks, hyperperiods=1):
+    '''
+    Tasks in priority order, the hyperperiod and the first job ID of every task when
+    each task's jobs over hyperperiods hyperperiods are numbered consecutively.
+    '''
+    tasks_by_p = sorted(tasks, key=lambda t: t[0])
+    hyperperiod = lcm([t[3] for t in tasks_by_p])
+
+    # First job ID of every task, so that precedence edges can point to the predecessor's jobs.
+    first_job = {}
+    job_id = 1
+    for task in tasks_by_p:
+        first_job[task[0]] = job_id
+        job_id += hyperperiods * hyperperiod // task[3]
+
+    return tasks_by_p, hyperperiod, first_job
+
+def iter_windows(tasks, hyperperiods=1):
+    '''
+    Expands (priority, wcet, pred, period, bcet) task tuples lazily, one hyperperiod window at a time.
+    Yields (window, job rows, precedence rows) for window = 0..hyperperiods-1, with rows as in
+    JOBS_HEADER and PRED_HEADER. Jobs are numbered per task in priority order over all windows,
+    which is also the job priority; with hyperperiods=1 this is the numbering of write_task_set_csvs().
+    '''
+    tasks_by_p, hyperperiod, first_job = _job_layout(tasks, hyperperiods)
+
+    for window in range(hyperperiods):
+        jobs = []
+        precedences = []
+        for task_priority, wcet, pred, task_period, bcet in tasks_by_p:
+            nrof_jobs_of_task = hyperperiod // task_period
+            for j in range(window * nrof_jobs_of_task, (window + 1) * nrof_jobs_of_task):
+                job_id = first_job[task_priority] + j
+                r_min = j * task_period
+                jobs.append([task_priority, job_id, r_min, r_min, bcet, wcet, r_min + task_period, job_id])
+                for p in predecessors(pred): # Timers have no predecessor
+                    precedences.append([p, first_job[p] + j, task_priority, job_id])
+        yield window, jobs, precedences
+
+def iter_jobs(tasks):
+    '''
+    Job rows of one hyperperiod in the order of the job CSV, generated one at a time.
+    '''
+    tasks_by_p, hyperperiod, first_job = _job_layout(tasks)
+    for task_priority, wcet, _, task_period, bcet in tasks_by_p:
+        for j in range(hyperperiod // task_period):
+            job_id = first_job[task_priority] + j
+            r_min = j * task_period
+            yield [task_priority, job_id, r_min, r_min, bcet, wcet, r_min + task_period, job_id]
+
+def iter_precedences(tasks):
+    '''
+    Precedence rows of one hyperperiod in the order of the precedence CSV, generated one at a time.
+    '''
+    tasks_by_p, hyperperiod, first_job = _job_layout(tasks)
+    for task_priority, _, pred, task_period, _ in tasks_by_p:
+        preds = predecessors(pred)
+        for j in range(hyperperiod // task_period):
+            for p in preds:
+                yield [p, first_job[p] + j, task_priority, first_job[task_priority] + j]
+
+def chunked(rows, size):
+    '''
+    Groups the rows of a generator such as iter_jobs() into lists of at most size rows.
+    '''
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def write_tasks_file(tasks, tasks_csv_name):
+    '''
+    Writes the task-level description of a task set, i.e. one row per
+    (priority, wcet, pred, period, bcet) task tuple, from which the job and
+    precedence CSVs can be expanded with expand_tasks_file(). Several predecessors
+    are written space-separated in the Pred column.
+    '''
+    with open(tasks_csv_name, "+w", newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(TASKS_HEADER)
+        for task_priority, wcet, pred, task_period, bcet in sorted(tasks, key=lambda t: t[0]):
+            writer.writerow([task_priority, task_period, bcet, wcet,
+                             " ".join(str(p) for p in pred) if isinstance(pred, tuple) else pred])
+
+def read_tasks_file(tasks_csv_name):
+    '''
+    Reads a file written by write_tasks_file() into (priority, wcet, pred, period, bcet) tuples.
+    '''
+    tasks = []
+    with open(tasks_csv_name, newline='') as f:
+        reader = csv.reader(f)
+        next(reader)  # Skip the header.
+        for row in reader:
+            task_priority, task_period, bcet, wcet = (int(x) for x in row[:4])
+            preds = tuple(int(x) for x in row[4].split())
+            pred = preds[0] if len(preds) == 1 else (preds or 0)
+            tasks.append((task_priority, wcet, pred, task_period, bcet))
+    return tasks
+
+def tasks_from_job_csvs(jobs_csv_name, pred_csv_name):
+    '''
+    Recovers the (priority, wcet, pred, period, bcet) task tuples of a job CSV and precedence CSV
+    written by write_task_set_csvs(), i.e. for task sets without a tasks_x.csv.
+    Raises ValueError if the jobs of a task are not periodic with implicit deadlines and fixed costs.
+    '''
+    first = {} # task ID -> (job ID, arrival, bcet, wcet, deadline) of its first job
+    periods = {}
+    with open(jobs_csv_name, newline='') as f:
+        reader = csv.reader(f, skipinitialspace=True)
+        next(reader)  # Skip the header.
+        for row in reader:
+            if len(row) < 8:
+                continue
+            task_id, job_id, a_min, a_max, bcet, wcet, deadline = (int(x) for x in row[:7])
+            if a_min != a_max:
+                raise ValueError(f"{jobs_csv_name}: job {job_id} has release jitter")
+            if task_id not in first:
+                first[task_id] = (job_id, a_min, bcet, wcet, deadline)
+                periods[task_id] = deadline - a_min
+            elif (bcet, wcet) != first[task_id][2:4] or \
+                    a_min != first[task_id][1] + (job_id - first[task_id][0]) * periods[task_id] or \
+                    deadline - a_min != periods[task_id]:
+                raise ValueError(f"{jobs_csv_name}: the jobs of task {task_id} are not periodic")
+
+    preds = {task_id: set() for task_id in first}
+    with open(pred_csv_name, newline='') as f:
+        reader = csv.reader(f, skipinitialspace=True)
+        next(reader)  # Skip the header.
+        for row in reader:
+            if len(row) >= 4:
+                preds[int(row[2])].add(int(row[0]))
+
+    tasks = []
+    for task_id in sorted(first):
+        p = tuple(sorted(preds[task_id]))
+        pred = p[0] if len(p) == 1 else (p or 0)
+        tasks.append((task_id, first[task_id][3], pred, periods[task_id], first[task_id][2]))
+    return tasks
+
+def write_job_csvs(tasks, jobs_csv_name, pred_csv_name):
+    '''
+    Writes the job CSV and the precedence CSV of (priority, wcet, pred, period, bcet) task tuples,
+    i.e. with the BCET of every task given, as read_tasks_file() returns them. Returns the number of jobs.
+    '''
+    with span("sag_input.csv_write", cat="converter"), \
+         open(jobs_csv_name, "+w", newline='') as f, open(pred_csv_name, "+w", newline='') as g:
+        writer = csv.writer(f)
+        writer2 = csv.writer(g)
+        writer.writerow(JOBS_HEADER)
+        writer2.writerow(PRED_HEADER)
+
+        nrof_jobs = 0
+        for rows in chunked(iter_jobs(tasks), 4096):
+            writer.writerows(rows)
+            nrof_jobs += len(rows)
+        for rows in chunked(iter_precedences(tasks), 4096):
+            writer2.writerows(rows)
+
+        count("sag_input.bytes_written", f.tell() + g.tell(), cat="converter")
+
+    return nrof_jobs
+
+def write_task_set_csvs(tasks, jobs_csv_name, pred_csv_name, bcet_fraction=1.0):
+    '''
+    Writes the job CSV and the precedence CSV of a task set for the SAG framework.
+
+    tasks is a list of (priority, wcet, pred, period) tuples, where the priorities are
+    1..len(tasks) and pred is the priority (= task ID) of the predecessor, or 0 for timers.
+    Jobs are numbered in priority order over one hyperperiod, which is also the job priority.
+    The BCET of a task is bcet_fraction * WCET, but at least 1.
+    '''
+    return write_job_csvs(with_bcets(tasks, bcet_fraction), jobs_csv_name, pred_csv_name)
+
+def expand_tasks_file(tasks_csv_name, jobs_csv_name, pred_csv_name):
+    '''
+    Materialises the job CSV and the precedence CSV of a task-level description.
+    Returns the number of jobs.
+    '''
+    return write_job_csvs(read_tasks_file(tasks_csv_name), jobs_csv_name, pred_csv_name)
+
+def expand_folder(folder):
+    '''
+    Writes task_set_x.csv and pred_x.csv next to every tasks_x.csv below folder
+    that has not been expanded yet. Returns the number of expanded task sets.
+    '''
+    expanded = 0
+    for root, dirs, files in os.walk(folder):
+        dirs.sort()
+        for file in sorted(files):
+            if not (file.startswith("tasks_") and file.endswith(".csv")):
+                continue
+            identifier = file[len("tasks_"):-len(".csv")]
+            jobs_csv_name = os.path.join(root, f"task_set_{identifier}.csv")
+            pred_csv_name = os.path.join(root, f"pred_{identifier}.csv")
+            if os.path.exists(jobs_csv_name) and os.path.exists(pred_csv_name):
+                continue
+            expand_tasks_file(os.path.join(root, file), jobs_csv_name, pred_csv_name)
+            expanded += 1
+    return expanded
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Expand task-level descriptions (tasks_x.csv) to job and precedence CSVs.")
+    parser.add_argument("folder", help="Folder searched recursively for tasks_x.csv files")
+    args = parser.parse_args()
+    print(f"Expanded {expand_folder(args.folder)} task sets")
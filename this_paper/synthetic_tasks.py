@@ -3,7 +3,14 @@ import random
 import math
 import csv
 import os
+import sys
 import numpy as np
+from profiling import span, count, enabled
+from task_set_index import task_set_record, write_index
+from sag_input import write_tasks_file
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "sag_scripts"))
+from validate_csvs import check_pair
 
 def snap_period(period_ns):
     """
@@ -28,8 +35,8 @@ def snap_period(period_ns):
     # Convert back to nanoseconds.
     return int(snapped_ms * 1e6)
 
-def random_permutation(a, b):
-    return random.sample(range(a, b + 1), b - a + 1)
+def random_permutation(a, b, rng=random):
+    return rng.sample(range(a, b + 1), b - a + 1)
 
 def lcm(numbers):
     result = numbers[0]
@@ -66,17 +73,20 @@ def generate_task_set(U, k, chain_length_range):
     Returns:
       A list of chains, where each chain is a list of tasks (dictionaries).
     """
-    chain_utils = drs(n = k, sumu = U) # Partition overall utilization among k chains using drs
+    with span("generator.drs", cat="generator"):
+        chain_utils = drs(n = k, sumu = U) # Partition overall utilization among k chains using drs
     
     task_set = []
     
     # Iterate over chains
     for i in range(k):
         L = random.randint(chain_length_range[0], chain_length_range[1]) # Choose the number of tasks for chain i randomly within the provided range.
-        T = snap_period(period_distribution()) # Generate a period for the first (periodic) task in this chain.
+        with span("generator.period", cat="generator"):
+            T = snap_period(period_distribution()) # Generate a period for the first (periodic) task in this chain.
         total_exec = chain_utils[i] * T # Compute the total execution time required for chain i
         total_exec = int(round(total_exec)) # Convert to int nanoseconds
-        task_execs = drs(n = L, sumu = total_exec) # Partition total_exec among L tasks using drs.
+        with span("generator.drs", cat="generator"):
+            task_execs = drs(n = L, sumu = total_exec) # Partition total_exec among L tasks using drs.
         task_execs = [int(round(x)) for x in task_execs]
         discrepancy = total_exec - sum(task_execs)
         task_execs[0] += discrepancy 
@@ -102,6 +112,7 @@ def generate_n_task_sets(nrof_sets: int, U: float, nrof_chains: int, nrof_callba
         nrof_jobs = sum([(hyperperiod // period )* chain_length for period in periods])
 
         while nrof_jobs < nrof_jobs_interval[0] or nrof_jobs > nrof_jobs_interval[1]:
+            count("generator.retries", cat="generator")
             synthetic_task_set = generate_task_set(U, nrof_chains, (chain_length, chain_length))
             periods = [synthetic_task_set[i] for i in range(0, len(synthetic_task_set), nrof_callbacks_per_chain + 1)]
             hyperperiod = lcm(periods)
@@ -117,7 +128,7 @@ def generate_n_task_sets(nrof_sets: int, U: float, nrof_chains: int, nrof_callba
     return task_sets
 
 
-def generate_csv_n_task_sets(nrof_task_sets: int, U: float, nrof_chains: int, nrof_callbacks_per_chain: int, path = ""):
+def generate_csv_n_task_sets(nrof_task_sets: int, U: float, nrof_chains: int, nrof_callbacks_per_chain: int, path = "", compact = False, validate = False):
     '''
     Generates CSVs that can be processed by the SAG framework for tasks with the following specifications:
     - The generated tasks that are used to generate jobs reflect ROS callback chains
@@ -132,12 +143,16 @@ def generate_csv_n_task_sets(nrof_task_sets: int, U: float, nrof_chains: int, nr
     There are 2 CSVs per task set:
     - A CSV with all jobs, and their timing and priority parameters
     - A CSV with the precedence constraints between jobs
+    With compact=True, only the tasks are written (tasks_x.csv, see sag_input.py).
+    With validate=True, every written pair is checked with validate_csvs.py (ValueError if invalid).
     '''
     # nrof_chains also corresponds to the number of timers, since there is 1 timer per chain
 
     nrof_tasks = nrof_chains * nrof_callbacks_per_chain
     task_set_idx = 1
-    task_sets = generate_n_task_sets(nrof_task_sets, U, nrof_chains, nrof_callbacks_per_chain)
+    index = []
+    with span("generator.generate_n_task_sets", cat="generator"):
+        task_sets = generate_n_task_sets(nrof_task_sets, U, nrof_chains, nrof_callbacks_per_chain)
 
     for task_set in task_sets:
         periods = [task_set[i] for i in range(0, len(task_set), nrof_callbacks_per_chain + 1)]
@@ -147,8 +162,10 @@ def generate_csv_n_task_sets(nrof_task_sets: int, U: float, nrof_chains: int, nr
         periods_extended = [period for i in range(len(periods)) for period in [periods[i]] * nrof_callbacks_per_chain]
         wcets = [task_set[i] for i in range(0, len(task_set)) if i % (nrof_callbacks_per_chain + 1) != 0]
         priority = [0 for i in range(nrof_tasks)]
-        timer_priorities = random_permutation(1, nrof_chains)
-        subs_prorities = random_permutation(nrof_chains + 1, nrof_tasks)
+        seed = random.randrange(2**32) # Seed of the priority assignment, stored in the index
+        rng = random.Random(seed)
+        timer_priorities = random_permutation(1, nrof_chains, rng)
+        subs_prorities = random_permutation(nrof_chains + 1, nrof_tasks, rng)
 
         timer_index= 0
         subs_index = 0
@@ -170,11 +187,17 @@ def generate_csv_n_task_sets(nrof_task_sets: int, U: float, nrof_chains: int, nr
         tasks = list(zip(priority, wcets, pred, periods_extended))
         # print(tasks)
         tasks_by_p = sorted(tasks, key=lambda t: t[0])
+        index.append(task_set_record(task_set_idx, tasks_by_p, hyperperiod, 1.0, seed))
+
+        if compact:
+            write_tasks_file([(*task, task[1]) for task in tasks_by_p], os.path.join(path, f"tasks_{task_set_idx}.csv"))
+            task_set_idx +=1
+            continue
 
         jobs_csv_name = os.path.join(path, f"task_set_{task_set_idx}.csv")
         pred_csv_name = os.path.join(path, f"pred_{task_set_idx}.csv")
         
-        with open(jobs_csv_name, "+w", newline='') as f, open(pred_csv_name, "+w", newline='') as g:
+        with span("generator.csv_write", cat="generator"), open(jobs_csv_name, "+w", newline='') as f, open(pred_csv_name, "+w", newline='') as g:
             writer = csv.writer(f)
             writer2 = csv.writer(g)
             first_row = ["Task ID","Job ID","Arrival min","Arrival max","Cost min","Cost max","Deadline","Priority"]
@@ -214,8 +237,15 @@ def generate_csv_n_task_sets(nrof_task_sets: int, U: float, nrof_chains: int, nr
                     # print(f"Task id: {task_priority}, job id: {job_id}, ri_min: {r_min}, ri_max: {r_max}, Ci_min: {bcet}, Ci_max: {wcet}, p: {job_id}")
                     job_id += 1
 
+        if enabled():
+            count("generator.bytes_written", os.path.getsize(jobs_csv_name) + os.path.getsize(pred_csv_name), cat="generator")
+        if validate:
+            with span("generator.validate", cat="generator"):
+                check_pair(jobs_csv_name, pred_csv_name)
         task_set_idx +=1
 
+    write_index(path, index)
+
 def sobhaniFig9(path):
     '''
     Generates synthetic task sets that are used for Figure 9 of the paper:
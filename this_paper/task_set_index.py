@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+'''
+Index of the task sets in a folder of generated job/precedence CSVs.
+
+The generate_csv_n_task_sets*() functions write an index.csv next to the task_set_x.csv
+files with one row of features per task set, so that subsets can be selected without
+reading the job CSVs, e.g.
+
+    python task_set_index.py SAG_input_SobhaniFig9 "jobs>3000" "U>2" > rerun.txt
+    python ../sag_scripts/run_on_folder.py --files rerun.txt
+'''
+import os
+import csv
+import argparse
+
+from sag_input import predecessors
+
+INDEX_NAME = "index.csv"
+
+# Column name and type of every index field.
+FIELDS = [("task_set", str), ("U", float), ("chains", int), ("chain_lengths", str), ("hyperperiod", int),
+          ("jobs", int), ("min_period", int), ("max_period", int), ("bcet_ratio", float), ("priority_seed", int)]
+
+OPERATORS = {
+    ">=": lambda a, b: a >= b,
+    "<=": lambda a, b: a <= b,
+    "!=": lambda a, b: a != b,
+    "==": lambda a, b: a == b,
+    ">": lambda a, b: a > b,
+    "<": lambda a, b: a < b,
+    "=": lambda a, b: a == b,
+}
+
+def task_set_record(identifier, tasks, hyperperiod, bcet_ratio, priority_seed):
+    '''
+    Index row of one task set, given its (priority, wcet, pred, period) task tuples.
+    priority_seed is the seed of the random.Random that drew the priorities. It does not
+    reproduce the task set itself, which comes from the input file or the global random
+    state, except for dag_tasks.py, where the same seed draws the whole task set.
+    For DAG-shaped task sets, chains is the number of timers and the chain length
+    of a timer is the longest path (in callbacks) that starts at it.
+    '''
+    successors = {}
+    for priority, _, pred, _ in tasks:
+        for p in predecessors(pred):
+            successors.setdefault(p, []).append(priority)
+
+    longest = {}
+    def longest_path(priority):
+        # Iterative post-order, so that deep DAGs do not hit the recursion limit.
+        stack = [priority]
+        while stack:
+            top = stack[-1]
+            pending = [s for s in successors.get(top, []) if s not in longest]
+            if pending:
+                stack.extend(pending)
+                continue
+            stack.pop()
+            longest[top] = 1 + max((longest[s] for s in successors.get(top, [])), default=0)
+        return longest[priority]
+
+    chain_lengths = [longest_path(priority) for priority, _, pred, _ in tasks if not predecessors(pred)]
+
+    periods = [period for _, _, _, period in tasks]
+    return {
+        "task_set": identifier,
+        "U": sum(wcet / period for _, wcet, _, period in tasks),
+        "chains": len(chain_lengths),
+        "chain_lengths": " ".join(str(length) for length in chain_lengths),
+        "hyperperiod": hyperperiod,
+        "jobs": sum(hyperperiod // period for period in periods),
+        "min_period": min(periods),
+        "max_period": max(periods),
+        "bcet_ratio": bcet_ratio,
+        "priority_seed": priority_seed,
+    }
+
+def write_index(folder, records):
+    '''
+    (Over)writes the index.csv of folder.
+    '''
+    with open(os.path.join(folder, INDEX_NAME), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow([name for name, _ in FIELDS])
+        for record in records:
+            writer.writerow([record[name] for name, _ in FIELDS])
+
+def load_index(folder):
+    '''
+    Reads all index.csv files below folder. Every record also gets the paths
+    of its task_file and pred_file.
+    '''
+    records = []
+    for root, dirs, files in os.walk(folder):
+        dirs.sort()
+        if INDEX_NAME not in files:
+            continue
+        with open(os.path.join(root, INDEX_NAME), newline="") as f:
+            for row in csv.DictReader(f):
+                if "priority_seed" not in row: # Indexes written before the column was renamed
+                    row["priority_seed"] = row["seed"]
+                record = {name: cast(row[name]) for name, cast in FIELDS}
+                record["task_file"] = os.path.join(root, f"task_set_{record['task_set']}.csv")
+                record["pred_file"] = os.path.join(root, f"pred_{record['task_set']}.csv")
+                records.append(record)
+    return records
+
+def parse_condition(condition):
+    '''
+    Parses a condition such as "jobs>3000" or "U<=2.5" into (field, operator, value).
+    '''
+    for op in OPERATORS:
+        if op in condition:
+            name, value = (part.strip() for part in condition.split(op, 1))
+            casts = dict(FIELDS)
+            if name not in casts:
+                raise ValueError(f"Unknown field {name} in {condition}, expected one of {', '.join(casts)}")
+            return name, op, casts[name](value)
+    raise ValueError(f"No operator in condition {condition}")
+
+def query(records, conditions):
+    '''
+    The records that satisfy all conditions (strings as accepted by parse_condition()).
+    '''
+    parsed = [parse_condition(condition) for condition in conditions]
+    return [record for record in records
+            if all(OPERATORS[op](record[name], value) for name, op, value in parsed)]
+
+def read_verdicts(result_file):
+    '''
+    {task file: verdict} of a results file of run_on_folder.py.
+    '''
+    verdicts = {}
+    with open(result_file) as f:
+        for line in f:
+            parts = [p.strip() for p in line.split(",")]
+            if len(parts) >= 2 and parts[1] in ("0", "1"):
+                verdicts[parts[0]] = int(parts[1])
+    return verdicts
+
+def disagreeing(records, result_file_a, result_file_b):
+    '''
+    The records whose task sets got different verdicts in two results files,
+    e.g. of two analyses or two configurations.
+    '''
+    a = read_verdicts(result_file_a)
+    b = read_verdicts(result_file_b)
+    return [record for record in records
+            if record["task_file"] in a and record["task_file"] in b and a[record["task_file"]] != b[record["task_file"]]]
+
+def main():
+    parser = argparse.ArgumentParser(description="Select generated task sets by their features.")
+    parser.add_argument("folder", help="Folder with generated task sets (searched recursively for index.csv)")
+    parser.add_argument("conditions", nargs="*",
+                        help=f"Conditions such as \"jobs>3000\" or \"U<=2\" on {', '.join(name for name, _ in FIELDS)}")
+    parser.add_argument("--disagree", nargs=2, metavar=("RESULTS_A", "RESULTS_B"), default=None,
+                        help="Only task sets with different verdicts in two results files of run_on_folder.py")
+    parser.add_argument("--count", action="store_true", help="Only print the number of matching task sets")
+    args = parser.parse_args()
+
+    records = query(load_index(args.folder), args.conditions)
+    if args.disagree:
+        records = disagreeing(records, *args.disagree)
+
+    if args.count:
+        print(len(records))
+        return
+    for record in records:
+        print(record["task_file"])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+'''
+Random access to the task sets of a task-set text file (tasksets_*.txt, task sets separated
+by "-" lines), which convert_file_to_tasksets*() can only read front to back.
+
+The byte range of every task set is found in one scan of the file and stored next to it
+in <file>.offsets, so that task set i can be read without parsing the others, e.g.
+
+    python taskset_offsets.py tasksets_1.0.txt 734          # print task set 734
+    python taskset_offsets.py tasksets_1.0.txt --parts 8    # index ranges for 8 workers
+
+Task sets are numbered from 0, in the order of the file, as in the task_set_x.csv files of
+generate_csv_n_task_sets_odd_chains() (generate_csv_n_task_sets() numbers them from 1).
+'''
+import os
+import mmap
+import array
+import argparse
+
+from convert_sobhani_to_sag import parse_tasksets, parse_tasksets_odd_chains
+
+OFFSETS_SUFFIX = ".offsets"
+
+# The offsets file starts with the size and modification time of the text file it
+# was built from, followed by the start and end offset of every task set (int64).
+HEADER_ITEMS = 2
+
+def scan_offsets(filename):
+    '''
+    Returns the (start, end) byte range of every task set in filename. The range
+    excludes the "-" line; empty task sets (e.g. two "-" lines in a row) are left out.
+    '''
+    ranges = []
+    with open(filename, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return ranges
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            separator = b"\n-\r\n" if mm.find(b"\r\n", 0, 4096) >= 0 else b"\n-\n"
+            start = 0
+            if mm[:len(separator) - 1] == separator[1:]:
+                start = len(separator) - 1 # The file starts with a "-" line
+            while True:
+                pos = mm.find(separator, start - 1 if start else 0)
+                if pos < 0:
+                    if mm[start:].strip():
+                        ranges.append((start, len(mm))) # Last task set without "-" line
+                    return ranges
+                if mm[start:pos + 1].strip():
+                    ranges.append((start, pos + 1))
+                start = pos + len(separator)
+
+def offsets_file_name(filename):
+    return filename + OFFSETS_SUFFIX
+
+def _stamp(filename):
+    st = os.stat(filename)
+    return [st.st_size, st.st_mtime_ns]
+
+def build_offsets(filename):
+    '''
+    Scans filename and writes its offsets file. Returns the number of task sets.
+    '''
+    ranges = scan_offsets(filename)
+    data = array.array("q", _stamp(filename) + [x for r in ranges for x in r])
+    tmp = offsets_file_name(filename) + ".tmp"
+    with open(tmp, "wb") as f:
+        data.tofile(f)
+    os.replace(tmp, offsets_file_name(filename))
+    return len(ranges)
+
+def _ensure_offsets(filename):
+    '''
+    (Re)builds the offsets file of filename if it is missing or older than filename, e.g. after
+    task sets were appended to it. Returns the number of task sets.
+    '''
+    index_file = offsets_file_name(filename)
+    if os.path.exists(index_file):
+        with open(index_file, "rb") as f:
+            header = array.array("q")
+            header.fromfile(f, HEADER_ITEMS)
+        if list(header) == _stamp(filename):
+            return (os.path.getsize(index_file) // header.itemsize - HEADER_ITEMS) // 2
+    return build_offsets(filename)
+
+def count_task_sets(filename):
+    return _ensure_offsets(filename)
+
+def task_set_range(filename, i):
+    '''
+    The (start, end) byte range of task set i, read from the offsets file without loading it.
+    '''
+    n = _ensure_offsets(filename)
+    if not 0 <= i < n:
+        raise IndexError(f"{filename} has task sets 0..{n - 1}, not {i}")
+    with open(offsets_file_name(filename), "rb") as f:
+        f.seek((HEADER_ITEMS + 2 * i) * 8)
+        r = array.array("q")
+        r.fromfile(f, 2)
+    return r[0], r[1]
+
+def read_task_sets_text(filename, first, last=None):
+    '''
+    The text of task sets first..last (inclusive, default: only first), "-" lines included.
+    '''
+    last = first if last is None else last
+    start, _ = task_set_range(filename, first)
+    _, end = task_set_range(filename, last)
+    with open(filename, "rb") as f:
+        f.seek(start)
+        return f.read(end - start).decode() + "-\n"
+
+def load_task_sets(filename, first, last=None, odd_chains=True):
+    '''
+    Parses task sets first..last (inclusive, default: only first) as
+    convert_file_to_tasksets_odd_chains() (or convert_file_to_tasksets() if not odd_chains).
+    '''
+    lines = read_task_sets_text(filename, first, last).splitlines()
+    return parse_tasksets_odd_chains(lines) if odd_chains else parse_tasksets(lines)
+
+def split_ranges(filename, parts):
+    '''
+    Splits the task sets of filename into at most parts contiguous (first, last) index ranges
+    of about the same number of bytes, e.g. one per parsing worker.
+    '''
+    n = _ensure_offsets(filename)
+    if n == 0:
+        return []
+    with open(offsets_file_name(filename), "rb") as f:
+        data = array.array("q")
+        data.fromfile(f, HEADER_ITEMS + 2 * n)
+    starts = data[HEADER_ITEMS::2]
+    total = data[-1] - starts[0]
+
+    ranges = []
+    first = 0
+    for k in range(1, parts + 1):
+        if first >= n:
+            break
+        target = starts[0] + total * k // parts
+        last = first
+        while last + 1 < n and starts[last + 1] < target:
+            last += 1
+        if k == parts:
+            last = n - 1
+        ranges.append((first, last))
+        first = last + 1
+    return ranges
+
+def main():
+    parser = argparse.ArgumentParser(description="Random access to the task sets of a task-set text file.")
+    parser.add_argument("file", help="Task-set text file, e.g. tasksets_1.0.txt")
+    parser.add_argument("task_sets", type=int, nargs="*", help="Task sets (from 0) to print")
+    parser.add_argument("--parts", type=int, default=None, help="Print index ranges of about equal size for this many workers")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the offsets file")
+    args = parser.parse_args()
+
+    n = build_offsets(args.file) if args.rebuild else count_task_sets(args.file)
+    if not args.task_sets and args.parts is None:
+        print(f"{args.file}: {n} task sets")
+    for i in args.task_sets:
+        print(read_task_sets_text(args.file, i), end="")
+    if args.parts is not None:
+        for first, last in split_ranges(args.file, args.parts):
+            print(f"{first} {last}")
+
+if __name__ == '__main__':
+    main()
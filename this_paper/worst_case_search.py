@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+'''
+Searches for task sets on which an analysis is as slow as possible, e.g. to size timeouts
+or to build a benchmark corpus, instead of finding them by accident in a sweep.
+
+Starting from generated task sets (or from a task-set text file), an evolutionary search
+mutates periods, WCETs, the BCET ratio and the priorities, and keeps the task sets with the
+highest cost: the number of states or the CPU time of nptest, or the number of fixed-point
+iterations of Theorem 1 of Jiang et al. Task sets with more jobs than the job budget, or a
+utilization above m, are discarded. The worst task sets found are written as a corpus:
+
+    python worst_case_search.py corpus -U 2.0 --chains 5 --length 4 --objective states --evaluations 500
+    python worst_case_search.py corpus --input tasksets_1.0.txt --objective jiang_iterations
+'''
+import os
+import sys
+import csv
+import math
+import shlex
+import random
+import hashlib
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "jiang_et_al"))
+sys.path.insert(0, os.path.join(HERE, "..", "sag_scripts"))
+from JRTA import chains_to_jiang, theorem1, fixed_point
+from nptest import run_nptest
+from sag_input import split_chains, chains_to_tasks, random_priorities, with_bcets, write_task_set_csvs, write_tasks_file
+from synthetic_tasks import generate_task_set
+from convert_sobhani_to_sag import convert_file_to_tasksets_odd_chains
+
+# Cost of a task set per objective, from the result of evaluate().
+OBJECTIVES = {
+    "states": lambda r: r["states"],
+    "cpu_time": lambda r: r["cpu_time"],
+    "jiang_iterations": lambda r: r["iterations"],
+}
+
+# Objectives that only depend on the chains: Theorem 1 of Jiang et al. ignores priorities and BCETs,
+# so for these mutate() only moves periods and WCETs and candidates are told apart by their chains.
+CHAINS_ONLY = {"jiang_iterations"}
+
+# Factors by which a period is multiplied; periods stay integers.
+PERIOD_FACTORS = (1 / 2, 2 / 3, 3 / 4, 4 / 3, 3 / 2, 2)
+
+def candidate_key(candidate, objective=None):
+    chains, priority, bcet = candidate
+    key = chains if objective in CHAINS_ONLY else (chains, priority, bcet)
+    return hashlib.sha1(repr(key).encode()).hexdigest()[:16]
+
+def utilization(chains):
+    return sum(sum(wcets) / period for period, wcets in chains)
+
+def nrof_jobs(chains):
+    '''
+    Number of jobs in one hyperperiod, i.e. in the job CSV.
+    '''
+    hyperperiod = math.lcm(*[period for period, _ in chains])
+    return sum(hyperperiod // period * len(wcets) for period, wcets in chains)
+
+def jiang_iterations(chains, m):
+    '''
+    Number of evaluations of the Theorem 1 function by scipy's fixed_point, summed over the chains,
+    with the arguments of jiang_on_tasksets(), which computes the figures. A chain on which
+    fixed_point gives up counts the evaluations until then.
+    '''
+    periods, exec_times, exec_time_last_cb = chains_to_jiang(chains)
+    total = 0
+    for chain in periods:
+        theorem1_L = theorem1(periods, exec_times, exec_time_last_cb, chain, m)
+        calls = [0]
+        def counted(L):
+            calls[0] += 1
+            return theorem1_L(L)
+        try:
+            fixed_point(counted, 0, xtol=10-6)
+        except RuntimeError:
+            pass
+        total += calls[0]
+    return total
+
+def evaluate(job):
+    '''
+    Analyses one candidate (chains, priority, bcet). Executed by the worker pool.
+    Returns a dictionary with the jobs and utilization of the task set and the analysis results,
+    or with "error" set if nptest failed, e.g. because it ran out of memory.
+    '''
+    candidate, m, objective, workdir, nptest, nptest_args = job
+    chains, priority, bcet = candidate
+    result = {"jobs": nrof_jobs(chains), "U": utilization(chains), "error": None}
+
+    if objective == "jiang_iterations":
+        result["iterations"] = jiang_iterations(chains, m)
+        return result
+
+    key = candidate_key(candidate)
+    jobs_csv_name = os.path.join(workdir, f"task_set_{key}.csv")
+    pred_csv_name = os.path.join(workdir, f"pred_{key}.csv")
+    try:
+        write_task_set_csvs(chains_to_tasks(chains, priority), jobs_csv_name, pred_csv_name, bcet)
+        result.update(run_nptest(jobs_csv_name, pred_csv_name, m, nptest, nptest_args))
+    except RuntimeError as e:
+        result["error"] = str(e).splitlines()[0] if str(e) else "nptest failed"
+    finally:
+        for name in (jobs_csv_name, pred_csv_name):
+            if os.path.exists(name):
+                os.remove(name)
+    return result
+
+def cost(result, objective):
+    '''
+    Cost to maximise. Task sets on which nptest failed are the worst of all.
+    '''
+    if result["error"] is not None:
+        return math.inf
+    return OBJECTIVES[objective](result)
+
+def mutate(candidate, m, rng, objective=None):
+    '''
+    A random neighbour of a candidate: one period multiplied by one of PERIOD_FACTORS or copied
+    from another chain, one WCET scaled by 0.5-2, the BCET ratio moved by up to 0.25, or two
+    timers or two subscriptions swapping priorities (as in priority_search.py). For objectives in
+    CHAINS_ONLY, only periods and WCETs are moved. Returns None if the neighbour is not a valid
+    task set, i.e. a chain longer than its period or U > m.
+    '''
+    chains, priority, bcet = candidate
+    chains = [(period, list(wcets)) for period, wcets in chains]
+    priority = list(priority)
+    move = rng.choice(("period", "wcet") if objective in CHAINS_ONLY else ("period", "wcet", "bcet", "priority"))
+
+    if move == "period":
+        c = rng.randrange(len(chains))
+        others = [period for i, (period, _) in enumerate(chains) if i != c]
+        if others and rng.random() < 0.5:
+            period = rng.choice(others)
+        else:
+            period = int(round(chains[c][0] * rng.choice(PERIOD_FACTORS)))
+        chains[c] = (period, chains[c][1])
+    elif move == "wcet":
+        c = rng.randrange(len(chains))
+        k = rng.randrange(len(chains[c][1]))
+        chains[c][1][k] = max(1, int(round(chains[c][1][k] * rng.uniform(0.5, 2))))
+    elif move == "bcet":
+        bcet = round(min(1.0, max(0.05, bcet + rng.uniform(-0.25, 0.25))), 2)
+    else:
+        starts = set()
+        idx = 0
+        for _, wcets in chains:
+            starts.add(idx)
+            idx += len(wcets)
+        timers = sorted(starts)
+        subscriptions = [i for i in range(idx) if i not in starts]
+        group = rng.choice([g for g in (timers, subscriptions) if len(g) > 1] or [timers])
+        if len(group) < 2:
+            return None
+        i, j = rng.sample(group, 2)
+        priority[i], priority[j] = priority[j], priority[i]
+
+    if any(period < max(1, sum(wcets)) for period, wcets in chains) or utilization(chains) > m:
+        return None
+    return ([(period, wcets) for period, wcets in chains], priority, bcet)
+
+def search(seeds, m, objective="states", evaluations=200, population=8, offspring=16, max_jobs=5000,
+           workers=6, nptest=None, nptest_args=(), seed=None, workdir=None):
+    '''
+    (population + offspring) evolutionary search for the candidates of highest cost.
+
+    seeds are (chains, priority, bcet) candidates. Every generation, offspring children are made
+    by applying 1-3 mutate() steps to parents drawn from the population, they are analysed in
+    parallel, and the population becomes the best candidates among parents and children.
+    Every candidate is analysed at most once (see candidate_key()), and at most evaluations times in total.
+    Returns [(cost, candidate, result)] of all analysed candidates, worst first.
+    '''
+    rng = random.Random(seed)
+    seen = {}
+    def key(candidate):
+        return candidate_key(candidate, objective)
+
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp, ProcessPoolExecutor(max_workers=workers) as executor:
+        def analyse(candidates):
+            todo = {}
+            for candidate in candidates:
+                if key(candidate) not in seen and nrof_jobs(candidate[0]) <= max_jobs and len(seen) + len(todo) < evaluations:
+                    todo[key(candidate)] = candidate
+            todo = list(todo.values())
+            jobs = [(candidate, m, objective, tmp, nptest, nptest_args) for candidate in todo]
+            for candidate, result in zip(todo, executor.map(evaluate, jobs)):
+                seen[key(candidate)] = (cost(result, objective), candidate, result)
+                if result["error"] is not None:
+                    print(f"nptest failed on a task set with {result['jobs']} jobs: {result['error']}")
+
+        analyse(seeds)
+        if not seen:
+            print(f"No task set to start from has at most {max_jobs} jobs")
+        current = sorted(seen.values(), key=lambda s: s[0], reverse=True)[:population]
+        generation = 0
+        while current and len(seen) < evaluations:
+            generation += 1
+            children = []
+            for _ in range(offspring * 4): # Invalid or already analysed children are discarded
+                if len(children) == offspring:
+                    break
+                child = rng.choice(current)[1]
+                for _ in range(rng.randint(1, 3)):
+                    child = mutate(child, m, rng, objective) if child is not None else None
+                if child is not None and key(child) not in seen and nrof_jobs(child[0]) <= max_jobs:
+                    children.append(child)
+            if not children:
+                break
+            analyse(children)
+            pool = {key(s[1]): s for s in current}
+            pool.update((key(c), seen[key(c)]) for c in children if key(c) in seen)
+            current = sorted(pool.values(), key=lambda s: s[0], reverse=True)[:population]
+            print(f"Generation {generation}: {len(seen)} analysed, worst {objective} = {current[0][0]}")
+
+    return sorted(seen.values(), key=lambda s: s[0], reverse=True)
+
+def write_corpus(worst, output, objective):
+    '''
+    Writes the task sets in worst as tasks_x.csv, task_set_x.csv and pred_x.csv (x = rank from 1)
+    in output, with their cost (the objective) and analysis results in output/corpus.csv.
+    '''
+    os.makedirs(output, exist_ok=True)
+    columns = ["jobs", "U", "schedulable", "states", "max_width", "cpu_time", "memory", "timeout", "iterations", "error"]
+    with open(os.path.join(output, "corpus.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["rank", "cost", "bcet", *columns])
+        for rank, (score, (chains, priority, bcet), result) in enumerate(worst, start=1):
+            tasks = chains_to_tasks(chains, priority)
+            write_tasks_file(with_bcets(tasks, bcet), os.path.join(output, f"tasks_{rank}.csv"))
+            write_task_set_csvs(tasks, os.path.join(output, f"task_set_{rank}.csv"),
+                                os.path.join(output, f"pred_{rank}.csv"), bcet)
+            writer.writerow([rank, score, bcet, *[result.get(c, "") for c in columns]])
+
+def main():
+    parser = argparse.ArgumentParser(description="Search for the task sets on which an analysis is slowest.")
+    parser.add_argument("output", help="Folder for the corpus of worst task sets")
+    parser.add_argument("--input", default=None,
+                        help="Start from the task sets of this task-set text file instead of generated ones")
+    parser.add_argument("-U", type=float, default=2.0, help="Utilization of the generated task sets (default: 2.0)")
+    parser.add_argument("--chains", type=int, default=5, help="Chains per generated task set (default: 5)")
+    parser.add_argument("--length", type=int, default=4, help="Callbacks per chain of the generated task sets (default: 4)")
+    parser.add_argument("--seeds", type=int, default=8, help="Number of generated task sets to start from (default: 8)")
+    parser.add_argument("-m", type=int, default=4, help="Number of executor-threads (default: 4)")
+    parser.add_argument("--objective", choices=list(OBJECTIVES), default="states", help="Cost to maximise (default: states)")
+    parser.add_argument("--evaluations", type=int, default=200, help="Maximum number of analyses (default: 200)")
+    parser.add_argument("--population", type=int, default=8, help="Task sets kept per generation (default: 8)")
+    parser.add_argument("--offspring", type=int, default=16, help="Task sets analysed per generation (default: 16)")
+    parser.add_argument("--max-jobs", type=int, default=5000, help="Maximum number of jobs per task set (default: 5000)")
+    parser.add_argument("--bcet", type=float, default=1.0, help="Initial BCET as a fraction of the WCET (default: 1.0)")
+    parser.add_argument("--keep", type=int, default=10, help="Number of worst task sets to write (default: 10)")
+    parser.add_argument("--workers", type=int, default=6, help="Number of parallel processes (default: 6)")
+    parser.add_argument("--nptest", default=None, help="Path to the nptest binary")
+    parser.add_argument("--nptest-args", default="", help="Extra nptest arguments, e.g. \"--timeout 600\"")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for reproducible searches")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    if args.input is not None:
+        chains_list = [split_chains(ts, chain_lengths) for ts, chain_lengths in convert_file_to_tasksets_odd_chains(args.input)]
+    else:
+        random.seed(args.seed) # generate_task_set() draws from the global generator
+        chains_list = []
+        for _ in range(args.seeds):
+            ts = generate_task_set(args.U, args.chains, (args.length, args.length))
+            chains_list.append(split_chains(ts, [args.length] * args.chains))
+    seeds = [(chains, random_priorities(chains, rng), args.bcet) for chains in chains_list]
+
+    worst = search(seeds, args.m, args.objective, args.evaluations, args.population, args.offspring,
+                   args.max_jobs, args.workers, args.nptest, shlex.split(args.nptest_args), args.seed)
+    write_corpus(worst[:args.keep], args.output, args.objective)
+    for rank, (score, _, result) in enumerate(worst[:args.keep], start=1):
+        print(f"{rank}: {args.objective} = {score}, jobs = {result['jobs']}, U = {result['U']:.2f}")
+
+if __name__ == '__main__':
+    main()